@@ -0,0 +1,75 @@
+"""
+The SQL grammars & inputs from the README, shared by the tests and the benchmarks
+"""
+
+DROP_GRAMMAR = r"""
+    'DROP'
+    <target: ~table|database~>
+    ?(if_exists: 'IF' 'EXISTS')
+    <name: .>
+"""
+
+DROP_INPUTS = [
+    "DROP DATABASE test_database",
+    "DROP TABLE IF EXISTS test_table",
+    "DROP test_table",
+]
+
+UPDATE_GRAMMAR = r"""
+    'UPDATE' <table_name: .> "SET"
+    +(columns:
+        <name: .> "=" <value: .> sep { ',' }
+    )
+    ?('WHERE' +(where_clauses: <token: !~(ORDER)|(LIMIT)~> ) )
+    ?(order: 'ORDER' 'BY' <column: .> <direction: ~(ASC)|(DESC)~> )
+    ?('LIMIT' <limit: ~\\d+~> )
+"""
+
+UPDATE_INPUTS = [
+    "UPDATE test SET a=1, b=2, c = 3 WHERE a > 0 AND b = 2 ORDER BY c DESC limit 1",
+    "UPDATE test SET a=1 LIMIT 1",
+    "UPDATE test_table SET WHERE a > 1",
+]
+
+SELECT_GRAMMAR = r"""
+    def join_condition {
+        +(conditions:  <condition: !~(INNER)|(LEFT)|(WHERE)|(ORDER)|(LIMIT)~>)
+    }
+    def where_condition {
+        +(conditions: <condition: !~(ORDER)|(LIMIT)~> )
+    }
+
+    'SELECT' ?(distinct: "DISTINCT")
+        +(select_attributes: <name: !"from"> sep { ',' } )
+    'FROM' <table: .>
+    *(joins:
+        {
+            (inner: "INNER" "JOIN" <table: .> "ON" join_condition() )
+            (left: "LEFT" "JOIN" <table: .> "ON" join_condition() )
+        }
+    )
+    ?(where: "WHERE" where_condition() )
+    ?(order: "ORDER" "BY" <order_by_column: .> <order_by_direction: ~(ASC)|(DESC)~> )
+    ?("LIMIT" <limit: ~\\d+~> )
+"""
+
+SELECT_INPUTS = [
+    "SELECT * FROM test limit 1",
+    """
+        SELECT a, b, c
+        FROM test_table
+        INNER JOIN a ON a = t
+        INNER JOIN b ON b = a
+        LEFT JOIN c ON c = a
+        WHERE a > 1 AND b < 2
+        ORDER BY a DESC
+        LIMIT 2
+    """,
+    "SELECT FROM test",
+]
+
+SQL_GRAMMARS = (
+    ("drop", DROP_GRAMMAR, DROP_INPUTS),
+    ("update", UPDATE_GRAMMAR, UPDATE_INPUTS),
+    ("select", SELECT_GRAMMAR, SELECT_INPUTS),
+)
@@ -0,0 +1,50 @@
+import argparse
+import importlib
+import os
+import sys
+
+
+# Globals
+BENCHMARK_DIR = os.path.dirname(
+    os.path.abspath(__file__)
+)
+PROJECT_ROOT = os.path.normpath(
+    os.path.join(BENCHMARK_DIR, "..", "..")
+)
+
+
+def available_benchmarks():
+    return sorted(
+        file_name[:-3] for file_name in os.listdir(BENCHMARK_DIR)
+        if file_name.startswith("bench_") and file_name.endswith(".py")
+    )
+
+
+def run(benchmark_names, quick):
+    for benchmark_name in benchmark_names:
+        benchmark = importlib.import_module(benchmark_name)
+        print("### %s" % benchmark_name)
+        benchmark.run(quick=quick)
+        print("")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Execute Tokex Benchmarks")
+    parser.add_argument("benchmarks", nargs="*", help="Any of: %s" % ", ".join(available_benchmarks()))
+    parser.add_argument("--quick", action="store_true", help="Use fewer iterations & smaller inputs")
+    args = parser.parse_args()
+
+    for benchmark_name in args.benchmarks:
+        if benchmark_name not in available_benchmarks():
+            parser.error("Unknown benchmark: %s" % benchmark_name)
+
+    run(args.benchmarks or available_benchmarks(), args.quick)
+
+
+if __name__ == '__main__':
+    # Ensure we're running from the project root
+    os.chdir(PROJECT_ROOT)
+    sys.path.insert(1, ".")
+    sys.path.insert(1, BENCHMARK_DIR)
+
+    main()
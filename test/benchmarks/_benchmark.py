@@ -0,0 +1,59 @@
+"""
+Utilities shared by the tokex benchmarks.  Run the benchmarks from the project root using:
+
+    python -m test.benchmarks [--quick] [bench_name ...]
+"""
+
+import time
+
+# The SQL grammars & inputs from the README
+from test._sql_grammars import (
+    DROP_GRAMMAR, DROP_INPUTS, UPDATE_GRAMMAR, UPDATE_INPUTS, SELECT_GRAMMAR, SELECT_INPUTS, SQL_GRAMMARS
+)
+
+
+def best_time(fn, number, repeat=3):
+    """ Calls fn number times, repeat times over, returning the lowest average number of seconds taken per call """
+
+    best = None
+
+    for _ in range(repeat):
+        start = time.time()
+        for _ in range(number):
+            fn()
+        elapsed = (time.time() - start) / number
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def best_times(fns, number, repeat=3):
+    """
+    As best_time for each of a list of functions, returning a list of their times.  The functions are timed in turn
+    within each repeat, so that a slow patch of the machine is shared by all of them rather than skewing their ratios.
+    """
+
+    best = [None] * len(fns)
+
+    for _ in range(repeat):
+        for idx, fn in enumerate(fns):
+            elapsed = best_time(fn, number, repeat=1)
+
+            if best[idx] is None or elapsed < best[idx]:
+                best[idx] = elapsed
+
+    return best
+
+
+def print_table(headers, rows):
+    """ Prints a list of rows as a plain text table """
+
+    rows = [[str(cell) for cell in row] for row in rows]
+    widths = [max([len(str(header))] + [len(row[idx]) for row in rows]) for idx, header in enumerate(headers)]
+
+    print("  ".join(str(header).ljust(width) for header, width in zip(headers, widths)))
+    print("  ".join("-" * width for width in widths))
+    for row in rows:
+        print("  ".join(cell.ljust(width) for cell, width in zip(row, widths)))
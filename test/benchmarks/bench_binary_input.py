@@ -0,0 +1,87 @@
+"""
+Measures matching the contents of a file by reading & decoding it into a string, against matching a memory map of the
+file directly, which is tokenized into offsets & only has the tokens the grammar examines decoded.  Memory is the
+peak amount allocated by Python during a separate match, measured using tracemalloc, and isn't reported where it is
+unavailable; pages of the memory mapped file are managed by the operating system, so are not included.
+
+Matching the memory map takes around 1.1-1.5x as long as reading & decoding the file, in return for a fifth of the
+peak memory; each token the grammar examines is decoded on its own, where a decoded file is sliced into strings.
+"""
+
+import gc
+import mmap
+import os
+import tempfile
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import tokex
+
+import _benchmark
+
+
+SIZES = (
+    ("100 KB", 100 << 10),
+    ("1 MB", 1 << 20),
+    ("5 MB", 5 << 20),
+)
+
+STATEMENT = b"SELECT a, b, c FROM test_table WHERE a > 1 AND b < 'two'\n"
+
+GRAMMAR = "*(statements: 'SELECT' *(tokens: !'SELECT') )"
+
+
+def _peak_allocated(fn):
+    """ Calls fn, returning the most bytes allocated at once during the call """
+
+    if tracemalloc is None:
+        return None
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _format_megabytes(size):
+    return "-" if size is None else "%.1f" % (size / float(1 << 20))
+
+
+def run(quick=False):
+    sizes = SIZES[:2] if quick else SIZES
+    compiled = tokex.compile(GRAMMAR)
+
+    rows = []
+    for size_name, size in sizes:
+        file_descriptor, path = tempfile.mkstemp()
+
+        try:
+            with os.fdopen(file_descriptor, "wb") as data_file:
+                data_file.write(STATEMENT * (size // len(STATEMENT)))
+
+            def _match_decoded():
+                with open(path, "rb") as data_file:
+                    compiled.match(data_file.read().decode("utf-8"))
+
+            def _match_mapped():
+                with open(path, "rb") as data_file:
+                    mapped = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+                    try:
+                        compiled.match(mapped)
+                    finally:
+                        mapped.close()
+
+            for name, fn in (("read & decode", _match_decoded), ("mmap", _match_mapped)):
+                elapsed = _benchmark.best_time(fn, 1)
+                rows.append((size_name, name, "%.1f" % (elapsed * 1e3), _format_megabytes(_peak_allocated(fn))))
+
+        finally:
+            os.remove(path)
+
+    _benchmark.print_table(("file", "input", "match ms", "peak MB"), rows)
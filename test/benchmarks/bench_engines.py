@@ -0,0 +1,48 @@
+"""
+Compares the engines a grammar can be compiled for, using the README grammars.  Shows the time taken to compile each
+grammar, to apply it to already tokenized inputs, and to match the inputs end to end (including tokenization).
+"""
+
+import time
+
+import tokex
+from tokex.tokex_class import Tokex
+from tokex.grammar.match_context import MatchContext
+from tokex.tokenizers import TokenBuffer, TokexTokenizer
+
+import _benchmark
+
+
+def run(quick=False):
+    number = 200 if quick else 2000
+    tokenizer = TokexTokenizer()
+
+    rows = []
+    for name, grammar, inputs in _benchmark.SQL_GRAMMARS:
+        token_buffers = [TokenBuffer(tokenizer.tokenize(input_string)) for input_string in inputs]
+        expected = None
+
+        for engine in Tokex.ENGINES:
+            start = time.time()
+            compiled = tokex.compile(grammar, memoize=False, engine=engine)
+            compile_time = time.time() - start
+
+            outputs = [compiled.match(input_string) for input_string in inputs]
+            if expected is None:
+                expected = outputs
+            assert outputs == expected, "%s engine output differs for %s" % (engine, name)
+
+            apply_time = _benchmark.best_time(
+                lambda: [compiled._match_fn(tokens, 0, MatchContext()) for tokens in token_buffers], number
+            )
+            match_time = _benchmark.best_time(lambda: [compiled.match(i) for i in inputs], number)
+
+            rows.append((
+                name,
+                engine,
+                "%.2f" % (compile_time * 1e3),
+                "%.1f" % (apply_time * 1e6 / len(inputs)),
+                "%.1f" % (match_time * 1e6 / len(inputs)),
+            ))
+
+    _benchmark.print_table(("grammar", "engine", "compile ms", "apply us/input", "match us/input"), rows)
@@ -0,0 +1,67 @@
+"""
+Measures the time taken to tokenize and compile large generated grammars, such as libraries of sub grammars compiled
+at startup, along with hostile grammars containing unterminated regular expressions and string literals.  Times per
+kilobyte of grammar should remain flat as the grammars grow.
+"""
+
+import tokex
+from tokex import errors
+from tokex.grammar import parse
+
+import _benchmark
+
+
+def generate_grammar(num_definitions):
+    """ Returns a grammar defining num_definitions sub grammars, each using the one before it """
+
+    lines = ["def rule0 { 'select' <column: .> }"]
+
+    for idx in range(1, num_definitions):
+        lines.append(
+            r"def rule%d { # Rule %d" "\n"
+            r"    { (a: i'kw%d' ~[a-z]+_\~%d~ rule%d() ) *(b: <v: !q'x\'y'> sep { ',' } ) $ }" "\n"
+            "}" % (idx, idx, idx, idx, idx - 1)
+        )
+
+    lines.append("rule%d()" % (num_definitions - 1))
+    return "\n".join(lines)
+
+
+def _time_hostile(grammar, number):
+    def _compile():
+        try:
+            tokex.compile(grammar)
+        except errors.TokexError:
+            pass
+
+    return _benchmark.best_time(_compile, number)
+
+
+def run(quick=False):
+    number = 1 if quick else 3
+
+    rows = []
+    for num_definitions in (100, 1000) if quick else (100, 1000, 5000):
+        grammar = generate_grammar(num_definitions)
+        kilobytes = len(grammar) / 1024.0
+
+        tokenize_time = _benchmark.best_time(lambda: parse.tokenize_grammar(grammar), number)
+        compile_time = _benchmark.best_time(lambda: tokex.compile(grammar), number)
+
+        rows.append((
+            "%d definitions" % num_definitions,
+            "%.0f" % kilobytes,
+            "%.3f" % (tokenize_time * 1e3 / kilobytes),
+            "%.3f" % (compile_time * 1e3 / kilobytes),
+        ))
+
+    for size in (1000, 10000) if quick else (1000, 10000, 100000):
+        for name, grammar in (
+            ("unterminated regex", "'a' ~" + "a" * size),
+            ("unterminated literal", "'a' '" + "a\\'" * (size // 3)),
+        ):
+            hostile_time = _time_hostile(grammar, number)
+            kilobytes = len(grammar) / 1024.0
+            rows.append(("%s (%d)" % (name, size), "%.0f" % kilobytes, "-", "%.3f" % (hostile_time * 1e3 / kilobytes)))
+
+    _benchmark.print_table(("grammar", "KB", "tokenize ms/KB", "compile ms/KB"), rows)
@@ -0,0 +1,66 @@
+"""
+Measures routing statements to the grammar matching them, out of the README grammars along with 30 others for
+different statement types, by trying each compiled grammar in turn against those by using a GrammarSet.  The README
+grammars are tried last, as the statements they match would be by a set of grammars in alphabetical order.
+"""
+
+import tokex
+from tokex.tokex_class import Tokex
+
+import _benchmark
+
+
+STATEMENT_KEYWORDS = (
+    "ALTER", "ANALYZE", "ATTACH", "BEGIN", "CALL", "CHECKPOINT", "CLOSE", "CLUSTER", "COMMENT", "COMMIT", "COPY",
+    "CREATE", "DEALLOCATE", "DECLARE", "DELETE", "DETACH", "DISCARD", "DO", "EXECUTE", "EXPLAIN", "FETCH", "GRANT",
+    "IMPORT", "INSERT", "LISTEN", "LOAD", "LOCK", "MERGE", "MOVE", "NOTIFY",
+)
+
+# Each keyword followed by a name and any number of arguments
+STATEMENT_GRAMMAR = "'%s' <target: .> *(arguments: <argument: !';'> )"
+
+GRAMMARS = [(keyword.lower(), STATEMENT_GRAMMAR % keyword) for keyword in STATEMENT_KEYWORDS] + [
+    (name, grammar) for name, grammar, _ in _benchmark.SQL_GRAMMARS
+]
+
+INPUTS = [input_string for _, _, inputs in _benchmark.SQL_GRAMMARS for input_string in inputs] + [
+    "ALTER TABLE test ADD COLUMN a",
+    "INSERT INTO test VALUES 1 2 3",
+    "NOTIFY channel",
+]
+
+
+def _route_sequentially(compiled_grammars, input_string):
+    for name, compiled in compiled_grammars:
+        output = compiled.match(input_string)
+
+        if output is not None:
+            return name, output
+
+    return None
+
+
+def run(quick=False):
+    number = 100 if quick else 1000
+
+    rows = []
+    for engine in Tokex.ENGINES:
+        compiled_grammars = [(name, tokex.compile(grammar, engine=engine)) for name, grammar in GRAMMARS]
+        grammar_set = tokex.GrammarSet(GRAMMARS, engine=engine)
+
+        sequential_time = _benchmark.best_time(
+            lambda: [_route_sequentially(compiled_grammars, input_string) for input_string in INPUTS], number
+        )
+        set_time = _benchmark.best_time(
+            lambda: [grammar_set.match(input_string) for input_string in INPUTS], number
+        )
+
+        rows.append((
+            engine,
+            len(GRAMMARS),
+            "%.1f" % (sequential_time * 1e6 / len(INPUTS)),
+            "%.1f" % (set_time * 1e6 / len(INPUTS)),
+            "%.2fx" % (sequential_time / set_time),
+        ))
+
+    _benchmark.print_table(("engine", "grammars", "sequential us/input", "GrammarSet us/input", "speedup"), rows)
@@ -0,0 +1,53 @@
+"""
+Measures matching long inputs when they are tokenized in full before the grammar is applied, against matching them
+using Tokex.match; which tokenizes them only as far as the grammar examines them, unless the grammar must examine every
+token.  Statements are rejected by the DROP grammar on their first token, while a grammar collecting every token must
+tokenize the entire input either way, so match tokenizes it in full up front.
+"""
+
+import tokex
+from tokex.tokenizers import TokenBuffer
+
+import _benchmark
+
+
+SIZES = (
+    ("10 KB", 10 << 10),
+    ("1 MB", 1 << 20),
+    ("5 MB", 5 << 20),
+)
+
+STATEMENT = "SELECT a, b, c FROM test_table WHERE a > 1 AND b < 2\n"
+
+GRAMMARS = (
+    ("rejected", _benchmark.DROP_GRAMMAR),
+    ("all tokens", "*(tokens: <token: .>)"),
+)
+
+
+def run(quick=False):
+    sizes = SIZES[:2] if quick else SIZES
+
+    rows = []
+    for size_name, size in sizes:
+        input_string = STATEMENT * (size // len(STATEMENT))
+        number = max(1, (1 << 20) // size)
+
+        for grammar_name, grammar in GRAMMARS:
+            compiled = tokex.compile(grammar)
+            tokenizer = compiled._tokenizer
+
+            eager_time = _benchmark.best_time(
+                lambda: compiled.match_tokens(TokenBuffer(tokenizer.tokenize(input_string))), number
+            )
+            match_time = _benchmark.best_time(lambda: compiled.match(input_string), number)
+
+            rows.append((
+                size_name,
+                grammar_name,
+                "%.2f" % (eager_time * 1e3),
+                "%.2f" % (match_time * 1e3),
+                "%.2fx" % (eager_time / match_time),
+            ))
+
+    _benchmark.print_table(("input", "grammar", "eager ms", "match ms", "speedup"), rows)
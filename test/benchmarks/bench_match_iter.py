@@ -0,0 +1,37 @@
+"""
+Measures matching each of a list of records against a grammar by calling match for each record, against doing so
+using match_iter.  The two are timed alternately, as the difference between them is small enough to be lost to
+noise otherwise.
+"""
+
+import tokex
+from tokex.tokex_class import Tokex
+
+import _benchmark
+
+
+RECORDS = [input_string for _, _, inputs in _benchmark.SQL_GRAMMARS for input_string in inputs] * 100
+
+
+def run(quick=False):
+    number = 1 if quick else 5
+
+    rows = []
+    for name, grammar, _ in _benchmark.SQL_GRAMMARS:
+        for engine in Tokex.ENGINES:
+            compiled = tokex.compile(grammar, engine=engine)
+
+            loop_time, iter_time = _benchmark.best_times([
+                lambda: [compiled.match(record) for record in RECORDS],
+                lambda: list(compiled.match_iter(RECORDS)),
+            ], number, repeat=10)
+
+            rows.append((
+                name,
+                engine,
+                "%.2f" % (loop_time * 1e6 / len(RECORDS)),
+                "%.2f" % (iter_time * 1e6 / len(RECORDS)),
+                "%.2fx" % (loop_time / iter_time),
+            ))
+
+    _benchmark.print_table(("grammar", "engine", "match us/record", "match_iter us/record", "speedup"), rows)
@@ -0,0 +1,51 @@
+"""
+Measures the throughput of matching a batch of records against each of the README grammars using match_many, with
+an increasing number of worker processes, up to the number of CPUs.  Times include starting the pool of workers.
+
+Throughput is expected to scale close to linearly with the number of workers, so long as each has a CPU to itself;
+with more workers than CPUs, the workers only add the overhead of sending records and outputs between processes.
+"""
+
+import multiprocessing
+
+import tokex
+from tokex.tokex_class import Tokex
+
+import _benchmark
+
+
+def _worker_counts(cpu_count):
+    worker_counts = [1]
+    while worker_counts[-1] * 2 <= cpu_count:
+        worker_counts.append(worker_counts[-1] * 2)
+
+    if worker_counts[-1] != cpu_count:
+        worker_counts.append(cpu_count)
+
+    # Always measured with several workers, showing the overhead of the pool on machines with a single CPU
+    return worker_counts if len(worker_counts) > 1 else [1, 2]
+
+
+def run(quick=False):
+    cpu_count = multiprocessing.cpu_count()
+    print("%d CPUs" % cpu_count)
+
+    all_inputs = [input_string for _, _, inputs in _benchmark.SQL_GRAMMARS for input_string in inputs]
+    records = all_inputs * (2000 if quick else 20000)
+
+    for name, grammar, _ in _benchmark.SQL_GRAMMARS:
+        rows = []
+        for engine in Tokex.ENGINES:
+            compiled = tokex.compile(grammar, engine=engine)
+
+            baseline = None
+            for workers in _worker_counts(cpu_count):
+                elapsed = _benchmark.best_time(lambda: list(compiled.match_many(records, workers=workers)), 1)
+                throughput = len(records) / elapsed
+                baseline = baseline or throughput
+
+                rows.append((engine, workers, "%.0f" % throughput, "%.2fx" % (throughput / baseline)))
+
+        print("%s grammar, %d records" % (name, len(records)))
+        _benchmark.print_table(("engine", "workers", "records/s", "scaling"), rows)
+        print("")
@@ -0,0 +1,67 @@
+"""
+Compares matching with and without memoization, for a grammar whose alternatives share leading sub grammars (where
+memoization pays off) and for the README SELECT grammar (where the alternatives diverge at their first token, and
+memoization only adds overhead).  Also shows whether the memoization heuristic would enable memoization.
+
+The grammars are compiled without the optimizer, which would otherwise factor the shared leading sub grammar out of
+the alternatives so that it is only matched once, leaving memoization nothing to save.  The time taken to match the
+optimized grammar without memoization is shown for comparison.
+"""
+
+import tokex
+
+import _benchmark
+
+
+SHARED_PREFIX_GRAMMAR = r"""
+    def expression {
+        +(terms: <term: !~;|AS|INTO|USING~> )
+    }
+
+    +(statements:
+        {
+            (alias: expression() 'AS' <name: .> )
+            (into: expression() 'INTO' <target: .> )
+            (using: expression() 'USING' <source: .> )
+            (bare: expression() )
+        }
+        sep { ';' }
+    )
+"""
+
+SHARED_PREFIX_INPUTS = [
+    "a + b * c - d / e USING f; g * h - i + j AS k; l - m INTO n; o + p * q - r / s",
+]
+
+
+def run(quick=False):
+    number = 200 if quick else 2000
+
+    rows = []
+    for name, grammar, inputs in (
+        ("shared prefix", SHARED_PREFIX_GRAMMAR, SHARED_PREFIX_INPUTS),
+        ("select", _benchmark.SELECT_GRAMMAR, _benchmark.SELECT_INPUTS),
+    ):
+        plain = tokex.compile(grammar, memoize=False, optimize=False)
+        memoized = tokex.compile(grammar, memoize=True, optimize=False)
+        optimized = tokex.compile(grammar, memoize=False)
+
+        for input_string in inputs:
+            assert plain.match(input_string) == memoized.match(input_string) == optimized.match(input_string)
+
+        plain_time = _benchmark.best_time(lambda: [plain.match(i) for i in inputs], number)
+        memoized_time = _benchmark.best_time(lambda: [memoized.match(i) for i in inputs], number)
+        optimized_time = _benchmark.best_time(lambda: [optimized.match(i) for i in inputs], number)
+
+        rows.append((
+            name,
+            "%.1f" % (plain_time * 1e6),
+            "%.1f" % (memoized_time * 1e6),
+            "%.2fx" % (plain_time / memoized_time),
+            tokex.compile(grammar, optimize=False).memoize,
+            "%.1f" % (optimized_time * 1e6),
+        ))
+
+    _benchmark.print_table(
+        ("grammar", "plain us", "memoized us", "speedup", "heuristic enables", "optimized us"), rows
+    )
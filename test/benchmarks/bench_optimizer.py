@@ -0,0 +1,101 @@
+"""
+Measures the effect of the optimizer on the README grammars, with each engine.  Shows the number of rewrites applied
+to each grammar, and the time taken to apply the grammar to already tokenized inputs with and without them.
+
+Also measures a form of the README SELECT grammar which is written as several variants of the statement, each of which
+begins with the same elements; the optimizer matches those elements once rather than once per variant.  And a grammar
+classifying each token of the README SELECT inputs using many alternatives of string literals & regular expressions;
+which the optimizer merges so that a single comparison decides which alternative matches.
+"""
+
+from tokex.tokex_class import Tokex
+from tokex.grammar.match_context import MatchContext
+from tokex.tokenizers import TokenBuffer, TokexTokenizer
+
+import _benchmark
+
+
+# The start of the README SELECT grammar, up to its optional clauses
+_SELECT_BODY = r"""
+    'SELECT' ?(distinct: "DISTINCT")
+        +(select_attributes: <name: !"from"> sep { ',' } )
+    'FROM' <table: .>
+    *(joins:
+        {
+            (inner: "INNER" "JOIN" <table: .> "ON" join_condition() )
+            (left: "LEFT" "JOIN" <table: .> "ON" join_condition() )
+        }
+    )
+"""
+
+SELECT_VARIANTS_GRAMMAR = r"""
+    def join_condition {
+        +(conditions:  <condition: !~(INNER)|(LEFT)|(WHERE)|(ORDER)|(LIMIT)~>)
+    }
+    def where_condition {
+        +(conditions: <condition: !~(ORDER)|(LIMIT)~> )
+    }
+    def order {
+        ?(order: "ORDER" "BY" <order_by_column: .> <order_by_direction: ~(ASC)|(DESC)~> )
+    }
+    def limit {
+        ?("LIMIT" <limit: ~[0-9]+~> )
+    }
+
+    {
+        (filtered_select: %(body)s "WHERE" where_condition() order() limit() )
+        (ordered_select: %(body)s "ORDER" "BY" <order_by_column: .> <order_by_direction: ~(ASC)|(DESC)~> limit() )
+        (limited_select: %(body)s "LIMIT" <limit: ~[0-9]+~> )
+        (select: %(body)s )
+    }
+""" % {"body": _SELECT_BODY}
+
+TOKEN_CLASSES_GRAMMAR = r"""
+    +(tokens:
+        {
+            <keyword: 'SELECT'> <keyword: 'DISTINCT'> <keyword: 'FROM'> <keyword: 'WHERE'> <keyword: 'AND'>
+            <keyword: 'OR'> <keyword: 'INNER'> <keyword: 'LEFT'> <keyword: 'JOIN'> <keyword: 'ON'>
+            <keyword: 'ORDER'> <keyword: 'BY'> <keyword: 'ASC'> <keyword: 'DESC'> <keyword: 'LIMIT'>
+            <number: ~[0-9]+([.][0-9]+)?$~>
+            <operator: ~[<>=!]+$~>
+            <punctuation: ~[,;()*]$~>
+            <identifier: ~[a-z_][a-z0-9_.]*$~>
+        }
+    )
+"""
+
+GRAMMARS = _benchmark.SQL_GRAMMARS + (
+    ("select variants", SELECT_VARIANTS_GRAMMAR, _benchmark.SELECT_INPUTS),
+    ("token classes", TOKEN_CLASSES_GRAMMAR, _benchmark.SELECT_INPUTS),
+)
+
+
+def run(quick=False):
+    number = 200 if quick else 2000
+    tokenizer = TokexTokenizer()
+
+    rows = []
+    for name, grammar, inputs in GRAMMARS:
+        token_buffers = [TokenBuffer(tokenizer.tokenize(input_string)) for input_string in inputs]
+
+        for engine in Tokex.ENGINES:
+            times = []
+
+            for optimize in (False, True):
+                compiled = Tokex(grammar, True, tokenizer, memoize=False, engine=engine, optimize=optimize)
+                times.append(_benchmark.best_time(
+                    lambda: [compiled._match_fn(tokens, 0, MatchContext()) for tokens in token_buffers], number
+                ))
+
+            rows.append((
+                name,
+                engine,
+                len(compiled.rewrites),
+                "%.1f" % (times[0] * 1e6 / len(inputs)),
+                "%.1f" % (times[1] * 1e6 / len(inputs)),
+                "%.2fx" % (times[0] / times[1]),
+            ))
+
+    _benchmark.print_table(
+        ("grammar", "engine", "rewrites", "unoptimized us/input", "optimized us/input", "speedup"), rows
+    )
@@ -0,0 +1,62 @@
+"""
+Measures matching each of the README grammars against the inputs of all of the README grammars, along with near misses
+which only fail to match once most of their tokens have been examined, with and without first rejecting inputs which
+have too few or too many tokens for the grammar or lack a literal it requires.  Inputs are tokenized beforehand, so
+only the time taken to apply the grammar is measured.
+
+Where the grammar rejects most inputs at their first token anyway, the prefilter can cost more than it saves; such
+grammars can be compiled with prefilter=False.
+"""
+
+from tokex.tokex_class import Tokex
+from tokex.grammar.match_context import MatchContext
+from tokex.tokenizers import TokenBuffer, TokexTokenizer
+
+import _benchmark
+
+
+NEAR_MISSES = [
+    "DROP TABLE IF EXISTS test_table CASCADE",
+    "UPDATE test SET a=1, b=2, c=3, d=4, e=5, f=6, g=7, h=8",
+    "SELECT a, b, c, d, e, f, g, h, i, j, k, l WHERE a > 1",
+    "SELECT DISTINCT a, b, c, d, e, f, g, h INNER JOIN x ON a = b",
+]
+
+
+def run(quick=False):
+    number = 200 if quick else 2000
+    tokenizer = TokexTokenizer()
+
+    all_inputs = [input_string for _, _, inputs in _benchmark.SQL_GRAMMARS for input_string in inputs] + NEAR_MISSES
+    token_buffers = [TokenBuffer(tokenizer.tokenize(input_string)) for input_string in all_inputs]
+
+    rows = []
+    for name, grammar, _ in _benchmark.SQL_GRAMMARS:
+        for engine in Tokex.ENGINES:
+            compiled = Tokex(grammar, True, tokenizer, memoize=False, engine=engine)
+
+            unfiltered_time = _benchmark.best_time(
+                lambda: [compiled._match_fn(tokens, 0, MatchContext()) for tokens in token_buffers], number
+            )
+            filtered_time = _benchmark.best_time(
+                lambda: [
+                    compiled._passes_prefilter(tokens, True) and compiled._match_fn(tokens, 0, MatchContext())
+                    for tokens in token_buffers
+                ],
+                number
+            )
+
+            rejected = sum(1 for tokens in token_buffers if not compiled._passes_prefilter(tokens, True))
+
+            rows.append((
+                name,
+                engine,
+                "%d/%d" % (rejected, len(token_buffers)),
+                "%.1f" % (unfiltered_time * 1e6 / len(token_buffers)),
+                "%.1f" % (filtered_time * 1e6 / len(token_buffers)),
+                "%.2fx" % (unfiltered_time / filtered_time),
+            ))
+
+    _benchmark.print_table(
+        ("grammar", "engine", "rejected", "unfiltered us/input", "prefiltered us/input", "speedup"), rows
+    )
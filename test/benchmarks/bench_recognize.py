@@ -0,0 +1,40 @@
+"""
+Compares determining whether the README grammars match their inputs using is_match, which never builds any outputs,
+against checking whether the result of match is None; with each engine.  Inputs are tokenized beforehand, so only the
+time taken to apply the grammar is measured.
+"""
+
+from tokex.tokex_class import Tokex
+from tokex.grammar.match_context import MatchContext
+from tokex.tokenizers import TokenBuffer, TokexTokenizer
+
+import _benchmark
+
+
+def run(quick=False):
+    number = 200 if quick else 2000
+    tokenizer = TokexTokenizer()
+
+    rows = []
+    for name, grammar, inputs in _benchmark.SQL_GRAMMARS:
+        token_buffers = [TokenBuffer(tokenizer.tokenize(input_string)) for input_string in inputs]
+
+        for engine in Tokex.ENGINES:
+            compiled = Tokex(grammar, True, tokenizer, memoize=False, engine=engine)
+
+            match_time = _benchmark.best_time(
+                lambda: [compiled._match_fn(tokens, 0, MatchContext())[0] for tokens in token_buffers], number
+            )
+            recognize_time = _benchmark.best_time(
+                lambda: [compiled._recognize(tokens) is not None for tokens in token_buffers], number
+            )
+
+            rows.append((
+                name,
+                engine,
+                "%.1f" % (match_time * 1e6 / len(inputs)),
+                "%.1f" % (recognize_time * 1e6 / len(inputs)),
+                "%.2fx" % (match_time / recognize_time),
+            ))
+
+    _benchmark.print_table(("grammar", "engine", "match us/input", "is_match us/input", "speedup"), rows)
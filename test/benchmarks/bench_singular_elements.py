@@ -0,0 +1,54 @@
+"""
+Microbenchmarks of each singular element type, for each combination of flags it accepts.  Each element is applied
+both to a token it matches, and to one it does not.
+"""
+
+from tokex.grammar import parse
+from tokex.grammar.match_context import MatchContext
+from tokex.tokenizers import TokenBuffer
+
+import _benchmark
+
+
+TOKENS = TokenBuffer(["Select", "'Select'", "other", "'other'", "\n"])
+
+# Grammar element, index of a token it matches, index of a token it does not match
+ELEMENTS = (
+    ("'select'", 0, 2),
+    ("s'Select'", 0, 2),
+    ("q'select'", 1, 0),
+    ("sq'Select'", 1, 0),
+    ("u'select'", 0, 1),
+    ("!'select'", 2, 0),
+    ("!q'select'", 3, 1),
+    ("!u'select'", 2, 3),
+    ("~sel~", 0, 2),
+    ("s~Sel~", 0, 2),
+    ("q~sel~", 1, 0),
+    ("u~sel~", 0, 1),
+    ("!~sel~", 2, 0),
+    ("!q~sel~", 3, 1),
+    (".", 0, 5),
+    ("q.", 1, 0),
+    ("u.", 0, 1),
+    ("$", 4, 0),
+)
+
+
+def run(quick=False):
+    number = 20000 if quick else 200000
+    context = MatchContext()
+
+    rows = []
+    for grammar, match_idx, non_match_idx in ELEMENTS:
+        element = parse.construct_grammar(grammar).sub_elements[0]
+
+        assert element.apply(TOKENS, match_idx, context)[0]
+        assert not element.apply(TOKENS, non_match_idx, context)[0]
+
+        match_time = _benchmark.best_time(lambda: element.apply(TOKENS, match_idx, context), number)
+        non_match_time = _benchmark.best_time(lambda: element.apply(TOKENS, non_match_idx, context), number)
+
+        rows.append((element.human_readable_name(), grammar, "%.0f" % (match_time * 1e9), "%.0f" % (non_match_time * 1e9)))
+
+    _benchmark.print_table(("element", "grammar", "match ns", "no match ns"), rows)
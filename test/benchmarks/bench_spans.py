@@ -0,0 +1,83 @@
+"""
+Measures the memory taken by tokenizing long inputs into TokenBuffers holding each token, against SpanTokenBuffers
+holding the offsets of each token, along with the time taken to tokenize them and match a grammar examining every
+token.  Memory is measured using tracemalloc, and isn't reported where it is unavailable.
+"""
+
+import gc
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import tokex
+from tokex.tokenizers import TokexTokenizer
+
+import _benchmark
+
+
+SIZES = (
+    ("100 KB", 100 << 10),
+    ("1 MB", 1 << 20),
+    ("10 MB", 10 << 20),
+)
+
+STATEMENT = "SELECT a, b, c FROM test_table WHERE a > 1 AND b < 'two'\n"
+
+GRAMMAR = "*(statements: 'SELECT' *(tokens: !'SELECT') )"
+
+
+def _allocated_bytes(fn):
+    """ Returns the number of bytes allocated by fn which are still allocated once it returns, along with its result """
+
+    if tracemalloc is None:
+        return None, fn()
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn()
+        allocated, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return allocated, result
+
+
+def _tokenize(compiled, input_string):
+    """ Tokenizes the entirety of input_string, including strings which would be tokenized lazily """
+
+    tokens = compiled.tokenize(input_string)
+    tokens.has_token(len(input_string))
+
+    return tokens
+
+
+def run(quick=False):
+    sizes = SIZES[:2] if quick else SIZES
+
+    rows = []
+    for size_name, size in sizes:
+        input_string = STATEMENT * (size // len(STATEMENT))
+        number = max(1, (1 << 20) // size)
+
+        for tokenizer_name, tokenizer in (("tokens", TokexTokenizer()), ("spans", TokexTokenizer(spans=True))):
+            compiled = tokex.compile(GRAMMAR, tokenizer=tokenizer)
+
+            allocated, tokens = _allocated_bytes(lambda: _tokenize(compiled, input_string))
+
+            tokenize_time = _benchmark.best_time(lambda: _tokenize(compiled, input_string), number)
+            match_time = _benchmark.best_time(lambda: compiled.match_tokens(tokens), number)
+            # Releases the buffer before the next is created, without deleting the name match_time's lambda refers to
+            tokens = None
+
+            rows.append((
+                size_name,
+                tokenizer_name,
+                "-" if allocated is None else "%.1f" % (allocated / float(1 << 20)),
+                "%.1f" % (tokenize_time * 1e3),
+                "%.1f" % (match_time * 1e3),
+            ))
+
+    _benchmark.print_table(("input", "tokenized into", "buffer MB", "tokenize ms", "match ms"), rows)
@@ -0,0 +1,61 @@
+"""
+Measures the throughput of a single compiled Tokex shared by an increasing number of threads.
+
+On builds of CPython with the GIL, throughput is expected to remain flat as threads are added; what this benchmark
+shows there is that matching remains correct and does not degrade under contention.  On free-threaded builds
+(python3.13t and later) throughput should scale with the number of threads, as matching holds no locks and mutates
+no shared state.
+"""
+
+import sys
+import threading
+import time
+
+import tokex
+
+import _benchmark
+
+
+def _throughput(parser, inputs, num_threads, matches_per_thread):
+    start_barrier = threading.Barrier(num_threads + 1) if hasattr(threading, "Barrier") else None
+
+    def _worker():
+        if start_barrier is not None:
+            start_barrier.wait()
+
+        for idx in range(matches_per_thread):
+            parser.match(inputs[idx % len(inputs)])
+
+    threads = [threading.Thread(target=_worker) for _ in range(num_threads)]
+    for thread in threads:
+        thread.start()
+
+    start = time.time()
+    if start_barrier is not None:
+        start_barrier.wait()
+
+    for thread in threads:
+        thread.join()
+
+    return (num_threads * matches_per_thread) / (time.time() - start)
+
+
+def run(quick=False):
+    gil_enabled = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print("Python %s, GIL %s" % (sys.version.split()[0], "enabled" if gil_enabled else "disabled"))
+
+    matches_per_thread = 200 if quick else 2000
+
+    for name, grammar, inputs in _benchmark.SQL_GRAMMARS:
+        parser = tokex.compile(grammar)
+
+        rows = []
+        baseline = None
+        for num_threads in (1, 2, 4, 8):
+            throughput = _throughput(parser, inputs, num_threads, matches_per_thread)
+            baseline = baseline or throughput
+            rows.append((num_threads, "%.0f" % throughput, "%.2fx" % (throughput / baseline)))
+
+        print("%s grammar" % name)
+        _benchmark.print_table(("threads", "matches/s", "scaling"), rows)
+        print("")
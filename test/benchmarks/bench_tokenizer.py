@@ -0,0 +1,54 @@
+"""
+Measures the throughput of tokenizing inputs of increasing size, built by repeating the README grammars' inputs, with
+the default tokenizer and with one which tokenizes newlines & ignores empty lines.
+"""
+
+from tokex.tokenizers import TokexTokenizer
+
+import _benchmark
+
+
+SIZES = (
+    ("1 KB", 1 << 10),
+    ("100 KB", 100 << 10),
+    ("1 MB", 1 << 20),
+    ("10 MB", 10 << 20),
+    ("100 MB", 100 << 20),
+)
+
+TOKENIZERS = (
+    ("default", TokexTokenizer()),
+    ("newlines", TokexTokenizer(tokenize_newlines=True, ignore_empty_lines=True)),
+)
+
+
+def _build_input(size):
+    """ Returns a string of size characters, made up of the README grammars' inputs separated by empty lines """
+
+    statements = "\n\n".join(input_string for _, _, inputs in _benchmark.SQL_GRAMMARS for input_string in inputs)
+
+    return (statements * (size // len(statements) + 1))[:size]
+
+
+def run(quick=False):
+    sizes = SIZES[:3] if quick else SIZES
+
+    rows = []
+    for size_name, size in sizes:
+        input_string = _build_input(size)
+        # Keep the total amount of input tokenized for each size roughly the same
+        number = max(1, (1 << 20) // size)
+
+        for tokenizer_name, tokenizer in TOKENIZERS:
+            elapsed = _benchmark.best_time(lambda: tokenizer.tokenize(input_string), number)
+            token_count = len(tokenizer.tokenize(input_string))
+
+            rows.append((
+                size_name,
+                tokenizer_name,
+                token_count,
+                "%.1f" % (elapsed * 1e3),
+                "%.1f" % (size / elapsed / (1 << 20)),
+            ))
+
+    _benchmark.print_table(("input", "tokenizer", "tokens", "ms", "MB/s"), rows)
@@ -0,0 +1,70 @@
+import functools
+
+import tokex
+from tokex.tokex_class import Tokex
+import test_grammar_parsing
+import _sql_grammars
+
+
+class TestCodegenEngine(test_grammar_parsing.TestGrammarParsing):
+    """ Runs the grammar parsing tests against grammars compiled to Python functions """
+
+    engine = "codegen"
+
+    def setUp(self):
+        original_compile = tokex.compile
+        # Disable memoization, so that matches are not handed back to the interpreter
+        engine_compile = functools.partial(original_compile, engine=self.engine, memoize=False)
+
+        def _restore():
+            tokex.compile = original_compile
+            tokex.functions.compile = original_compile
+            tokex.clear_cache()
+
+        # Cached grammars are keyed without their engine
+        tokex.clear_cache()
+        tokex.compile = engine_compile
+        tokex.functions.compile = engine_compile
+        self.addCleanup(_restore)
+
+    def test_engine_used(self):
+        self.assertEqual(tokex.compile("'a'").engine, self.engine)
+
+    def test_readme_grammars(self):
+        for _, grammar, inputs in _sql_grammars.SQL_GRAMMARS:
+            interpreter_grammar = Tokex(grammar, True, tokex.tokenizers.TokexTokenizer)
+            engine_grammar = tokex.compile(grammar)
+
+            for input_string in inputs:
+                for match_entirety in (True, False):
+                    self.assertEqual(
+                        engine_grammar.match(input_string, match_entirety=match_entirety),
+                        interpreter_grammar.match(input_string, match_entirety=match_entirety)
+                    )
+
+                # Truncated inputs should also fail (or partially match) identically
+                truncated = input_string.rsplit(" ", 1)[0]
+                self.assertEqual(
+                    engine_grammar.match(truncated, match_entirety=False),
+                    interpreter_grammar.match(truncated, match_entirety=False)
+                )
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            Tokex("'a'", True, tokex.tokenizers.TokexTokenizer, engine="unknown")
+
+
+class TestVMEngine(TestCodegenEngine):
+    """ Runs the grammar parsing tests against grammars assembled into instructions """
+
+    engine = "vm"
+
+    def test_deep_nesting(self):
+        depth = 2000
+        grammar = "?(a: " * depth + "<b: 'b'>" + ")" * depth
+
+        output = tokex.compile(grammar).match("b")
+
+        for _ in range(depth):
+            output = output["a"]
+        self.assertEqual(output, {"b": "b"})
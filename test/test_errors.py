@@ -154,6 +154,11 @@ class TestErrors(_test_case.TokexTestCase):
             }
         )
 
+        # Unterminated regular expressions & string literals are reported without backtracking over their contents
+        for grammar_string in ("'a' ~" + "a\\~" * 20000, "'a' '" + "a\\'" * 20000, "'a' ~" + "a " * 20000):
+            e = self.get_exception(grammar_string, errors.UnknownGrammarTokenError)
+            self.assertEqual(e.match_span_start, 4)
+
     def test_grammar_parsing_error(self):
         # Test an error with full tree/context
         grammar_string = textwrap.dedent("""
@@ -911,9 +916,10 @@ class TestErrors(_test_case.TokexTestCase):
             "tree_type": "Sub"
         })
 
+        # Usages of sub grammars which have not been defined yet are only reported once the grammar has been parsed
         grammar_string = textwrap.dedent("""
             def q {
-                q()
+                r()
             }
             'test' 'test' 'test'
             . . .
@@ -922,11 +928,16 @@ class TestErrors(_test_case.TokexTestCase):
         e = self.get_exception(grammar_string, errors.UndefinedSubGrammarError)
         error_details = self._parse_grammar_parsing_error_string(e)
         self.assertDictEqual(error_details, {
-            "err_msg": "Sub grammar q does not exist",
+            "err_msg": "Sub grammar r does not exist",
             "line": 3,
             "column": 5,
-            "grammar_snippet": "q()",
-            "num_carets": 3
+            "grammar_snippet": "r()",
+            "num_carets": 3,
+            "grammar_tree": [
+                [0, '<[Sub Grammar def q { ... }]>'],
+                [1, '<[Sub Grammar Usage r()]>']
+            ],
+            "tree_type": "Sub"
         })
 
         grammar_string = textwrap.dedent("""
@@ -953,3 +964,29 @@ class TestErrors(_test_case.TokexTestCase):
             ],
             "tree_type": "Sub"
         })
+
+    def test_left_recursive_sub_grammar_error(self):
+        grammar_string = textwrap.dedent("""
+            def a {
+                { (x: a() 'x') 'y' }
+            }
+            a()
+        """)
+        e = self.get_exception(grammar_string, errors.LeftRecursiveSubGrammarError)
+        error_details = self._parse_grammar_parsing_error_string(e)
+        self.assertDictEqual(error_details, {
+            "err_msg": "Sub grammar a can be used within itself without consuming any tokens (left recursion)",
+            "line": 3,
+            "column": 11,
+            "grammar_snippet": "{ (x: a() 'x') 'y' }",
+            "num_carets": 3,
+            "grammar_tree": [
+                [0, '<[Sub Grammar def a { ... }]>'],
+                [1, '<[One of Set {...}]>']
+            ],
+            "tree_type": "Sub"
+        })
+
+        # Through other sub grammars & elements which can match without consuming any tokens
+        grammar_string = "def a { b() 'x' } def b { ?('y') *(zs: 'z') a() } 'w' a()"
+        self.get_exception(grammar_string, errors.LeftRecursiveSubGrammarError)
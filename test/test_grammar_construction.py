@@ -4,6 +4,7 @@ from tokex.grammar.parse import tokenize_grammar, construct_grammar
 from tokex.grammar import elements
 from tokex.grammar import flags
 from tokex import errors
+from tokex.tokenizers import TokenBuffer
 import _test_case
 
 class TestGrammarConstruction(_test_case.TokexTestCase):
@@ -660,12 +661,51 @@ class TestGrammarConstruction(_test_case.TokexTestCase):
             _()
         """, allow_sub_grammar_definitions=True)
 
-        self.assertListEqual([token.token_str for token in test_grammar.sub_elements], [
+        def _flatten(sub_elements):
+            for element in sub_elements:
+                if isinstance(element, elements.SubGrammarUsage):
+                    for sub_element in _flatten(element.sub_elements):
+                        yield sub_element
+                else:
+                    yield element
+
+        self.assertTrue(all(isinstance(element, elements.SubGrammarUsage) for element in test_grammar.sub_elements))
+        self.assertListEqual([token.token_str for token in _flatten(test_grammar.sub_elements)], [
             'a', 'b', 'c', 'd', 'e', 'f', 'f2', 'g',
             'h', 'i', 'j', 'k', 'l', 'm', 'n',
             'o', 'p', 'q', 'r',
         ])
 
+        # Usages refer to the elements of their definitions rather than copying them
+        test_grammar = construct_grammar(r"""
+            def a { 'a' 'b' }
+            def b { a() a() }
+            def c { b() b() }
+            c() c() { a() 'c' }
+        """, allow_sub_grammar_definitions=True)
+
+        self.assertIs(test_grammar.sub_elements[0].definition, test_grammar.sub_elements[1].definition)
+        self.assertIs(test_grammar.sub_elements[0].sub_elements, test_grammar.sub_elements[1].sub_elements)
+        self.assertEqual(len(list(_flatten(test_grammar.sub_elements[:2]))), 16)
+        self.assertTrue(test_grammar.sub_elements[2].sub_elements[0].alternatives)
+        self.assertFalse(test_grammar.sub_elements[0].alternatives)
+
+        # Sub grammars can be used within themselves, and before they are defined
+        test_grammar = construct_grammar(r"""
+            def a { 'a' ?(b: b() ) }
+            def b { 'b' ?(a: a() ) }
+            def c { 'c' }
+            a() c()
+        """, allow_sub_grammar_definitions=True)
+
+        a_usage, c_usage = test_grammar.sub_elements
+        b_usage = a_usage.sub_elements[1].sub_elements[0]
+
+        self.assertIs(b_usage.sub_elements[1].sub_elements[0].definition, a_usage.definition)
+        self.assertTrue(a_usage.recursive)
+        self.assertTrue(b_usage.recursive)
+        self.assertFalse(c_usage.recursive)
+
         self.assertRaises(errors.TokexError, construct_grammar, "def gramA{'a'}", allow_sub_grammar_definitions=False)
         self.assertRaises(errors.TokexError, construct_grammar, "def gram A{'a'}", allow_sub_grammar_definitions=True)
         self.assertRaises(errors.TokexError, construct_grammar, "def gram{A{'a'}", allow_sub_grammar_definitions=True)
@@ -674,3 +714,24 @@ class TestGrammarConstruction(_test_case.TokexTestCase):
         self.assertRaises(errors.TokexError, construct_grammar, "def grammer", allow_sub_grammar_definitions=True)
         self.assertRaises(errors.TokexError, construct_grammar, "def gramA{ def gramB { 'b' } } gramB()", allow_sub_grammar_definitions=True)
         self.assertRaises(errors.TokexError, construct_grammar, "def gramA{ def gramB{ '' } } gramC()", allow_sub_grammar_definitions=True)
+
+    def test_singular_element_specialization(self):
+        test_grammar = construct_grammar(r"""
+            'a' u'a' !'a' !u'a' q'a' s'a'
+            ~a~ u~a~ !~a~ !u~a~ sq~a~
+            . q. u. $
+        """)
+
+        self.assertEqual([element._apply.__name__ for element in test_grammar.sub_elements], [
+            "_apply_equal", "_apply_equal_unquoted", "_apply_not_equal", "_apply_not_equal_unquoted",
+            "_apply_equal", "_apply_equal",
+            "_apply_match", "_apply_match_unquoted", "_apply_not_match", "_apply_not_match_unquoted", "_apply_match",
+            "_apply", "_apply_quoted", "_apply_unquoted", "_apply",
+        ])
+
+        self.assertEqual([element._view for element in test_grammar.sub_elements], [
+            TokenBuffer.LOWERED, TokenBuffer.LOWERED, TokenBuffer.LOWERED, TokenBuffer.LOWERED,
+            TokenBuffer.LOWERED_BODIES, TokenBuffer.TOKENS,
+            TokenBuffer.LOWERED, TokenBuffer.LOWERED, TokenBuffer.LOWERED, TokenBuffer.LOWERED, TokenBuffer.BODIES,
+            TokenBuffer.LOWERED, TokenBuffer.LOWERED_BODIES, TokenBuffer.LOWERED, TokenBuffer.TOKENS,
+        ])
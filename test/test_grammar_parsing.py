@@ -462,3 +462,134 @@ class TestGrammarParsing(_test_case.TokexTestCase):
 
         self.assertDictEqual(one_of_set_grammar.match(''), {})
         self.assertDictEqual(one_of_set_grammar.match('e'), {'_': [None]})
+
+    def test_parse_one_of_set_dispatch(self):
+        grammar = """
+            {
+                (inner: "INNER" "JOIN" <table: .>)
+                (left: "LEFT" ?(outer: "OUTER") "JOIN" <table: .>)
+                (quoted: q"LEFT" <table: .>)
+                (sensitive: s"Right" <table: .>)
+                (optional: ?("FULL") "CROSS" <table: .>)
+                (fallback: <keyword: ~LEFT|RIGHT~> <table: .>)
+                (empty: )
+            }
+        """
+
+        one_of_set_grammar = tokex.compile(grammar)
+        one_of_set = one_of_set_grammar._grammar.sub_elements[0]
+
+        # Each alternative is only reachable through the tokens it could begin with
+        self.assertEqual(
+            [alt.name for alt in one_of_set.dispatch_table["left"]], ["left", "fallback", "empty"]
+        )
+        self.assertEqual(
+            [alt.name for alt in one_of_set.quoted_dispatch_table["left"]], ["quoted", "fallback", "empty"]
+        )
+        self.assertEqual(
+            [alt.name for alt in one_of_set.dispatch_table["full"]], ["optional", "fallback", "empty"]
+        )
+        self.assertEqual(
+            [alt.name for alt in one_of_set.dispatch_table["cross"]], ["optional", "fallback", "empty"]
+        )
+        self.assertEqual([alt.name for alt in one_of_set.fallback_alternatives], ["fallback", "empty"])
+
+        self.assertDictEqual(one_of_set_grammar.match('inner join a'), {'inner': {'table': 'a'}})
+        self.assertDictEqual(one_of_set_grammar.match('LEFT OUTER JOIN a'), {'left': {'outer': None, 'table': 'a'}})
+        self.assertDictEqual(one_of_set_grammar.match('"left" a'), {'quoted': {'table': 'a'}})
+        self.assertDictEqual(one_of_set_grammar.match('Right a'), {'sensitive': {'table': 'a'}})
+        self.assertDictEqual(one_of_set_grammar.match('right a'), {'fallback': {'keyword': 'right', 'table': 'a'}})
+        self.assertDictEqual(one_of_set_grammar.match('left a'), {'fallback': {'keyword': 'left', 'table': 'a'}})
+        self.assertDictEqual(one_of_set_grammar.match('full cross a'), {'optional': {'table': 'a'}})
+        self.assertDictEqual(one_of_set_grammar.match('cross a'), {'optional': {'table': 'a'}})
+        self.assertDictEqual(one_of_set_grammar.match(''), {'empty': None})
+        self.assertDictEqual(one_of_set_grammar.match('other', match_entirety=False), {'empty': None})
+        self.assertIsNone(one_of_set_grammar.match('"inner" join a'))
+
+    def test_parse_sub_grammar_usage(self):
+        grammar = """
+            def value { <value: .> }
+            def pair { <key: .> '=' value() }
+            def keyword { 'x' 'y' }
+            +(pairs: pair() sep { ',' }) ?(kw: { keyword() <z: 'z'> })
+        """
+
+        sub_grammar_grammar = tokex.compile(grammar)
+
+        self.assertDictEqual(sub_grammar_grammar.match("a = 1 , b = 2 y"), {
+            "pairs": [{"key": "a", "value": "1"}, {"key": "b", "value": "2"}],
+            "kw": None
+        })
+        self.assertDictEqual(sub_grammar_grammar.match("a = 1 z"), {
+            "pairs": [{"key": "a", "value": "1"}],
+            "kw": {"z": "z"}
+        })
+
+        self.assertIsNone(sub_grammar_grammar.match("a = 1 x y"))
+        self.assertIsNone(sub_grammar_grammar.match("a = 1 ,"))
+        self.assertIsNone(sub_grammar_grammar.match("a ="))
+
+    def test_parse_nested_sub_grammar_usage_alternatives(self):
+        # The elements of sub grammars used within a sub grammar which is used as alternatives are each alternatives,
+        # as though they had been written in its definition
+        grammar = """
+            def c { 'q' <v: .> }
+            def b { 'y' 'z' c() }
+            def a { 'x' b() }
+            { a() 'w' }
+        """
+
+        expected = [
+            ("x", {}), ("y", {}), ("z", {}), ("q", {}), ("k", {"v": "k"}), ("w", {"v": "w"}),
+            ("y z", None), ("x y z", None), ("q k", None),
+        ]
+
+        for engine in tokex.tokex_class.Tokex.ENGINES:
+            for optimize in (False, True):
+                nested_grammar = tokex.compile(grammar, engine=engine, optimize=optimize)
+
+                for input_string, output in expected:
+                    self.assertEqual(nested_grammar.match(input_string), output, (engine, optimize, input_string))
+
+    def test_parse_recursive_sub_grammar(self):
+        grammar = """
+            def expression {
+                +(terms: { (group: '(' expression() ')' ) <term: ~[a-z0-9]+~> } sep { <operator: ~[-+*/]~> } )
+            }
+            expression()
+        """
+
+        recursive_grammar = tokex.compile(grammar)
+
+        self.assertDictEqual(recursive_grammar.match("( a + ( b ) ) * c"), {
+            "terms": [
+                {"group": {"terms": [
+                    {"term": "a", "operator": "+"},
+                    {"group": {"terms": [{"term": "b"}]}}
+                ]}, "operator": "*"},
+                {"term": "c"}
+            ]
+        })
+
+        self.assertIsNone(recursive_grammar.match("( ( a ) - b"))
+        self.assertIsNone(recursive_grammar.match("( a ) )"))
+
+        # Mutually recursive sub grammars, used before they are defined
+        grammar = """
+            def value { { <number: ~[0-9]+~> list() } }
+            def list { (list: '[' *(items: value() sep { ',' } ) ']' ) }
+            value()
+        """
+
+        recursive_grammar = tokex.compile(grammar)
+
+        self.assertDictEqual(recursive_grammar.match("[ 1 , [ 2 , [ ] ] , 3 ]"), {
+            "list": {"items": [
+                {"number": "1"},
+                {"list": {"items": [{"number": "2"}, {"list": None}]}},
+                {"number": "3"}
+            ]}
+        })
+
+        self.assertIsNone(recursive_grammar.match("[ 1 , [ 2 ]"))
+        self.assertIsNone(recursive_grammar.match("[ 1 2 ]"))
@@ -0,0 +1,55 @@
+import collections
+
+import _test_case
+import tokex
+from tokex.tokex_class import Tokex
+import _sql_grammars
+
+
+class TestGrammarSet(_test_case.TokexTestCase):
+    """ Tests that GrammarSets match inputs as trying each of their grammars in turn would """
+
+    def test_readme_grammars(self):
+        grammars = [(name, grammar) for name, grammar, _ in _sql_grammars.SQL_GRAMMARS]
+        inputs = [input_string for _, _, inputs in _sql_grammars.SQL_GRAMMARS for input_string in inputs]
+
+        for engine in Tokex.ENGINES:
+            grammar_set = tokex.GrammarSet(grammars, engine=engine)
+
+            for input_string in inputs + ["", "DROP", "INSERT INTO a"]:
+                for match_entirety in (True, False):
+                    expected = None
+
+                    for name, grammar in grammars:
+                        output = tokex.compile(grammar).match(input_string, match_entirety=match_entirety)
+
+                        if output is not None:
+                            expected = name, output
+                            break
+
+                    self.assertEqual(grammar_set.match(input_string, match_entirety=match_entirety), expected)
+
+    def test_candidate_order(self):
+        grammar_set = tokex.GrammarSet(collections.OrderedDict([
+            ("any", "<first: ~[0-9]+~> <second: .>"),
+            ("pair", "'a' <second: .>"),
+            ("quoted", "q'a' <second: .>"),
+            ("optional", "?(a: 'a') <second: 'b'>"),
+            ("single", "'a'"),
+        ]))
+
+        # Grammars which could begin with any token are tried along with those beginning with the input's first
+        self.assertEqual(grammar_set.match("1 b"), ("any", {"first": "1", "second": "b"}))
+        self.assertEqual(grammar_set.match("a b"), ("pair", {"second": "b"}))
+        self.assertEqual(grammar_set.match("'a' b"), ("quoted", {"second": "b"}))
+        self.assertEqual(grammar_set.match("b"), ("optional", {"second": "b"}))
+        self.assertEqual(grammar_set.match("a"), ("single", {}))
+        self.assertEqual(grammar_set.match("a b c", match_entirety=False), ("pair", {"second": "b"}))
+        self.assertIsNone(grammar_set.match("c"))
+        self.assertIsNone(grammar_set.match(""))
+
+    def test_empty_and_duplicates(self):
+        self.assertIsNone(tokex.GrammarSet([]).match("a"))
+
+        with self.assertRaises(ValueError):
+            tokex.GrammarSet([("a", "'a'"), ("a", "'b'")])
@@ -0,0 +1,287 @@
+import time
+
+import _test_case
+from tokex import tokenizers
+from tokex.grammar import analysis, elements, optimizer
+from tokex.tokex_class import Tokex
+import _sql_grammars
+
+
+class TestOptimizer(_test_case.TokexTestCase):
+    """ Tests that the optimizer rewrites grammars without changing what they match """
+
+    def _compile(self, grammar, **kwargs):
+        return Tokex(grammar, True, tokenizers.TokexTokenizer, **kwargs)
+
+    def assertMatchesUnoptimized(self, grammar, input_strings):
+        unoptimized = self._compile(grammar, optimize=False)
+
+        for engine in Tokex.ENGINES:
+            optimized = self._compile(grammar, engine=engine, memoize=False)
+
+            for input_string in input_strings:
+                for match_entirety in (True, False):
+                    self.assertEqual(
+                        optimized.match(input_string, match_entirety=match_entirety),
+                        unoptimized.match(input_string, match_entirety=match_entirety),
+                        "%s engine differs for %r against %r" % (engine, grammar, input_string)
+                    )
+
+    def _rewrite_kinds(self, grammar):
+        return [rewrite.kind for rewrite in self._compile(grammar).rewrites]
+
+    def test_readme_grammars(self):
+        for _, grammar, inputs in _sql_grammars.SQL_GRAMMARS:
+            self.assertMatchesUnoptimized(grammar, inputs + [input_string.rsplit(" ", 1)[0] for input_string in inputs])
+
+    def test_optimize_disabled(self):
+        compiled = self._compile("'a' 'b' { 'c' }", optimize=False)
+
+        self.assertEqual(compiled.rewrites, [])
+        self.assertEqual([type(element) for element in compiled._grammar.sub_elements],
+                         [elements.StringLiteral, elements.StringLiteral, elements.OneOfSet])
+
+    def test_fuse_literals(self):
+        grammar = "'a' 'b' <c: .> 'd' 'e' 'f' !'g' 'h'"
+        compiled = self._compile(grammar)
+
+        self.assertEqual(self._rewrite_kinds(grammar), [optimizer.FUSE_LITERALS, optimizer.FUSE_LITERALS])
+        self.assertEqual([type(element) for element in compiled._grammar.sub_elements], [
+            elements.LiteralSequence,
+            elements.NamedElement,
+            elements.LiteralSequence,
+            elements.StringLiteral,
+            elements.StringLiteral
+        ])
+        self.assertEqual(compiled._grammar.sub_elements[2].token_strs, ["d", "e", "f"])
+
+        self.assertMatchesUnoptimized(grammar, [
+            "a b c d e f x h",
+            "A B c D E F x H",
+            "a b c d e f g h",
+            "a b c d e",
+            "a b c d e f",
+            "a",
+            "",
+        ])
+
+    def test_fuse_literals_flags(self):
+        # Only literals comparing against the same form of token are fused
+        self.assertEqual(self._rewrite_kinds("'a' s'b' q'c'"), [])
+        self.assertEqual(self._rewrite_kinds("u'a' u'b' 'c'"), [optimizer.FUSE_LITERALS])
+
+        self.assertMatchesUnoptimized("s'a' s'b' *(c: q'c' q'd')", [
+            "a b 'c' 'd' 'c' 'd'",
+            "a B",
+            "A b",
+            "a b c d",
+            "a b 'c' \"D\"",
+        ])
+        self.assertMatchesUnoptimized("u'a' u'b' u'c'", ["a b c", "a 'b' c", "'a' 'b' 'c'", "a b"])
+
+    def test_flatten_one_of_set(self):
+        grammar = "{ <a: 'a'> { 'b' 'c' { (d: 'd') } } 'e' }"
+        compiled = self._compile(grammar)
+
+        self.assertEqual(self._rewrite_kinds(grammar), [
+            optimizer.COLLAPSE_ONE_OF_SET,
+            optimizer.FLATTEN_ONE_OF_SET,
+            optimizer.MERGE_ALTERNATIVES,
+        ])
+        self.assertEqual([type(element) for element in compiled._grammar.sub_elements[0].sub_elements], [
+            elements.LiteralSet,
+            elements.Grammar,
+            elements.StringLiteral,
+        ])
+
+        self.assertMatchesUnoptimized(grammar, ["a", "b", "c", "d", "e", "f", "a b"])
+
+    def test_collapse_one_of_set(self):
+        grammar = "{ { <a: 'a'> } } 'b'"
+        compiled = self._compile(grammar)
+
+        self.assertEqual(self._rewrite_kinds(grammar), [optimizer.COLLAPSE_ONE_OF_SET, optimizer.COLLAPSE_ONE_OF_SET])
+        self.assertEqual([type(element) for element in compiled._grammar.sub_elements],
+                         [elements.NamedElement, elements.StringLiteral])
+
+        self.assertMatchesUnoptimized(grammar, ["a b", "a", "b", "a b c"])
+
+    def test_factor_alternatives(self):
+        grammar = """
+            {
+                (alias: <a: .> 'AS' <name: .>)
+                (into: <a: .> 'INTO' <target: .>)
+                <a: .>
+                'x'
+                (other: 'x' 'y')
+                (overridden: <b: .> <b: .>)
+            }
+        """
+        compiled = self._compile(grammar)
+
+        self.assertEqual(self._rewrite_kinds(grammar), [optimizer.FACTOR_ALTERNATIVES, optimizer.FACTOR_ALTERNATIVES])
+
+        alternatives = compiled._grammar.sub_elements[0].sub_elements
+        self.assertEqual([type(element) for element in alternatives], [
+            elements.FactoredAlternatives,
+            elements.FactoredAlternatives,
+            elements.Grammar,
+        ])
+        self.assertEqual([tail.name for tail in alternatives[0].sub_elements], ["alias", "into", None])
+        self.assertEqual([len(tail.sub_elements) for tail in alternatives[0].sub_elements], [2, 2, 0])
+
+        self.assertMatchesUnoptimized(grammar, [
+            "b AS c",
+            "b INTO c",
+            "b",
+            "b c",
+            "x",
+            "x y",
+            "x z",
+            "AS",
+            "",
+        ])
+
+    def test_factor_alternatives_order(self):
+        # Alternatives are only factored with those adjacent to them, so that they are still tried in order
+        self.assertNotIn(optimizer.FACTOR_ALTERNATIVES, self._rewrite_kinds("{ (a: 'x' 'y') 'z' (b: 'x' 'w') }"))
+
+        grammar = """
+            def expression { +(terms: <term: !~;|AS|INTO~> ) }
+            +(statements:
+                {
+                    (alias: expression() 'AS' <name: .> )
+                    (into: expression() 'INTO' <target: .> )
+                    (bare: expression() )
+                }
+                sep { ';' }
+            )
+        """
+        self.assertIn(optimizer.FACTOR_ALTERNATIVES, self._rewrite_kinds(grammar))
+        self.assertMatchesUnoptimized(grammar, ["a b AS c; d INTO e; f g", "a AS", "a; b; c AS d", "; a", "AS"])
+
+    def test_merge_alternatives(self):
+        grammar = r"""
+            {
+                ~a[0-9]+~ ~b~ <x: ~c.*~>
+                'lit' <y: 'other'> <z: 'lit'>
+                (g: 'z')
+                ~(a)\\1~
+                <first: ~d~> <second: ~d.*~>
+            }
+        """
+        compiled = self._compile(grammar)
+
+        self.assertEqual(self._rewrite_kinds(grammar), [optimizer.MERGE_ALTERNATIVES] * 3)
+        self.assertEqual([type(element) for element in compiled._grammar.sub_elements[0].sub_elements], [
+            elements.RegexSet,
+            elements.LiteralSet,
+            elements.Grammar,
+            elements.RegexString,
+            elements.RegexSet,
+        ])
+
+        self.assertMatchesUnoptimized(grammar, [
+            "a1", "A1", "b", "c9", "lit", "'lit'", "other", "z", "aa", "d", "dd", "q", "a1 b", "",
+        ])
+
+    def test_merge_alternatives_compatibility(self):
+        # Alternatives comparing against different forms of token, or negated, aren't merged
+        self.assertEqual(self._rewrite_kinds("{ 'a' s'b' q'c' u'd' !'e' 'f' }"), [])
+        self.assertEqual(self._rewrite_kinds("{ ~a~ s~b~ q~c~ }"), [])
+
+        # Nor are patterns which can't be combined
+        self.assertEqual(self._rewrite_kinds("{ s~(?P<n>a)~ s~(?P<n>b)~ }"), [])
+        self.assertEqual(self._rewrite_kinds("{ ~(?i)a~ ~b~ }"), [])
+
+        grammar = "{ q'a' <b: q'b'> } { u~c~ <d: u~d+~> }"
+        self.assertEqual(self._rewrite_kinds(grammar), [optimizer.MERGE_ALTERNATIVES] * 2)
+        self.assertMatchesUnoptimized(grammar, ["'a' c", "'b' dd", "a c", "'a' 'c'", "\"b\" d"])
+
+    def test_structurally_equal(self):
+        def _merged(grammar):
+            return self._compile(grammar)._grammar.sub_elements[0].sub_elements[0]
+
+        # Merged alternatives are compared by the alternatives they contain
+        self.assertTrue(optimizer._structurally_equal(_merged("{ 'a' <b: 'b'> }"), _merged("{ 'a' <b: 'b'> }")))
+        self.assertFalse(optimizer._structurally_equal(_merged("{ 'a' <b: 'b'> }"), _merged("{ 'a' 'b' }")))
+        self.assertFalse(optimizer._structurally_equal(_merged("{ 'a' 'b' }"), _merged("{ 'a' 'c' }")))
+        self.assertFalse(optimizer._structurally_equal(_merged("{ ~a~ ~b~ }"), _merged("{ ~a~ ~c~ }")))
+        self.assertTrue(optimizer._structurally_equal(_merged("{ ~a~ ~b~ }"), _merged("{ ~a~ ~b~ }")))
+
+        with self.assertRaises(TypeError):
+            optimizer._structurally_equal(object(), object())
+
+    def test_inline_sub_grammar(self):
+        grammar = """
+            def pair { <first: .> ',' <second: .> }
+            def keyword { 'x' 'y' }
+            def either { 'z' pair() }
+
+            (pairs: pair() keyword() 'end')
+            { keyword() either() }
+            ?(optional: keyword())
+        """
+        compiled = self._compile(grammar)
+
+        self.assertIn(optimizer.INLINE_SUB_GRAMMAR, self._rewrite_kinds(grammar))
+        self.assertEqual([type(element) for element in compiled._grammar.sub_elements[0].sub_elements], [
+            elements.NamedElement,
+            elements.StringLiteral,
+            elements.NamedElement,
+            elements.LiteralSequence,
+        ])
+
+        # The alternatives of keyword() & either() are moved into the One of Set, including those of pair(), as the
+        # elements of sub grammars used within either() are alternatives of it
+        self.assertEqual([type(element) for element in compiled._grammar.sub_elements[1].sub_elements], [
+            elements.LiteralSet,
+            elements.NamedElement,
+            elements.StringLiteral,
+            elements.NamedElement,
+        ])
+
+        self.assertMatchesUnoptimized(grammar, [
+            "a , b x y end x",
+            "a , b x y end y",
+            "a , b x y end z",
+            "a , b x y end a , b",
+            "a , b x y end z x y",
+            "a , b x y end x x y",
+            "a , b x y end y x y",
+            "a , b x y end x x",
+            "a , b x y",
+            "a , b x y end a",
+            "a , b x y end ,",
+        ])
+
+    def test_recursive_sub_grammars(self):
+        grammar = """
+            def value { <number: ~[0-9]+~> (list: '[' list() ']') }
+            def list { ?(items: value() *(more: ',' value())) }
+
+            value()
+        """
+        compiled = self._compile(grammar)
+
+        # The usages of recursive sub grammars are left in place
+        self.assertEqual(self._rewrite_kinds(grammar), [])
+        self.assertEqual(type(compiled._grammar.sub_elements[0]), elements.SubGrammarUsage)
+
+        self.assertMatchesUnoptimized(grammar, ["1", "[ ]", "[ 1 , [ 2 , 3 ] , [ ] ]", "[ 1 , ]", "[ [ 1 ] ] ]"])
+
+    def test_nested_sub_grammars_growth(self):
+        # Sub grammars are only inlined while the lists of elements they are inlined into remain small, so that
+        # grammars using their sub grammars many times over do not grow exponentially
+        depth = 60
+        definitions = ["def level0 { 'a' }"]
+        for level in range(1, depth):
+            definitions.append("def level%d { level%d() level%d() }" % (level, level - 1, level - 1))
+        grammar = "\n".join(definitions) + "\nlevel%d()" % (depth - 1)
+
+        start = time.time()
+        compiled = self._compile(grammar)
+        self.assertLess(time.time() - start, 5)
+
+        self.assertLess(len(list(analysis.iter_elements(compiled._grammar))), depth * 4)
+        self.assertIsNone(compiled.match("a"))
@@ -43,6 +43,145 @@ class TestTokenizer(_test_case.TokexTestCase):
         ])
 
 
+    def test_ignore_empty_lines(self):
+        tokenizer = tokenizers.TokexTokenizer(tokenize_newlines=True, ignore_empty_lines=True)
+
+        self.assertEqual(tokenizer.tokenize(""), [])
+        self.assertEqual(tokenizer.tokenize("\n\n\n"), [])
+        self.assertEqual(tokenizer.tokenize("\n\na\n\n\nb\nc"), ["a", "\n", "b", "\n", "c"])
+        self.assertEqual(tokenizer.tokenize("a\n \n\t\nb\n\n"), ["a", "\n", "b", "\n"])
+
+        # Tokenizing should not alter the tokenizer, so the same input is always tokenized the same way
+        self.assertEqual(tokenizer.tokenize("\n\na\n\n\nb\nc"), ["a", "\n", "b", "\n", "c"])
+
+
+    def test_iter_tokens(self):
+        for tokenizer in (tokenizers.TokexTokenizer(), tokenizers.TokexTokenizer(tokenize_newlines=True),
+                          tokenizers.TokexTokenizer(tokenize_newlines=True, ignore_empty_lines=True)):
+            self.assertEqual(list(tokenizer.iter_tokens(self.input_string)), tokenizer.tokenize(self.input_string))
+
+        # Tokenizers implementing their own tokenize function are iterated over in the same way
+        class ReversedTokenizer(tokenizers.TokexTokenizer):
+            def tokenize(self, input_string):
+                return super(ReversedTokenizer, self).tokenize(input_string)[::-1]
+
+        self.assertEqual(list(ReversedTokenizer().iter_tokens("a b c")), ["c", "b", "a"])
+
+    def test_lazy_token_buffer(self):
+        class SmallChunkBuffer(tokenizers.LazyTokenBuffer):
+            FIRST_CHUNK_SIZE = 2
+
+        tokenizer = tokenizers.TokexTokenizer()
+        expected = tokenizers.TokenBuffer(tokenizer.tokenize(self.input_string))
+
+        tokens = SmallChunkBuffer(tokenizer.iter_tokens(self.input_string))
+        self.assertEqual((tokens.length, tokens.complete), (2, False))
+
+        # Buffers are filled in chunks as large as all of the tokens held so far
+        self.assertTrue(tokens.has_token(2))
+        self.assertEqual(tokens.length, 4)
+        self.assertTrue(tokens.has_token(10))
+        self.assertEqual(tokens.length, 11)
+        self.assertEqual(tokens[3], expected[3])
+        self.assertEqual(list(tokens), expected.tokens)
+        self.assertTrue(tokens.complete)
+        self.assertFalse(tokens.has_token(len(expected)))
+        self.assertEqual(tokens.views, expected.views)
+        self.assertEqual(tokens.quoted, expected.quoted)
+
+
+    def test_tokenize_spans(self):
+        for tokenizer in (tokenizers.TokexTokenizer(), tokenizers.TokexTokenizer(tokenize_newlines=True),
+                          tokenizers.TokexTokenizer(tokenize_newlines=True, ignore_empty_lines=True),
+                          tokenizers.NumericTokenizer()):
+            starts, ends = tokenizer.tokenize_spans(self.input_string)
+
+            self.assertEqual(
+                [self.input_string[start:end] for start, end in zip(starts, ends)],
+                tokenizer.tokenize(self.input_string)
+            )
+
+        # Tokenizers implementing their own tokenize function have their tokens found within the string
+        class UpperTokenizer(tokenizers.TokexTokenizer):
+            def tokenize(self, input_string):
+                return [token for token in super(UpperTokenizer, self).tokenize(input_string) if token.isupper()]
+
+        self.assertEqual([list(offsets) for offsets in UpperTokenizer().tokenize_spans("a B c B")], [[2, 6], [3, 7]])
+
+        class LowerTokenizer(tokenizers.TokexTokenizer):
+            def tokenize(self, input_string):
+                return [token.lower() for token in super(LowerTokenizer, self).tokenize(input_string)]
+
+        with self.assertRaises(ValueError):
+            LowerTokenizer().tokenize_spans("a B")
+
+    def test_span_token_buffer(self):
+        tokenizer = tokenizers.TokexTokenizer(spans=True)
+        input_string = "SELECT 'Quoted' \"b\" FROM c"
+        expected = tokenizers.TokenBuffer(tokenizers.TokexTokenizer().tokenize(input_string))
+
+        tokens = tokenizer.token_buffer(input_string)
+        self.assertIsInstance(tokens, tokenizers.SpanTokenBuffer)
+        self.assertEqual(len(tokens), len(expected))
+        self.assertEqual(list(tokens.quoted), expected.quoted)
+
+        for view, expected_view in zip(tokens.views, expected.views):
+            self.assertEqual(list(view), expected_view)
+            self.assertEqual(view[1:3], expected_view[1:3])
+            self.assertEqual(view[-1], expected_view[-1])
+
+        self.assertEqual(list(tokenizer.token_buffer(input_string, capture_offsets=True).captures),
+                         [(0, 6), (7, 15), (16, 19), (20, 24), (25, 26)])
+
+
+    def test_tokenize_binary(self):
+        data = self.input_string.encode("utf-8")
+
+        for tokenizer in (tokenizers.TokexTokenizer(),
+                          tokenizers.TokexTokenizer(tokenize_newlines=True, ignore_empty_lines=True)):
+            expected = tokenizer.tokenize(self.input_string)
+
+            for binary_input in (data, bytearray(data), memoryview(data)):
+                self.assertEqual(tokenizer.tokenize(binary_input), expected)
+                self.assertEqual(list(tokenizer.iter_tokens(binary_input)), expected)
+                self.assertEqual(list(tokenizer.token_buffer(binary_input).tokens), expected)
+
+        # Non ASCII characters are tokenized as they are within strings, and decoded using the tokenizer's encoding
+        non_ascii_string = "caf\u00e9 na\u00efve x '\u00e9t\u00e9' \u00e9lan \u00e0-\u00e9 !\u00e9"
+        for tokenizer in (tokenizers.TokexTokenizer(), tokenizers.TokexTokenizer(encoding="latin-1"),
+                          tokenizers.TokexTokenizer([r"\b\w+\b", r"[\w]+", r"[^\w\s]+"])):
+            expected = tokenizer.tokenize(non_ascii_string)
+            data = non_ascii_string.encode(tokenizer.encoding)
+
+            self.assertEqual(tokenizer.tokenize(data), expected)
+            self.assertEqual(list(tokenizer.iter_tokens(data)), expected)
+            self.assertEqual(list(tokenizer.token_buffer(data).tokens), expected)
+
+        self.assertEqual(tokenizers.TokexTokenizer().tokenize(non_ascii_string)[:3], ["caf\u00e9", "na\u00efve", "x"])
+
+        # Regexes splitting characters encoded as several bytes produce tokens which cannot be decoded
+        tokenizer = tokenizers.TokexTokenizer([r"\w", r"[^\w\s]"])
+        self.assertEqual(tokenizer.tokenize("\u00e9"), ["\u00e9"])
+
+        for tokenize in (tokenizer.tokenize, lambda data: list(tokenizer.iter_tokens(data)),
+                         lambda data: list(tokenizer.token_buffer(data).tokens)):
+            with self.assertRaises(ValueError) as cm:
+                tokenize(b"\xc3\xa9")
+
+            self.assertIn("must match whole characters", str(cm.exception))
+
+        # Bytes-like inputs can only be tokenized in encodings which encode ASCII characters as single bytes
+        tokenizer = tokenizers.TokexTokenizer(encoding="utf-16-le")
+        for tokenize in (tokenizer.tokenize, lambda data: list(tokenizer.iter_tokens(data)),
+                         lambda data: list(tokenizer.token_buffer(data).tokens), tokenizer.tokenize_spans):
+            with self.assertRaises(ValueError) as cm:
+                tokenize(u"a b".encode("utf-16-le"))
+
+            self.assertIn("utf-16-le", str(cm.exception))
+
+        self.assertEqual(tokenizer.tokenize("a b"), ["a", "b"])
+
+
 class TestNumericTokenizer(_test_case.TokexTestCase):
 
     input_string = r"""
@@ -63,3 +202,24 @@ class TestNumericTokenizer(_test_case.TokexTestCase):
 
             "==", "<=", ">=", "!=", "...", "!=...<="
         ])
+
+
+class TestTokenBuffer(_test_case.TokexTestCase):
+
+    def test_token_buffer(self):
+        tokens = ["Select", "'Quoted Word'", '"X"', '"', "'mismatched\"", "=="]
+        token_buffer = tokenizers.TokenBuffer(tokens)
+
+        self.assertIs(token_buffer.tokens, tokens)
+        self.assertEqual(token_buffer.length, 6)
+        self.assertEqual(len(token_buffer), 6)
+        self.assertEqual(token_buffer[1], "'Quoted Word'")
+        self.assertEqual(list(token_buffer), tokens)
+
+        self.assertEqual(token_buffer.lowered, ["select", "'quoted word'", '"x"', '"', "'mismatched\"", "=="])
+        self.assertEqual(token_buffer.quoted, [False, True, True, True, False, False])
+        self.assertEqual(token_buffer.bodies, [None, "Quoted Word", "X", "", None, None])
+        self.assertEqual(token_buffer.lowered_bodies, [None, "quoted word", "x", "", None, None])
+
+        self.assertIs(tokenizers.TokenBuffer.wrap(token_buffer), token_buffer)
+        self.assertEqual(tokenizers.TokenBuffer.wrap(("a", "b")).tokens, ["a", "b"])
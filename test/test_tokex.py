@@ -1,6 +1,14 @@
+import logging
+import mmap
+import tempfile
+import threading
+import warnings
+
 import _test_case
 import tokex
+from tokex.logger import TemporaryLogLevel
 from tokex.tokex_class import Tokex
+import _sql_grammars
 
 class TestTokex(_test_case.TokexTestCase):
 
@@ -35,3 +43,552 @@ class TestTokex(_test_case.TokexTestCase):
         self.assertIsNone(parser2.match('a b c'))
         self.assertIsNotNone(parser2.match('a b c', match_entirety=False))
         self.assertIsNone(parser2.match('a', match_entirety=False))
+
+
+    def test_tokex_compile_nested_sub_grammars(self):
+        # Each definition doubles the previous one; expanding them would require 2 ** 60 elements
+        grammar = "def d0 { 'a' }\n"
+        grammar += "".join("def d%d { d%d() d%d() }\n" % (i, i - 1, i - 1) for i in range(1, 61))
+        grammar += "'b' ?(rest: d60() )"
+
+        for engine in Tokex.ENGINES:
+            parser = tokex.compile(grammar, engine=engine)
+
+            self.assertDictEqual(parser.match("b"), {})
+            self.assertIsNone(parser.match("b a a"))
+
+
+    def test_tokex_max_recursion_depth(self):
+        grammar = r"""
+            def value { { <number: ~[0-9]+~> list() } }
+            def list { (list: '[' *(items: value() sep { ',' } ) ']' ) }
+            value()
+        """
+
+        for engine in Tokex.ENGINES:
+            for memoize in (False, True):
+                # Each level of nesting uses both value() and list(); matching the items of an empty list also tries
+                # value() then list() once more
+                parser = tokex.compile(grammar, engine=engine, memoize=memoize, max_recursion_depth=6)
+
+                self.assertIsNotNone(parser.match("[ [ 1 ] , [ 2 ] , [ ] ]"))
+                self.assertIsNotNone(parser.match("[ [ 1 ] , [ 2 ] , [ ] ]"))
+
+                with self.assertRaises(tokex.errors.RecursionDepthExceededError):
+                    parser.match("[ [ [ 1 ] ] ]")
+
+                # Matches which raised do not affect those which follow
+                self.assertIsNotNone(parser.match("[ [ 1 ] ]"))
+
+        self.assertIsNotNone(tokex.compile(grammar).match("[ " * 20 + "] " * 20))
+
+
+    def test_tokex_left_recursion(self):
+        # Left recursive grammars are rejected rather than recursing forever when matched, whatever the engine
+        for engine in Tokex.ENGINES:
+            with self.assertRaises(tokex.errors.LeftRecursiveSubGrammarError):
+                tokex.compile("def a { { (x: a() 'x') 'y' } } a()", engine=engine)
+
+            with self.assertRaises(tokex.errors.LeftRecursiveSubGrammarError):
+                tokex.compile("def a { ?('p') b() } def b { a() 'q' } 'r' a()", engine=engine)
+
+            # Recursion after a token has been consumed is not left recursion
+            parser = tokex.compile("def a { { (x: 'x' a()) 'y' } } a()", engine=engine)
+            self.assertEqual(parser.match("x x y"), {"x": {"x": None}})
+            self.assertIsNone(parser.match("x x"))
+
+
+    def test_tokex_match_cache(self):
+        tokex.clear_cache()
+        self.addCleanup(tokex.set_cache_size, tokex.cache_info().max_size)
+
+        self.assertIsNotNone(tokex.match('"a" "b"', 'a b'))
+        self.assertEqual(tokex.cache_info()[:2], (0, 1))
+
+        self.assertIsNotNone(tokex.match('"a" "b"', 'a b'))
+        self.assertEqual(tokex.cache_info()[:2], (1, 1))
+
+        # Grammars differing only in whitespace and comments share an entry
+        self.assertIsNone(tokex.match('"a"   "b" # comment', 'a c'))
+        self.assertEqual(tokex.cache_info()[:2], (2, 1))
+
+        # Whitespace within literals is significant
+        self.assertIsNone(tokex.match('"a " "b"', 'a b'))
+        self.assertEqual(tokex.cache_info()[:2], (2, 2))
+
+        # Differing settings are cached separately
+        self.assertIsNone(tokex.match('"a" "b"', 'A B', default_flags={tokex.flags.CASE_SENSITIVE}))
+        self.assertEqual(tokex.cache_info()[:2], (2, 3))
+
+        newline_tokenizer = tokex.tokenizers.TokexTokenizer(tokenize_newlines=True)
+        self.assertIsNotNone(tokex.match('"a" $ "b"', 'a \n b', tokenizer=newline_tokenizer))
+        self.assertIsNotNone(tokex.match('"a" $ "b"', 'a \n b', tokenizer=tokex.tokenizers.TokexTokenizer(tokenize_newlines=True)))
+        self.assertEqual(tokex.cache_info()[:2], (3, 4))
+        self.assertIsNone(tokex.match('"a" $ "b"', 'a \n b'))
+        self.assertEqual(tokex.cache_info()[:2], (3, 5))
+
+        # The patterns a tokenizer compiles once it's given a bytes-like input don't change its entry
+        self.assertIsNotNone(tokex.match('"a" $ "b"', b'a \n b', tokenizer=newline_tokenizer))
+        self.assertIsNotNone(tokex.match('"a" $ "b"', 'a \n b', tokenizer=newline_tokenizer))
+        self.assertEqual(tokex.cache_info()[:2], (5, 5))
+
+        # Least recently used entries are evicted once the cache is full
+        tokex.set_cache_size(2)
+        self.assertEqual(tokex.cache_info().current_size, 2)
+        tokex.match('"c"', 'c')
+        tokex.match('"d"', 'd')
+        tokex.match('"c"', 'c')
+        tokex.match('"e"', 'e')
+        hits, misses, max_size, current_size = tokex.cache_info()
+        self.assertEqual((max_size, current_size), (2, 2))
+        tokex.match('"c"', 'c')
+        self.assertEqual(tokex.cache_info().hits, hits + 1)
+        tokex.match('"d"', 'd')
+        self.assertEqual(tokex.cache_info().misses, misses + 1)
+
+        tokex.clear_cache()
+        self.assertEqual(tokex.cache_info(), (0, 0, 2, 0))
+
+        # A size of 0 disables caching
+        tokex.set_cache_size(0)
+        tokex.match('"c"', 'c')
+        tokex.match('"c"', 'c')
+        self.assertEqual(tokex.cache_info(), (0, 2, 0, 0))
+
+
+    def test_tokex_match_debug(self):
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        tokex.logger.addHandler(handler)
+        self.addCleanup(tokex.logger.removeHandler, handler)
+        self.addCleanup(tokex.logger.setLevel, tokex.logger.level)
+        tokex.logger.setLevel(logging.WARNING)
+
+        parser = tokex.compile("'a' <b: .>")
+
+        self.assertEqual(parser.match("a b"), {"b": "b"})
+        self.assertEqual(records, [])
+
+        # Debugging a single match must not change the level of the shared logger
+        self.assertEqual(parser.match("a b", debug=True), {"b": "b"})
+        self.assertEqual(tokex.logger.level, logging.WARNING)
+        self.assertTrue(records)
+        self.assertTrue(all(record.levelno == logging.DEBUG for record in records))
+
+    def test_tokex_temporary_log_level(self):
+        self.addCleanup(tokex.logger.setLevel, tokex.logger.level)
+        tokex.logger.setLevel(logging.WARNING)
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+
+            with TemporaryLogLevel(logging.DEBUG):
+                self.assertEqual(tokex.logger.level, logging.DEBUG)
+
+        self.assertEqual(tokex.logger.level, logging.WARNING)
+        self.assertEqual([warning.category for warning in caught], [DeprecationWarning])
+
+    def test_tokex_match_threads(self):
+        parser = tokex.compile("'a' *(bs: <b: .> sep { ',' })")
+        failures = []
+
+        def _match(thread_num):
+            for i in range(200):
+                expected = {"bs": [{"b": str(thread_num)}, {"b": str(i)}]}
+                if parser.match("a %s, %s" % (thread_num, i), debug=(i % 50 == 0)) != expected:
+                    failures.append((thread_num, i))
+
+        threads = [threading.Thread(target=_match, args=(thread_num,)) for thread_num in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(failures, [])
+
+    def test_tokex_match_tracer(self):
+        class RecordingTracer(tokex.tracing.Tracer):
+            def __init__(self):
+                self.events = []
+
+            def start(self, string_tokens):
+                self.events.append(("start", list(string_tokens)))
+
+            def enter(self, element, string_tokens, idx):
+                self.events.append(("enter", element.human_readable_name(), idx))
+
+            def match(self, element, string_tokens, idx, new_idx, output):
+                self.events.append(("match", element.human_readable_name(), idx, new_idx, output))
+
+            def exit(self, element, string_tokens, idx, match, new_idx):
+                self.events.append(("exit", element.human_readable_name(), idx, match))
+
+        parser = tokex.compile("'a' { ~b~ <c: 'c'> }")
+
+        tracer = RecordingTracer()
+        self.assertEqual(parser.match("a c", tracer=tracer), {"c": "c"})
+        self.assertEqual(tracer.events, [
+            ("start", ["a", "c"]),
+            ("enter", "Named Section (None: ...)", 0),
+            ("enter", "String Literal a", 0),
+            ("match", "String Literal a", 0, 1, None),
+            ("exit", "String Literal a", 0, True),
+            ("enter", "One of Set {...}", 1),
+            ("enter", "Regular Expression b", 1),
+            ("exit", "Regular Expression b", 1, False),
+            ("enter", "Named Element <c: ...>", 1),
+            ("enter", "String Literal c", 1),
+            ("match", "String Literal c", 1, 2, None),
+            ("exit", "String Literal c", 1, True),
+            ("match", "Named Element <c: ...>", 1, 2, {"c": "c"}),
+            ("exit", "Named Element <c: ...>", 1, True),
+            ("match", "One of Set {...}", 1, 2, {"c": "c"}),
+            ("exit", "One of Set {...}", 1, True),
+            ("match", "Named Section (None: ...)", 0, 2, {None: {"c": "c"}}),
+            ("exit", "Named Section (None: ...)", 0, True),
+        ])
+
+        # Tracers are only used for the match they are given to
+        self.assertEqual(parser.match("a b"), {})
+        self.assertEqual(len(tracer.events), 18)
+
+    def test_tokex_memoize(self):
+        shared_prefix_grammar = """
+            def expression { +(terms: <term: !~;|AS|INTO~> ) }
+            +(statements:
+                {
+                    (alias: expression() 'AS' <name: .> )
+                    (into: expression() 'INTO' <target: .> )
+                    (bare: expression() )
+                }
+                sep { ';' }
+            )
+        """
+        diverging_grammar = """
+            def expression { +(terms: <term: !~;|AS|INTO~> ) }
+            { (alias: 'AS' expression()) (into: 'INTO' expression()) }
+        """
+
+        # Memoization is only enabled by default where several alternatives begin with the same elements.  Unless the
+        # optimizer is disabled, those elements are instead matched once for all of the alternatives
+        self.assertTrue(tokex.compile(shared_prefix_grammar, optimize=False).memoize)
+        self.assertFalse(tokex.compile(shared_prefix_grammar).memoize)
+        self.assertFalse(tokex.compile(diverging_grammar).memoize)
+        self.assertFalse(tokex.compile(shared_prefix_grammar, memoize=False).memoize)
+        self.assertTrue(tokex.compile(diverging_grammar, memoize=True).memoize)
+
+        for grammar, input_strings in (
+            (shared_prefix_grammar, ["a b AS c; d INTO e; f g", "a AS", "a; b; c AS d"]),
+            (diverging_grammar, ["AS a b", "INTO a", "a"]),
+        ):
+            plain = tokex.compile(grammar, memoize=False)
+            memoized = tokex.compile(grammar, memoize=True)
+
+            for input_string in input_strings:
+                self.assertEqual(plain.match(input_string), memoized.match(input_string))
+                self.assertEqual(
+                    plain.match(input_string, match_entirety=False),
+                    memoized.match(input_string, match_entirety=False)
+                )
+
+        self.assertEqual(tokex.compile(shared_prefix_grammar, memoize=True).match("a b AS c; d INTO e; f g"), {
+            "statements": [
+                {"alias": {"terms": [{"term": "a"}, {"term": "b"}], "name": "c"}},
+                {"into": {"terms": [{"term": "d"}], "target": "e"}},
+                {"bare": {"terms": [{"term": "f"}, {"term": "g"}]}},
+            ]
+        })
+
+    def test_tokex_is_match(self):
+        recursive_grammar = r"""
+            def value { { <number: ~[0-9]+~> list() } }
+            def list { (list: '[' *(items: value() sep { ',' } ) ']' ) }
+            value()
+        """
+        grammars = _sql_grammars.SQL_GRAMMARS + (
+            ("recursive", recursive_grammar, ["[ 1 , [ 2 , [ ] ] ]", "[ 1 , ]", "[ [ 1 ] ] ]"]),
+            ("named sets", "+(tokens: { <a: 'a'> <b: ~b+~> 'c' } sep { <d: 'd'> })", ["a d bb d c", "a d", "a b"]),
+        )
+
+        for _, grammar, inputs in grammars:
+            inputs = inputs + [input_string.rsplit(" ", 1)[0] for input_string in inputs] + [""]
+
+            for engine in Tokex.ENGINES:
+                for memoize in (False, True):
+                    for optimize in (False, True):
+                        parser = tokex.compile(grammar, engine=engine, memoize=memoize, optimize=optimize)
+
+                        for input_string in inputs:
+                            for match_entirety in (True, False):
+                                self.assertEqual(
+                                    parser.is_match(input_string, match_entirety=match_entirety),
+                                    parser.match(input_string, match_entirety=match_entirety) is not None,
+                                    "%s engine differs for %r against %r" % (engine, grammar, input_string)
+                                )
+
+        parser = tokex.compile(recursive_grammar, max_recursion_depth=2)
+        with self.assertRaises(tokex.errors.RecursionDepthExceededError):
+            parser.is_match("[ [ [ 1 ] ] ]")
+
+    def test_tokex_count(self):
+        parser = tokex.compile(_sql_grammars.DROP_GRAMMAR)
+
+        # The last of the README inputs has no target
+        self.assertEqual(parser.count(_sql_grammars.DROP_INPUTS), 2)
+        self.assertEqual(parser.count(["DROP", "DROP TABLE a b"] + _sql_grammars.DROP_INPUTS), 2)
+        self.assertEqual(parser.count(iter(["DROP TABLE a b", "DROP TABLE a"]), match_entirety=False), 2)
+        self.assertEqual(parser.count([]), 0)
+
+    def test_tokex_prefilter(self):
+        parser = tokex.compile("'a' ?(b: 'b' <c: .>) { 'd' 'e' } +(f: 'f' sep { ',' })")
+
+        self.assertEqual((parser.min_tokens, parser.max_tokens), (3, None))
+        self.assertEqual(tokex.compile(_sql_grammars.DROP_GRAMMAR).max_tokens, 5)
+
+        for engine in Tokex.ENGINES:
+            parser = tokex.compile("'a' ?(b: 'b' <c: .>) { 'd' 'e' } <f: 'f'>", engine=engine)
+            self.assertEqual((parser.min_tokens, parser.max_tokens), (3, 5))
+
+            # Too few tokens, too many tokens & missing a required literal
+            self.assertIsNone(parser.match("a d"))
+            self.assertIsNone(parser.match("a b c d f f"))
+            self.assertFalse(parser.is_match("a b c e x"))
+            self.assertEqual(parser.prefilter_rejections, 3)
+
+            # Trailing tokens are allowed when the entire input needn't match
+            self.assertEqual(parser.match("a b c d f f", match_entirety=False), {"b": {"c": "c"}, "f": "f"})
+            self.assertTrue(parser.is_match("A e F"))
+            self.assertEqual(parser.prefilter_rejections, 3)
+
+            # Traced matches are never rejected
+            self.assertIsNone(parser.match("a d", tracer=tokex.tracing.Tracer()))
+            self.assertEqual(parser.prefilter_rejections, 3)
+
+            # Spans aren't sliced out of the input to check for the literals, only counted
+            self.assertIsNone(parser.match_tokens(parser.tokenize("a b c e x", capture_offsets=True)))
+            self.assertIsNone(parser.match_tokens(parser.tokenize("a d", capture_offsets=True)))
+            self.assertEqual(parser.prefilter_rejections, 4)
+
+            # Rejections in each thread are counted separately, and summed when read
+            threads = [threading.Thread(target=parser.match, args=("a d", )) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(parser.prefilter_rejections, 8)
+
+            unfiltered = tokex.compile("'a' ?(b: 'b' <c: .>) { 'd' 'e' } <f: 'f'>", engine=engine, prefilter=False)
+            self.assertIsNone(unfiltered.match("a d"))
+            self.assertFalse(unfiltered.is_match("a b c e x"))
+            self.assertTrue(unfiltered.is_match("A e F"))
+            self.assertEqual(unfiltered.prefilter_rejections, 0)
+
+        # Recursive sub grammars can match any number of tokens
+        parser = tokex.compile("def v { { 'x' (l: '[' v() ']') } } v()")
+        self.assertEqual((parser.min_tokens, parser.max_tokens), (1, None))
+        self.assertIsNotNone(parser.match("[ [ x ] ]"))
+
+    def test_tokex_match_tokens(self):
+        drop = tokex.compile(_sql_grammars.DROP_GRAMMAR)
+        update = tokex.compile(_sql_grammars.UPDATE_GRAMMAR)
+        expected = {"target": "TABLE", "if_exists": None, "name": "test_table"}
+
+        tokens = drop.tokenize("DROP TABLE IF EXISTS test_table")
+        self.assertIsInstance(tokens, tokex.tokenizers.TokenBuffer)
+
+        # A single tokenization can be matched against several grammars, any number of times
+        for engine in Tokex.ENGINES:
+            drop = tokex.compile(_sql_grammars.DROP_GRAMMAR, engine=engine)
+
+            self.assertEqual(drop.match_tokens(tokens), expected)
+            self.assertEqual(drop.match_tokens(tokens), expected)
+            self.assertIsNone(update.match_tokens(tokens))
+            self.assertTrue(drop.is_match_tokens(tokens))
+            self.assertFalse(update.is_match_tokens(tokens))
+
+        token_list = ["DROP", "TABLE", "IF", "EXISTS", "test_table"]
+        self.assertEqual(drop.match_tokens(token_list), expected)
+        self.assertEqual(drop.match_tokens(tuple(token_list)), expected)
+        self.assertEqual(drop.match_tokens(["DROP", "TABLE", "a", "b"], match_entirety=False),
+                         {"target": "TABLE", "name": "a"})
+        self.assertIsNone(drop.match_tokens(token_list + ["x"]))
+        self.assertTrue(drop.is_match_tokens(tuple(token_list)))
+
+        grammar_set = tokex.GrammarSet([("update", _sql_grammars.UPDATE_GRAMMAR), ("drop", _sql_grammars.DROP_GRAMMAR)])
+        self.assertEqual(grammar_set.match_tokens(tokens), ("drop", expected))
+        self.assertEqual(grammar_set.match_tokens(token_list), ("drop", expected))
+        self.assertEqual(grammar_set.tokenize("DROP a").tokens, ["DROP", "a"])
+
+    def test_tokex_lazy_tokenization(self):
+        class SingleTokenBuffer(tokex.tokenizers.LazyTokenBuffer):
+            FIRST_CHUNK_SIZE = 1
+
+        tokenizer = tokex.tokenizers.TokexTokenizer()
+
+        for name, grammar, inputs in _sql_grammars.SQL_GRAMMARS:
+            for engine in Tokex.ENGINES:
+                compiled = tokex.compile(grammar, engine=engine)
+
+                # Filling buffers a token at a time makes every element tokenize further into the input
+                for input_string in inputs + [inputs[0] + " trailing tokens", "DROP", ""]:
+                    for match_entirety in (True, False):
+                        expected = compiled.match_tokens(tokenizer.tokenize(input_string), match_entirety)
+                        lazy_tokens = SingleTokenBuffer(tokenizer.iter_tokens(input_string))
+
+                        self.assertEqual(compiled.match_tokens(lazy_tokens, match_entirety), expected)
+                        self.assertEqual(
+                            compiled.is_match_tokens(SingleTokenBuffer(tokenizer.iter_tokens(input_string)),
+                                                     match_entirety),
+                            expected is not None
+                        )
+
+        # Inputs are only tokenized as far as is needed to reject them
+        drop = tokex.compile(_sql_grammars.DROP_GRAMMAR)
+        tokens = drop.tokenize("SELECT " + "a " * 100000)
+
+        self.assertIsNone(drop.match_tokens(tokens))
+        self.assertFalse(tokens.complete)
+        self.assertEqual(tokens.length, tokex.tokenizers.LazyTokenBuffer.FIRST_CHUNK_SIZE)
+
+        self.assertEqual(len(tokens), 100001)
+        self.assertTrue(tokens.complete)
+        self.assertEqual(tokens[-1], "a")
+
+        # Grammars consuming any number of tokens examine every token of an input they match entirely, so inputs are
+        # tokenized up front for them
+        long_input = "a " * 1000
+        self.assertIs(type(tokenizer.token_buffer(long_input)), tokex.tokenizers.LazyTokenBuffer)
+        self.assertIs(type(tokenizer.token_buffer(long_input, lazy=False)), tokex.tokenizers.TokenBuffer)
+
+        every_token = tokex.compile("*(tokens: <token: .>)")
+        self.assertEqual((drop._lazy(True), every_token._lazy(True), every_token._lazy(False)), (True, False, True))
+        self.assertEqual(len(every_token.match(long_input)["tokens"]), 1000)
+
+    def test_tokex_spans(self):
+        for name, grammar, inputs in _sql_grammars.SQL_GRAMMARS:
+            for engine in Tokex.ENGINES:
+                compiled = tokex.compile(grammar, engine=engine)
+                span_compiled = tokex.compile(
+                    grammar, engine=engine, tokenizer=tokex.tokenizers.TokexTokenizer(spans=True)
+                )
+
+                for input_string in inputs + [inputs[0] + " trailing tokens", ""]:
+                    for match_entirety in (True, False):
+                        expected = compiled.match(input_string, match_entirety)
+
+                        self.assertEqual(span_compiled.match(input_string, match_entirety), expected)
+                        self.assertEqual(span_compiled.is_match(input_string, match_entirety), expected is not None)
+
+        # Named Elements can output the offsets of the tokens they capture, rather than the tokens themselves
+        input_string = "UPDATE test SET a=1, b = 'x'"
+        expected = {
+            "table_name": (7, 11),
+            "columns": [
+                {"name": (16, 17), "value": (18, 19)},
+                {"name": (21, 22), "value": (25, 28)},
+            ],
+        }
+
+        for engine in Tokex.ENGINES:
+            update = tokex.compile(_sql_grammars.UPDATE_GRAMMAR, engine=engine)
+            tokens = update.tokenize(input_string, capture_offsets=True)
+
+            self.assertEqual(update.match_tokens(tokens), expected)
+            self.assertEqual(input_string[slice(*update.match_tokens(tokens)["table_name"])], "test")
+
+    def test_tokex_binary_input(self):
+        input_string = "UPDATE test SET a = 'caf\u00e9', b = 2 WHERE x > 1"
+        data = input_string.encode("utf-8")
+
+        with tempfile.TemporaryFile() as data_file:
+            data_file.write(data)
+            data_file.flush()
+            mapped = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+            try:
+                for engine in Tokex.ENGINES:
+                    update = tokex.compile(_sql_grammars.UPDATE_GRAMMAR, engine=engine)
+                    expected = update.match(input_string)
+                    self.assertIsNotNone(expected)
+
+                    for binary_input in (data, bytearray(data), memoryview(data), mapped):
+                        self.assertEqual(update.match(binary_input), expected)
+                        self.assertTrue(update.is_match(binary_input))
+
+                # Offsets are of bytes within the input
+                update = tokex.compile(_sql_grammars.UPDATE_GRAMMAR)
+                output = update.match_tokens(update.tokenize(mapped, capture_offsets=True))
+                self.assertEqual(mapped[slice(*output["columns"][0]["value"])].decode("utf-8"), "'caf\u00e9'")
+                self.assertEqual(mapped[slice(*output["columns"][1]["name"])], b"b")
+
+            finally:
+                mapped.close()
+
+        # Words containing non ASCII characters are single tokens, as they are within strings
+        input_string = "caf\u00e9 na\u00efve x"
+        for engine in Tokex.ENGINES:
+            words = tokex.compile("<a: .> <b: .> <c: .>", engine=engine)
+            expected = {"a": "caf\u00e9", "b": "na\u00efve", "c": "x"}
+
+            self.assertEqual(words.match(input_string), expected)
+            self.assertEqual(words.match(input_string.encode("utf-8")), expected)
+
+    def test_tokex_match_iter(self):
+        inputs = [input_string for _, _, inputs in _sql_grammars.SQL_GRAMMARS for input_string in inputs] + [""]
+
+        for _, grammar, _ in _sql_grammars.SQL_GRAMMARS:
+            for engine in Tokex.ENGINES:
+                for memoize in (False, True):
+                    compiled = tokex.compile(grammar, engine=engine, memoize=memoize)
+
+                    for match_entirety in (True, False):
+                        expected = [compiled.match(input_string, match_entirety) for input_string in inputs]
+
+                        self.assertEqual(list(compiled.match_iter(inputs, match_entirety)), expected)
+                        self.assertEqual(list(compiled.match_iter(inputs, match_entirety, indexed=True)),
+                                         list(enumerate(expected)))
+
+        # Strings are only pulled from the iterable as outputs are consumed
+        pulled = []
+
+        def _inputs():
+            for input_string in _sql_grammars.DROP_INPUTS:
+                pulled.append(input_string)
+                yield input_string
+
+        outputs = tokex.compile(_sql_grammars.DROP_GRAMMAR).match_iter(_inputs())
+        self.assertEqual(pulled, [])
+        self.assertEqual(next(outputs), {"target": "DATABASE", "name": "test_database"})
+        self.assertEqual(pulled, _sql_grammars.DROP_INPUTS[:1])
+
+    def test_tokex_match_many(self):
+        inputs = [input_string for _, _, inputs in _sql_grammars.SQL_GRAMMARS for input_string in inputs] * 20
+
+        for engine in Tokex.ENGINES:
+            compiled = tokex.compile(
+                _sql_grammars.UPDATE_GRAMMAR, tokenizer=tokex.tokenizers.TokexTokenizer(spans=True), engine=engine
+            )
+            expected = [compiled.match(input_string) for input_string in inputs]
+
+            self.assertEqual(list(compiled.match_many(inputs, workers=2, chunksize=7)), expected)
+            # Generators are consumed a few chunks at a time
+            self.assertEqual(list(compiled.match_many(iter(inputs), workers=2, chunksize=1)), expected)
+            self.assertEqual(list(compiled.match_many(inputs, False, workers=1)),
+                             [compiled.match(input_string, False) for input_string in inputs])
+
+        # Closing the generator early stops the pool
+        outputs = tokex.compile(_sql_grammars.DROP_GRAMMAR).match_many(iter(_sql_grammars.DROP_INPUTS * 100), workers=2)
+        self.assertEqual(next(outputs), {"target": "DATABASE", "name": "test_database"})
+        outputs.close()
+
+        with self.assertRaises(ValueError):
+            list(tokex.compile(_sql_grammars.DROP_GRAMMAR).match_many(inputs, workers=0))
+
+        # Workers failing to compile the grammar raise their exception, rather than being restarted indefinitely
+        compiled = tokex.compile(_sql_grammars.DROP_GRAMMAR)
+        compiled._constructor_kwargs = dict(compiled._constructor_kwargs, engine="unknown")
+        with self.assertRaises(ValueError) as cm:
+            list(compiled.match_many(inputs, workers=2))
+
+        self.assertIn("Unknown engine", str(cm.exception))
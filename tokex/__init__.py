@@ -1,13 +1,20 @@
 from .logger import LOGGER as logger
 from .functions import compile, match
-from . import tokenizers, errors
+from .cache import cache_info, clear_cache, set_cache_size
+from .grammar_set import GrammarSet
+from . import tokenizers, errors, tracing
 from .grammar import flags
 
 __all__ = [
     "compile",
     "match",
+    "cache_info",
+    "clear_cache",
+    "set_cache_size",
+    "GrammarSet",
     "tokenizers",
     "errors",
+    "tracing",
     "flags",
     "logger"
 ]
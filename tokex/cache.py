@@ -0,0 +1,208 @@
+"""
+File containing a process-wide cache of compiled Tokex grammars, used by tokex.match
+"""
+
+import collections
+import re
+import threading
+
+from .grammar import parse
+
+
+CacheInfo = collections.namedtuple("CacheInfo", ("hits", "misses", "max_size", "current_size"))
+
+
+class GrammarCache(object):
+    """
+    Bounded, thread safe LRU cache mapping grammar strings (along with the settings they were compiled with) to
+    compiled Tokex objects.
+
+    Entries are looked up first using the exact grammar string given.  If that fails, the grammar string is tokenized
+    and looked up again using a normalized form, so that grammars which differ only in whitespace or comments share
+    a single compiled Tokex.
+    """
+
+    # Regular expression used to strip insignificant whitespace out of structural grammar tokens, ie: "(  name :"
+    _whitespace_re = re.compile(r"\s+")
+
+    def __init__(self, max_size=256):
+        """
+        Inputs: max_size - The maximum number of compiled grammars to hold in the cache.  If 0, caching is disabled.
+        """
+
+        # Maps normalized keys to [tokex, set of raw keys aliasing this entry], in least to most recently used order
+        self._entries = collections.OrderedDict()
+        # Maps raw keys to the normalized keys of their entries
+        self._aliases = {}
+        self._lock = threading.Lock()
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, compile_fn, input_grammar, allow_sub_grammar_definitions, tokenizer, default_flags):
+        """
+        Returns a compiled Tokex for the given grammar & settings, compiling it using compile_fn if it is not cached.
+
+        Inputs: compile_fn - A function accepting input_grammar, allow_sub_grammar_definitions, tokenizer and
+                             default_flags, returning a new Tokex object.
+                All other inputs are as passed to tokex.compile.
+
+        Outputs: A Tokex object.
+        """
+
+        settings_key = self._settings_key(allow_sub_grammar_definitions, tokenizer, default_flags)
+
+        if settings_key is None or not self.max_size:
+            with self._lock:
+                self.misses += 1
+            return compile_fn(input_grammar, allow_sub_grammar_definitions, tokenizer, default_flags)
+
+        raw_key = (input_grammar, settings_key)
+
+        with self._lock:
+            normalized_key = self._aliases.get(raw_key)
+            if normalized_key is not None:
+                return self._hit(normalized_key)
+
+        normalized_key = (self._normalize_grammar(input_grammar), settings_key)
+
+        with self._lock:
+            if normalized_key in self._entries:
+                self._entries[normalized_key][1].add(raw_key)
+                self._aliases[raw_key] = normalized_key
+                return self._hit(normalized_key)
+
+        tokex = compile_fn(input_grammar, allow_sub_grammar_definitions, tokenizer, default_flags)
+
+        with self._lock:
+            self.misses += 1
+
+            entry = self._entries.pop(normalized_key, None) or [tokex, set()]
+            entry[1].add(raw_key)
+            self._entries[normalized_key] = entry
+            self._aliases[raw_key] = normalized_key
+            self._evict()
+
+            return entry[0]
+
+    def info(self):
+        """ Returns a CacheInfo tuple describing the current state of the cache """
+
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.max_size, len(self._entries))
+
+    def clear(self):
+        """ Removes all entries from the cache and resets its hit/miss counters """
+
+        with self._lock:
+            self._entries.clear()
+            self._aliases.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def resize(self, max_size):
+        """ Sets the maximum number of entries held by the cache, evicting the least recently used as necessary """
+
+        if max_size < 0:
+            raise ValueError("Cache size cannot be negative: %s" % max_size)
+
+        with self._lock:
+            self.max_size = max_size
+            self._evict()
+
+    def _hit(self, normalized_key):
+        """ Records a cache hit on an entry and returns its Tokex.  Must be called while holding self._lock """
+
+        self.hits += 1
+
+        # Mark the entry as the most recently used
+        entry = self._entries.pop(normalized_key)
+        self._entries[normalized_key] = entry
+
+        return entry[0]
+
+    def _evict(self):
+        """ Evicts least recently used entries until the cache fits max_size.  Must be called while holding self._lock """
+
+        while len(self._entries) > self.max_size:
+            _, (_, raw_keys) = self._entries.popitem(last=False)
+            for raw_key in raw_keys:
+                del self._aliases[raw_key]
+
+    @classmethod
+    def _normalize_grammar(cls, input_grammar):
+        """ Returns a hashable form of the given grammar with comments and insignificant whitespace removed """
+
+        normalized_tokens = []
+
+        for token_dict in parse.tokenize_grammar(input_grammar):
+            token = token_dict["token"]
+
+            # Whitespace within string literals and regular expressions is significant
+            if token[0] not in ("'", '"', "~"):
+                token = cls._whitespace_re.sub("", token)
+
+            normalized_tokens.append(("".join(sorted(token_dict["flags"] or ())), token))
+
+        return tuple(normalized_tokens)
+
+    @staticmethod
+    def _settings_key(allow_sub_grammar_definitions, tokenizer, default_flags):
+        """
+        Returns a hashable key representing the settings a grammar is compiled with, or None if the given settings
+        cannot be represented as a key (in which case they are not cached).
+        """
+
+        if isinstance(tokenizer, type):
+            tokenizer_key = tokenizer
+
+        else:
+            tokenizer_key = [type(tokenizer)]
+            for name, value in sorted(vars(tokenizer).items()):
+                # Underscored attributes are derived from the others, some lazily (ie: the patterns for bytes inputs)
+                if name.startswith("_"):
+                    continue
+
+                if isinstance(value, list):
+                    value = tuple(value)
+                tokenizer_key.append((name, value))
+            tokenizer_key = tuple(tokenizer_key)
+
+        key = (bool(allow_sub_grammar_definitions), frozenset(default_flags or ()), tokenizer_key)
+
+        try:
+            hash(key)
+
+        except TypeError:
+            return None
+
+        return key
+
+
+GRAMMAR_CACHE = GrammarCache()
+
+
+def cache_info():
+    """
+    Returns information about the cache of compiled grammars used by tokex.match.
+
+    Outputs: A namedtuple containing: hits, misses, max_size, current_size
+    """
+
+    return GRAMMAR_CACHE.info()
+
+
+def clear_cache():
+    """ Empties the cache of compiled grammars used by tokex.match and resets its hit/miss counters """
+
+    GRAMMAR_CACHE.clear()
+
+
+def set_cache_size(max_size):
+    """
+    Sets the maximum number of compiled grammars cached by tokex.match.
+
+    Inputs: max_size - The maximum number of cache entries.  0 disables caching.
+    """
+
+    GRAMMAR_CACHE.resize(max_size)
@@ -246,3 +246,33 @@ class UndefinedSubGrammarError(SubGrammarError):
     def __init__(self, name):
         err_msg = "Sub grammar %s does not exist" % name
         super(UndefinedSubGrammarError, self).__init__(err_msg)
+
+
+class LeftRecursiveSubGrammarError(SubGrammarError):
+    """ Raised when a sub grammar can be used within itself before any tokens have been consumed """
+
+    def __init__(self, name):
+        err_msg = "Sub grammar %s can be used within itself without consuming any tokens (left recursion)" % name
+        super(LeftRecursiveSubGrammarError, self).__init__(err_msg)
+
+
+###
+# Matching errors
+###
+
+class MatchingError(TokexError):
+    """ Base class for errors which occur while matching a grammar against an input string """
+
+    def __init__(self, err_msg):
+        self.err_msg = err_msg
+
+    def __repr__(self):
+        return "Error encountered while matching tokex grammar: %s" % self.err_msg
+
+
+class RecursionDepthExceededError(MatchingError):
+    """ Raised when recursive sub grammars are nested more deeply than the maximum recursion depth allows """
+
+    def __init__(self, element, max_recursion_depth):
+        err_msg = "%s exceeded the maximum recursion depth of %s" % (element, max_recursion_depth)
+        super(RecursionDepthExceededError, self).__init__(err_msg)
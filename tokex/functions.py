@@ -1,3 +1,4 @@
+from .cache import GRAMMAR_CACHE
 from .grammar import flags
 from .tokex_class import Tokex
 from .tokenizers.tokenizer import TokexTokenizer
@@ -6,7 +7,12 @@ from .tokenizers.tokenizer import TokexTokenizer
 def compile(input_grammar,
             allow_sub_grammar_definitions=True,
             tokenizer=TokexTokenizer,
-            default_flags=flags.DEFAULTS):
+            default_flags=flags.DEFAULTS,
+            memoize=None,
+            engine="interpreter",
+            max_recursion_depth=None,
+            optimize=True,
+            prefilter=True):
     """
     Constructs and returns an instance of _StringParser for repeated parsing of strings using the given grammar.
 
@@ -19,12 +25,33 @@ def compile(input_grammar,
                         used to tokenize the input string for parsing. Defaults to the base class TokexTokenizer.
             default_flags - A set of flags which will apply to all elements by default.
                             Default flags can be overridden by specifying an opposing flag on elements in the grammar.
-
+            memoize - A boolean, if True the result of applying each scoped grammar element at each position of the
+                      input string is remembered for the duration of a match, so that alternatives sharing elements
+                      do not re-examine the same tokens.  If None (the default) memoization is enabled only for
+                      grammars in which several alternatives of a One of Set begin with the same elements.
+            engine - The implementation used to apply the grammar to input strings, one of:
+                     "interpreter" - (the default) walks the tree of grammar elements for each match.
+                     "codegen" - compiles the grammar into specialized Python functions, making compilation slower
+                                 and matching faster.
+                     "vm" - runs the grammar as an array of instructions using an explicit stack rather than
+                            recursion, so that deeply nested grammars do not reach Python's recursion limit.
+                     Matches which are traced or memoized always use the interpreter.
+            max_recursion_depth - Optional: The maximum number of usages of recursive sub grammars which can be
+                                  nested within each other while matching an input string.  Exceeding it raises
+                                  errors.RecursionDepthExceededError.  Regardless of this setting, the interpreter
+                                  and codegen engines are limited by Python's recursion limit.
+            optimize - A boolean, if True (the default) the constructed grammar is rewritten into an equivalent one
+                       which is faster to match; for example by fusing consecutive string literals into a single
+                       comparison.  The rewrites applied are listed by the `rewrites` attribute of the returned object.
+            prefilter - A boolean, if True (the default) inputs which the grammar could not possibly match, going by
+                        their number of tokens and the literals the grammar requires, are rejected without applying
+                        the grammar.  Costs more than it saves when most inputs match, or fail on their first token.
 
     Outputs: An instance of _StringParser whose `match` function can be used to repeatedly parse input strings.
     """
 
-    return Tokex(input_grammar, allow_sub_grammar_definitions, tokenizer, default_flags=default_flags)
+    return Tokex(input_grammar, allow_sub_grammar_definitions, tokenizer, default_flags=default_flags, memoize=memoize,
+                 engine=engine, max_recursion_depth=max_recursion_depth, optimize=optimize, prefilter=prefilter)
 
 
 def match(input_grammar,
@@ -36,9 +63,10 @@ def match(input_grammar,
           debug=False):
     """
     Convenience function for performing matches using a grammar against a string.
+    Compiled grammars are kept in a bounded LRU cache, see tokex.cache_info, tokex.clear_cache & tokex.set_cache_size
 
     Inputs: input_grammar  - The grammar to use to parse the input string.
-            input_string   - The string to be parsed.
+            input_string   - The string, or bytes-like object, to be parsed.
             match_entirety - A boolean, if True requires the entire string to be matched by the grammar.
                              if False, trailing tokens not matched by the grammar will not cause a match failure.
             allow_sub_grammar_definitions - A Boolean, indicating whether or not sub grammar declarations,
@@ -54,9 +82,10 @@ def match(input_grammar,
     Outputs: The result of matching the input_string, if it matches, else None.
     """
 
-    return Tokex(
+    return GRAMMAR_CACHE.get(
+        compile,
         input_grammar,
         allow_sub_grammar_definitions,
         tokenizer,
-        default_flags=default_flags,
+        default_flags
     ).match(input_string, match_entirety=match_entirety, debug=debug)
@@ -0,0 +1,435 @@
+"""
+File containing functions which analyze a constructed grammar tree, used to decide how it should be matched
+"""
+
+from . import elements
+from . import flags
+
+
+def iter_elements(root_element):
+    """
+    Generator yielding each distinct element within the tree rooted at root_element, including root_element itself.
+    Elements which are reachable from several places in the tree are only yielded once.
+    """
+
+    seen = set()
+    stack = [root_element]
+
+    while stack:
+        element = stack.pop()
+        if id(element) in seen:
+            continue
+
+        seen.add(id(element))
+        yield element
+
+        if isinstance(element, elements.BaseScopedElement):
+            stack.extend(reversed(element.child_elements()))
+
+
+def recursive_definitions(root_element):
+    """
+    Finds the sub grammar definitions which can be used from within themselves, either directly or through the usages
+    of other sub grammars.
+
+    Inputs: root_element - The root of the element tree to analyze.
+
+    Outputs: A set of SubGrammarDefinition elements.
+    """
+
+    # Maps each definition used within the tree to the definitions used directly within it.  Definitions used within
+    # others are included even if the usages of the others have since been given their elements in place of them
+    uses = {}
+    definitions = [
+        element.definition for element in iter_elements(root_element) if isinstance(element, elements.SubGrammarUsage)
+    ]
+
+    while definitions:
+        definition = definitions.pop()
+        if definition in uses:
+            continue
+
+        uses[definition] = set()
+        stack = list(definition.sub_elements)
+
+        while stack:
+            sub_element = stack.pop()
+
+            if isinstance(sub_element, elements.SubGrammarUsage):
+                uses[definition].add(sub_element.definition)
+                definitions.append(sub_element.definition)
+
+            elif isinstance(sub_element, elements.BaseScopedElement):
+                stack.extend(sub_element.child_elements())
+
+    # A definition is recursive if it is part of a cycle of usages, ie: it is in a strongly connected component with
+    # another definition or it uses itself.  Components are found using an iterative form of Tarjan's algorithm, so
+    # that this takes linear time in the number of definitions & usages, regardless of how deeply they are nested
+    recursive = set()
+    indexes = {}
+    low_links = {}
+    component_stack = []
+    on_component_stack = set()
+
+    for root_definition in uses:
+        if root_definition in indexes:
+            continue
+
+        indexes[root_definition] = low_links[root_definition] = len(indexes)
+        component_stack.append(root_definition)
+        on_component_stack.add(root_definition)
+        work_stack = [(root_definition, iter(uses[root_definition]))]
+
+        while work_stack:
+            definition, used_definitions = work_stack[-1]
+
+            for used_definition in used_definitions:
+                if used_definition not in indexes:
+                    indexes[used_definition] = low_links[used_definition] = len(indexes)
+                    component_stack.append(used_definition)
+                    on_component_stack.add(used_definition)
+                    work_stack.append((used_definition, iter(uses[used_definition])))
+                    break
+
+                if used_definition in on_component_stack:
+                    low_links[definition] = min(low_links[definition], indexes[used_definition])
+
+            else:
+                work_stack.pop()
+
+                if work_stack:
+                    parent = work_stack[-1][0]
+                    low_links[parent] = min(low_links[parent], low_links[definition])
+
+                if low_links[definition] == indexes[definition]:
+                    component = []
+
+                    while True:
+                        member = component_stack.pop()
+                        on_component_stack.discard(member)
+                        component.append(member)
+
+                        if member is definition:
+                            break
+
+                    if len(component) > 1 or definition in uses[definition]:
+                        recursive.update(component)
+
+    return recursive
+
+
+def _nullable_elements(all_elements):
+    """
+    Returns the set of ids of the given elements which can match without consuming any tokens.  Elements are assumed
+    not to until shown otherwise, so usages of recursive sub grammars are only nullable if they can match without
+    recursing.
+    """
+
+    nullable = set()
+    changed = True
+
+    # Each pass visits children before their parents, and usages of recursive sub grammars may need further passes
+    while changed:
+        changed = False
+
+        for element in reversed(all_elements):
+            if id(element) in nullable or not isinstance(element, elements.BaseScopedElement):
+                continue
+
+            element_type = type(element)
+
+            if element_type in (elements.ZeroOrOne, elements.ZeroOrMore):
+                element_nullable = True
+
+            elif element_type is elements.FactoredAlternatives:
+                element_nullable = all(id(prefix) in nullable for prefix in element.prefix) and \
+                    any(id(sub_element) in nullable for sub_element in element.sub_elements)
+
+            elif element_type is elements.OneOfSet or (
+                    element_type is elements.SubGrammarUsage and element.alternatives):
+                element_nullable = any(id(sub_element) in nullable for sub_element in element.sub_elements)
+
+            else:
+                element_nullable = all(id(sub_element) in nullable for sub_element in element.sub_elements)
+
+            if element_nullable:
+                nullable.add(id(element))
+                changed = True
+
+    return nullable
+
+
+def _starting_elements(element, nullable):
+    """ Returns the elements directly within element which are applied at the same index that element is applied at """
+
+    element_type = type(element)
+
+    if element_type is elements.FactoredAlternatives:
+        leading = []
+        for prefix in element.prefix:
+            leading.append(prefix)
+            if id(prefix) not in nullable:
+                return leading
+
+        return leading + list(element.sub_elements)
+
+    if element_type is elements.OneOfSet or (element_type is elements.SubGrammarUsage and element.alternatives):
+        return list(element.sub_elements)
+
+    # Delimiters are only applied once an iteration has consumed tokens, so are never applied at the same index
+    leading = []
+    for sub_element in element.sub_elements:
+        leading.append(sub_element)
+        if id(sub_element) not in nullable:
+            break
+
+    return leading
+
+
+def left_recursive_usage(root_element):
+    """
+    Finds a usage of a sub grammar which can lead back to itself without any tokens being consumed (left recursion),
+    such as a usage of a sub grammar as the first element of its own definition.  Matching such a grammar can recurse
+    forever without consuming any tokens, so grammars containing one are rejected when they are constructed.
+
+    Inputs: root_element - The root of the element tree to analyze.
+
+    Outputs: A SubGrammarUsage element which leads back to itself, or None if the grammar has no left recursion.
+    """
+
+    all_elements = list(iter_elements(root_element))
+    nullable = _nullable_elements(all_elements)
+
+    # Ids of the elements whose starting elements are being visited, and of those which have been visited
+    visiting = set()
+    visited = set()
+
+    # Left recursion can begin at any element of the grammar, not only those applied at the start of the input
+    for start_element in all_elements:
+        if id(start_element) in visited or not isinstance(start_element, elements.BaseScopedElement):
+            continue
+
+        # Visited iteratively, so that deeply nested grammars do not reach Python's recursion limit
+        path = [start_element]
+        stack = [iter(_starting_elements(start_element, nullable))]
+        visiting.add(id(start_element))
+
+        while stack:
+            for element in stack[-1]:
+                if id(element) in visiting:
+                    # The elements from element onwards along the path lead back to it; report a usage among them
+                    cycle = path[[id(path_element) for path_element in path].index(id(element)):]
+                    return next(
+                        cycle_element for cycle_element in cycle
+                        if isinstance(cycle_element, elements.SubGrammarUsage)
+                    )
+
+                if id(element) not in visited and isinstance(element, elements.BaseScopedElement):
+                    visiting.add(id(element))
+                    path.append(element)
+                    stack.append(iter(_starting_elements(element, nullable)))
+                    break
+
+            else:
+                stack.pop()
+                element = path.pop()
+                visiting.discard(id(element))
+                visited.add(id(element))
+
+    return None
+
+
+def _leading_elements(element):
+    """ Returns the memoizable elements which are applied at the same index that element is applied at """
+
+    leading = set()
+
+    # Recursive sub grammars can lead back to an element we have already seen
+    while element is not None and element.memoizable and element not in leading:
+        leading.add(element)
+        element = element.sub_elements[0] if element.sub_elements else None
+
+    return leading
+
+
+def should_memoize(root_element):
+    """
+    Heuristic deciding whether matching the grammar rooted at root_element is likely to benefit from memoization.
+
+    Memoization pays off when the same element is applied at the same index several times during a match, which
+    happens when an element is reached from several alternatives of a One of Set, each of which will apply it at the
+    index the set is being applied at.  This is commonly the result of several alternatives beginning with the same
+    sub grammar.  In all other cases the cost of maintaining the memoization table outweighs its benefits.
+
+    Inputs: root_element - The root of the element tree to analyze.
+
+    Outputs: A boolean, True if memoization should be enabled.
+    """
+
+    for element in iter_elements(root_element):
+        if not isinstance(element, elements.OneOfSet):
+            continue
+
+        seen_leading = set()
+        for alternative in element.sub_elements:
+            leading = _leading_elements(alternative)
+            if leading & seen_leading:
+                return True
+
+            seen_leading.update(leading)
+
+    return False
+
+
+# Bounds of elements which could consume any number of tokens
+_UNBOUNDED = (0, None)
+
+
+def _sequence_bounds(bounds):
+    """ Returns the bounds of matching elements with the given bounds in sequence """
+
+    maximums = [maximum for _, maximum in bounds]
+
+    return sum(minimum for minimum, _ in bounds), (None if None in maximums else sum(maximums))
+
+
+def _alternatives_bounds(bounds):
+    """ Returns the bounds of matching any one of several alternatives with the given bounds """
+
+    # Sets without alternatives never match, so can be given any bounds
+    if not bounds:
+        return 0, 0
+
+    maximums = [maximum for _, maximum in bounds]
+
+    return min(minimum for minimum, _ in bounds), (None if None in maximums else max(maximums))
+
+
+def _element_bounds(element, child_bounds):
+    """ Returns the bounds of element, given the bounds of each of its child_elements() in order """
+
+    element_type = type(element)
+
+    if element_type is elements.LiteralSequence:
+        return element.length, element.length
+
+    if not isinstance(element, elements.BaseScopedElement):
+        return 1, 1
+
+    if element_type is elements.NamedElement:
+        return (1, 1) if element.sub_elements else (0, 0)
+
+    if element_type is elements.FactoredAlternatives:
+        prefix_length = len(element.prefix)
+        return _sequence_bounds(
+            child_bounds[:prefix_length] + [_alternatives_bounds(child_bounds[prefix_length:])]
+        )
+
+    if element_type is elements.OneOfSet or (element_type is elements.SubGrammarUsage and element.alternatives):
+        return _alternatives_bounds(child_bounds)
+
+    # Any delimiter grammar follows the sub elements
+    minimum, maximum = _sequence_bounds(child_bounds[:len(element.sub_elements)])
+
+    if element_type is elements.ZeroOrOne:
+        return 0, maximum
+
+    # Loops stop at the first iteration which doesn't consume any tokens; the delimiter is only matched after one has
+    if element_type is elements.ZeroOrMore:
+        return 0, (0 if maximum == 0 else None)
+
+    if element_type is elements.OneOrMore:
+        return max(minimum, 1), (0 if maximum == 0 else None)
+
+    return minimum, maximum
+
+
+def token_count_bounds(root_element):
+    """
+    Determines the fewest & most tokens which the grammar rooted at root_element can consume when it matches.
+
+    Inputs: root_element - The root of the element tree to analyze.
+
+    Outputs: A tuple containing: (
+        minimum: The fewest tokens the grammar can match
+        maximum: The most tokens the grammar can match, or None if it can match any number of tokens
+    )
+    """
+
+    def _key(element):
+        # Usages of the same definition in the same position match identically
+        if type(element) is elements.SubGrammarUsage:
+            return id(element.definition), element.alternatives
+
+        return id(element)
+
+    bounds = {}
+    # The elements whose children are being visited.  Recursive sub grammars can lead back to these, and are assumed
+    # to consume any number of tokens there
+    visiting = set()
+    # Visited iteratively, so that deeply nested grammars do not reach Python's recursion limit
+    stack = [(root_element, False)]
+
+    while stack:
+        element, children_visited = stack.pop()
+        key = _key(element)
+
+        if children_visited:
+            bounds[key] = _element_bounds(
+                element, [bounds.get(_key(child), _UNBOUNDED) for child in element.child_elements()]
+            )
+            visiting.discard(key)
+
+        elif key in bounds or key in visiting:
+            continue
+
+        elif isinstance(element, elements.BaseScopedElement):
+            visiting.add(key)
+            stack.append((element, True))
+            stack.extend((child, False) for child in element.child_elements())
+
+        else:
+            bounds[key] = _element_bounds(element, [])
+
+    return bounds[_key(root_element)]
+
+
+def required_literals(root_element):
+    """
+    Finds the String Literals which must be matched by any match of the grammar rooted at root_element; those which
+    aren't negated, and aren't within a Zero or One, Zero or More, One of Set or Iterator Delimiter.
+
+    Inputs: root_element - The root of the element tree to analyze.
+
+    Outputs: A dictionary mapping the index into TokenBuffer.views which the literals compare against to a frozenset
+             of the strings which must each appear in that view of any input the grammar matches.
+    """
+
+    literals = {}
+    seen = set()
+    stack = [root_element]
+
+    while stack:
+        element = stack.pop()
+        element_type = type(element)
+
+        if id(element) in seen:
+            continue
+
+        seen.add(id(element))
+
+        if element_type is elements.StringLiteral and not element.has_flag(flags.NOT):
+            literals.setdefault(element._view, set()).add(element.token_str)
+
+        elif element_type is elements.LiteralSequence:
+            literals.setdefault(element._view, set()).update(element.token_strs)
+
+        elif element_type is elements.FactoredAlternatives:
+            stack.extend(element.prefix)
+
+        # One or Mores must match their sub elements at least once
+        elif element_type in (elements.Grammar, elements.NamedElement, elements.OneOrMore) or \
+                (element_type is elements.SubGrammarUsage and not element.alternatives):
+            stack.extend(element.sub_elements)
+
+    return dict((view, frozenset(token_strs)) for view, token_strs in literals.items())
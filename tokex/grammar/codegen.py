@@ -0,0 +1,607 @@
+"""
+File containing a backend which compiles a constructed grammar tree into specialized Python functions.
+
+Rather than interpreting the element tree by recursively calling each element's apply method, Python source code is
+generated for the grammar and exec'd.  Each scoped element is compiled into a function with the same signature and
+outputs as BaseElement.apply, within which singular elements are inlined as comparisons against the columns of the
+input TokenBuffer, loops are inlined as while loops and named tokens are written directly into output dictionaries.
+
+Elements which the generator does not know how to compile are called through their apply method, so that the
+generated functions always produce the same outputs as the interpreter.
+
+Grammars may also be compiled as recognizers, whose functions determine whether and where the grammar matches in the
+same way, but never build any outputs; always returning None in their place.
+"""
+
+from .. import errors
+from . import elements
+from . import flags
+from ..tokenizers.token_buffer import TokenBuffer
+
+
+# Names of the local variables holding each of the TokenBuffer.views in generated functions
+_VIEW_NAMES = {
+    TokenBuffer.TOKENS: "tokens",
+    TokenBuffer.LOWERED: "lowered",
+    TokenBuffer.BODIES: "bodies",
+    TokenBuffer.LOWERED_BODIES: "lowered_bodies",
+}
+
+_FAIL = "return False, None, None"
+
+
+class _Function(object):
+    """ Accumulates the lines of a single generated function """
+
+    def __init__(self, name):
+        self.name = name
+        self.lines = []
+        # The names of the TokenBuffer attributes used by the function, which are bound to locals at its start
+        self.uses = set(["length"])
+        self.indentation = 1
+
+    def line(self, line, indent=0):
+        self.lines.append("    " * (self.indentation + indent) + line)
+
+    def source(self):
+        header = ["def %s(string_tokens, idx, context):" % self.name]
+        header.extend(
+            "    %s = string_tokens.%s" % ("tokens_length" if attr == "length" else attr, attr)
+            for attr in sorted(self.uses)
+        )
+        return "\n".join(header + self.lines)
+
+
+class _CodeGenerator(object):
+    """ Generates & compiles the Python source for a grammar tree """
+
+    def __init__(self, recognize=False):
+        # Whether the generated functions build outputs, or are recognizers which only determine where they match
+        self.recognize = recognize
+        self.namespace = {}
+        self.functions = []
+        # Maps (id(element), kind) to the name of the function generated for it
+        self._function_names = {}
+        # Elements whose functions have been named, but not yet generated
+        self._pending = []
+        # Functions to call once the generated source has been exec'd
+        self._fixups = []
+
+    def generate(self, root_element):
+        root_name = self.function_name(root_element)
+
+        while self._pending:
+            element, kind, name = self._pending.pop()
+            function = _Function(name)
+
+            if kind == "sequence":
+                self._emit_sequence_function(function, element)
+            elif kind == "recursion":
+                self._emit_recursion_function(function, element)
+            else:
+                self._emit_element_function(function, element)
+
+            self.functions.append(function.source())
+
+        source = "\n\n".join(reversed(self.functions)) + "\n"
+        exec(compile(source, "<tokex generated grammar>", "exec"), self.namespace)
+
+        for fixup in self._fixups:
+            fixup()
+
+        return self.namespace[root_name], source
+
+    def constant(self, value):
+        """ Adds value to the namespace of the generated code, returning the name it can be referred to by """
+
+        name = "_c%d" % len(self.namespace)
+        self.namespace[name] = value
+        return name
+
+    def function_name(self, element, kind="element"):
+        """
+        Returns the name of the function for the given element, arranging for it to be generated if necessary.
+        kind is "element" for a function equivalent to element.apply, "sequence" for a function equivalent to
+        element._apply_sub_elements, or "recursion" for a function tracking the recursion depth of a usage of a
+        recursive sub grammar around its "element" function.
+        """
+
+        # Usages of the same sub grammar definition share its functions
+        if type(element) is elements.SubGrammarUsage:
+            key = (id(element.definition), element.alternatives, kind)
+        else:
+            key = (id(element), kind)
+
+        if key not in self._function_names:
+            name = "_%s%d" % (kind[0], len(self._function_names))
+            self._function_names[key] = name
+            self._pending.append((element, kind, name))
+
+        return self._function_names[key]
+
+    def output(self, expression):
+        """ Returns the expression to produce as the output of a generated function, which recognizers never do """
+
+        return "None" if self.recognize else expression
+
+    def new_outputs(self, function, outputs_var, indent=0):
+        """ Emits the initialization of a dictionary to merge outputs into, which recognizers never need """
+
+        if not self.recognize:
+            function.line("%s = {}" % outputs_var, indent)
+
+    def call(self, element, idx_var):
+        """ Returns an expression calling the function for element at idx_var, evaluating to (match, idx, output) """
+
+        return "%s(string_tokens, %s, context)" % (self.function_expression(element), idx_var)
+
+    def function_expression(self, element):
+        """ Returns an expression evaluating to the function to call to apply element """
+
+        if type(element) is elements.SubGrammarUsage and element.recursive:
+            return self.function_name(element, "recursion")
+
+        if self.is_compilable(element):
+            return self.function_name(element)
+
+        return "%s.apply" % self.constant(element)
+
+    @staticmethod
+    def is_compilable(element):
+        return type(element) in (
+            elements.Grammar,
+            elements.NamedElement,
+            elements.IteratorDelimiter,
+            elements.ZeroOrOne,
+            elements.ZeroOrMore,
+            elements.OneOrMore,
+            elements.OneOfSet,
+            elements.FactoredAlternatives,
+            elements.SubGrammarUsage,
+            elements.AnyString,
+            elements.Newline,
+            elements.StringLiteral,
+            elements.RegexString,
+            elements.LiteralSequence,
+            elements.LiteralSet,
+            elements.RegexSet,
+        )
+
+    @staticmethod
+    def width(element):
+        """ Returns the number of tokens consumed by the singular (or literal sequence) element when it matches """
+
+        return element.length if type(element) is elements.LiteralSequence else 1
+
+    @staticmethod
+    def in_bounds(function, idx_expr):
+        """
+        Returns an expression which is True if there is a token at idx_expr.  tokens_length is only the number of
+        tokens held when the function was called, so LazyTokenBuffers are asked to tokenize further beyond it.
+        """
+
+        function.uses.add("has_token")
+        return "(%s < tokens_length or has_token(%s))" % (idx_expr, idx_expr)
+
+    def condition(self, function, element, idx_var):
+        """
+        Returns an expression which is True if the given singular element (or literal sequence) matches the
+        token(s) at idx_var, or None if element is not a singular element which can be inlined.
+        """
+
+        element_type = type(element)
+        parts = [self.in_bounds(function, idx_var)]
+
+        if element_type is elements.AnyString:
+            if element.has_flag(flags.QUOTED) or element.has_flag(flags.UNQUOTED):
+                function.uses.add("quoted")
+                parts.append(("%s[%s]" if element.has_flag(flags.QUOTED) else "not %s[%s]") % ("quoted", idx_var))
+
+        elif element_type is elements.Newline:
+            function.uses.add("tokens")
+            parts.append("tokens[%s] == '\\n'" % idx_var)
+
+        elif element_type in (elements.StringLiteral, elements.RegexString):
+            view = _VIEW_NAMES[element._view]
+            value = "%s[%s]" % (view, idx_var)
+            negated = element.has_flag(flags.NOT)
+            function.uses.add(view)
+
+            if element.has_flag(flags.UNQUOTED):
+                function.uses.add("quoted")
+                parts.append("not quoted[%s]" % idx_var)
+
+            # The bodies views hold None for unquoted tokens, which never match
+            if element._view in (TokenBuffer.BODIES, TokenBuffer.LOWERED_BODIES) and \
+                    (negated or element_type is elements.RegexString):
+                parts.append("%s is not None" % value)
+
+            if element_type is elements.StringLiteral:
+                parts.append("%s %s %s" % (value, "!=" if negated else "==", self.constant(element.token_str)))
+
+            else:
+                parts.append("%s%s(%s)" % ("not " if negated else "", self.constant(element.regex.match), value))
+
+        elif element_type in (elements.LiteralSet, elements.RegexSet) and (self.recognize or not element.named):
+            view = _VIEW_NAMES[element._view]
+            value = "%s[%s]" % (view, idx_var)
+            function.uses.add(view)
+
+            if element.unquoted:
+                function.uses.add("quoted")
+                parts.append("not quoted[%s]" % idx_var)
+
+            if element_type is elements.LiteralSet:
+                parts.append("%s in %s" % (value, self.constant(element.token_strs)))
+
+            else:
+                if element._view in (TokenBuffer.BODIES, TokenBuffer.LOWERED_BODIES):
+                    parts.append("%s is not None" % value)
+
+                parts.append("%s(%s)" % (self.constant(element.regex.match), value))
+
+        elif element_type is elements.LiteralSequence:
+            view = _VIEW_NAMES[element._view]
+            unquoted = element.has_flag(flags.UNQUOTED)
+            function.uses.add(view)
+            if unquoted:
+                function.uses.add("quoted")
+
+            # The whole sequence must be tokenized, not just its first token.  Its tokens are then compared one at a
+            # time, which is quicker than comparing a slice of them and stops at the first which differs
+            parts[0] = self.in_bounds(function, "%s + %d" % (idx_var, element.length - 1))
+
+            for offset, token_str in enumerate(element.token_strs):
+                token_idx = "%s + %d" % (idx_var, offset) if offset else idx_var
+
+                if unquoted:
+                    parts.append("not quoted[%s]" % token_idx)
+
+                parts.append("%s[%s] == %s" % (view, token_idx, self.constant(token_str)))
+
+        else:
+            return None
+
+        return " and ".join(parts)
+
+    def is_inlinable(self, function, element):
+        """ Returns whether element is a singular element, or a named element containing one, which can be inlined """
+
+        if type(element) is elements.NamedElement:
+            return not element.sub_elements or self.condition(function, element.sub_elements[0], "idx") is not None
+
+        return self.condition(function, element, "idx") is not None
+
+    def emit_sequence(self, function, sub_elements, idx_var, outputs_var, fail, indent=0):
+        """
+        Emits code applying each of sub_elements in turn starting at idx_var, advancing idx_var past each & merging
+        their outputs into outputs_var.  If any fails to match, the fail statement is executed.
+        """
+
+        for sub_element in sub_elements:
+            condition = self.condition(function, sub_element, idx_var)
+
+            if condition is not None:
+                function.line("if not (%s):" % condition, indent)
+                function.line(fail, indent + 1)
+                function.line("%s += %d" % (idx_var, self.width(sub_element)), indent)
+                continue
+
+            if type(sub_element) is elements.NamedElement:
+                # Named elements without contents match without consuming anything or producing any output
+                if not sub_element.sub_elements:
+                    continue
+
+                condition = self.condition(function, sub_element.sub_elements[0], idx_var)
+
+                if condition is not None:
+                    function.line("if not (%s):" % condition, indent)
+                    function.line(fail, indent + 1)
+
+                    if not self.recognize:
+                        function.uses.add("captures")
+                        function.line("%s[%s] = captures[%s]" % (
+                            outputs_var, self.constant(sub_element.name), idx_var
+                        ), indent)
+
+                    function.line("%s += 1" % idx_var, indent)
+                    continue
+
+            function.line("match, %s, output = %s" % (idx_var, self.call(sub_element, idx_var)), indent)
+            function.line("if not match:", indent)
+            function.line(fail, indent + 1)
+
+            if not self.recognize:
+                function.line("if output is not None:", indent)
+                function.line("%s.update(output)" % outputs_var, indent + 1)
+
+    def _emit_sequence_function(self, function, element):
+        """ Emits a function equivalent to element._apply_sub_elements """
+
+        self.new_outputs(function, "outputs")
+        self.emit_sequence(function, element.sub_elements, "idx", "outputs", _FAIL)
+        function.line("return True, idx, %s" % self.output("outputs or None"))
+
+    def _emit_recursion_function(self, function, element):
+        """ Emits a function equivalent to SubGrammarUsage._apply for a usage of a recursive sub grammar """
+
+        function.line("context.recursion_depth += 1")
+        function.line("if context.max_recursion_depth is not None and "
+                      "context.recursion_depth > context.max_recursion_depth:")
+        function.line("raise %s(%s, context.max_recursion_depth)" % (
+            self.constant(errors.RecursionDepthExceededError), self.constant(element)
+        ), 1)
+        function.line("result = %s(string_tokens, idx, context)" % self.function_name(element))
+        function.line("context.recursion_depth -= 1")
+        function.line("return result")
+
+    def _emit_element_function(self, function, element):
+        """ Emits a function equivalent to element.apply """
+
+        element_type = type(element)
+
+        if element_type is elements.Grammar:
+            self.new_outputs(function, "outputs")
+            self.emit_sequence(function, element.sub_elements, "idx", "outputs", _FAIL)
+            function.line("return True, idx, %s" % self.output("{%s: outputs or None}" % self.constant(element.name)))
+
+        elif element_type is elements.IteratorDelimiter:
+            self._emit_sequence_function(function, element)
+
+        elif element_type is elements.ZeroOrOne:
+            function.line("if not %s:" % self.in_bounds(function, "idx"))
+            function.line("return True, idx, None", 1)
+            function.line("start_idx = idx")
+            self.new_outputs(function, "outputs")
+            self.emit_sequence(function, element.sub_elements, "idx", "outputs", "return True, start_idx, None")
+
+            if element.name:
+                function.line("return True, idx, %s" % self.output(
+                    "({%s: outputs or None} if idx > start_idx else None)" % self.constant(element.name)
+                ))
+            else:
+                function.line("return True, idx, %s" % self.output("outputs or None"))
+
+        elif element_type in (elements.ZeroOrMore, elements.OneOrMore):
+            self._emit_loop(function, element)
+
+        elif element_type is elements.OneOfSet or (element_type is elements.SubGrammarUsage and element.alternatives):
+            self._emit_one_of_set(function, element)
+
+        elif element_type is elements.FactoredAlternatives:
+            self._emit_factored_alternatives(function, element)
+
+        elif element_type is elements.SubGrammarUsage:
+            self._emit_sequence_function(function, element)
+
+        elif element_type in (elements.LiteralSet, elements.RegexSet) and element.named and not self.recognize:
+            self._emit_named_singular_alternatives(function, element)
+
+        elif element_type is elements.NamedElement:
+            if not element.sub_elements:
+                function.line("return True, idx, None")
+                return
+
+            function.line("if %s:" % self.condition(function, element.sub_elements[0], "idx"))
+            function.line("return True, idx + 1, %s" % self.output(
+                "{%s: captures[idx]}" % self.constant(element.name)
+            ), 1)
+            function.line(_FAIL)
+
+            if not self.recognize:
+                function.uses.add("captures")
+
+        else:
+            function.line("if %s:" % self.condition(function, element, "idx"))
+            function.line("return True, idx + %d, None" % self.width(element), 1)
+            function.line(_FAIL)
+
+    def _emit_loop(self, function, element):
+        """ Emits a function equivalent to ZeroOrMore._apply or OneOrMore._apply """
+
+        if type(element) is elements.ZeroOrMore:
+            function.line("if not %s:" % self.in_bounds(function, "idx"))
+            function.line("return True, idx, None", 1)
+
+        function.line("current_idx = idx")
+
+        if not self.recognize:
+            function.line("outputs = []")
+
+        function.line("while %s:" % self.in_bounds(function, "current_idx"))
+        function.line("new_idx = current_idx", 1)
+
+        delimiter = element.delimiter_grammar
+        if delimiter is not None:
+            # Only check for the delimiter between iterations; every completed iteration consumes tokens
+            function.line("if current_idx > idx:", 1)
+
+            if all(self.is_inlinable(function, sub_element) for sub_element in delimiter.sub_elements):
+                named = not self.recognize and any(
+                    type(sub_element) is elements.NamedElement for sub_element in delimiter.sub_elements
+                )
+
+                if named:
+                    function.line("delimiter_outputs = {}", 2)
+
+                self.emit_sequence(function, delimiter.sub_elements, "new_idx", "delimiter_outputs", "break", 2)
+
+                if named:
+                    function.line("if delimiter_outputs:", 2)
+                    function.line("outputs[-1].update(delimiter_outputs)", 3)
+
+            else:
+                function.line("match, new_idx, delimiter_output = %s" % self.call(delimiter, "new_idx"), 2)
+                function.line("if not match:", 2)
+                function.line("break", 3)
+
+                if not self.recognize:
+                    function.line("if delimiter_output:", 2)
+                    function.line("outputs[-1].update(delimiter_output)", 3)
+
+        if all(self.is_inlinable(function, sub_element) for sub_element in element.sub_elements):
+            # Inline the body of the loop; failing to match any of it ends the loop
+            self.new_outputs(function, "iteration_outputs", 1)
+            self.emit_sequence(function, element.sub_elements, "new_idx", "iteration_outputs", "break", 1)
+            function.line("if new_idx == current_idx:", 1)
+            function.line("break", 2)
+
+            if not self.recognize:
+                function.line("outputs.append(iteration_outputs or None)", 1)
+
+        else:
+            function.line("match, new_idx, output = %s(string_tokens, new_idx, context)" %
+                          self.function_name(element, "sequence"), 1)
+            function.line("if not match or new_idx == current_idx:", 1)
+            function.line("break", 2)
+
+            if not self.recognize:
+                function.line("outputs.append(output or None)", 1)
+
+        function.line("current_idx = new_idx", 1)
+
+        if type(element) is elements.ZeroOrMore:
+            function.line("return True, current_idx, %s" % self.output(
+                "({%s: outputs} if current_idx > idx else None)" % self.constant(element.name)
+            ))
+
+        else:
+            function.line("if current_idx > idx:")
+            function.line(
+                "return True, current_idx, %s" % self.output("{%s: outputs}" % self.constant(element.name)), 1
+            )
+            function.line(_FAIL)
+
+    def _emit_factored_alternatives(self, function, element):
+        """ Emits a function equivalent to FactoredAlternatives._apply """
+
+        self.new_outputs(function, "outputs")
+        self.emit_sequence(function, element.prefix, "idx", "outputs", _FAIL)
+
+        # Outputs are only added to once the alternative which matches is found, so tails needn't copy them
+        for tail in element.sub_elements:
+            function.line("match, new_idx, output = %s(string_tokens, idx, context)" %
+                          self.function_name(tail, "sequence"))
+            function.line("if match:")
+
+            if self.recognize:
+                function.line("return True, new_idx, None", 1)
+                continue
+
+            function.line("if output is not None:", 1)
+            function.line("outputs.update(output)", 2)
+
+            if tail.name is None:
+                function.line("return True, new_idx, outputs or None", 1)
+            else:
+                function.line("return True, new_idx, {%s: outputs or None}" % self.constant(tail.name), 1)
+
+        function.line(_FAIL)
+
+    def _emit_named_singular_alternatives(self, function, element):
+        """ Emits a function equivalent to BaseSingularAlternatives._apply, for one with named alternatives """
+
+        view = _VIEW_NAMES[element._view]
+        value = "%s[idx]" % view
+        parts = [self.in_bounds(function, "idx")]
+        function.uses.update(("captures", view))
+
+        if element.unquoted:
+            function.uses.add("quoted")
+            parts.append("not quoted[idx]")
+
+        if type(element) is elements.LiteralSet:
+            parts.append("%s in %s" % (value, self.constant(element.token_strs)))
+            function.line("if %s:" % " and ".join(parts))
+            function.line("name = %s[%s]" % (self.constant(element.names), value), 1)
+
+        else:
+            # The bodies views hold None for unquoted tokens, which never match
+            if element._view in (TokenBuffer.BODIES, TokenBuffer.LOWERED_BODIES):
+                parts.append("%s is not None" % value)
+
+            function.line("match = %s(%s) if %s else None" % (
+                self.constant(element.regex.match), value, " and ".join(parts)
+            ))
+            function.line("if match:")
+            function.line("name = %s[match.lastgroup]" % self.constant(element.names), 1)
+
+        function.line("return True, idx + 1, ({name: captures[idx]} if name is not None else None)", 1)
+        function.line(_FAIL)
+
+    def _emit_one_of_set(self, function, element):
+        """ Emits a function equivalent to OneOfSet._apply, or SubGrammarUsage._apply for a usage of alternatives """
+
+        if element.dispatch_table is None:
+            for sub_element in element.sub_elements:
+                condition = self.condition(function, sub_element, "idx")
+
+                if condition is not None:
+                    function.line("if %s:" % condition)
+                    function.line("return True, idx + %d, None" % self.width(sub_element), 1)
+                    continue
+
+                function.line("match, new_idx, output = %s" % self.call(sub_element, "idx"))
+                function.line("if match:")
+                function.line("return True, new_idx, output", 1)
+
+            function.line(_FAIL)
+            return
+
+        # Mirror the element's dispatch tables, mapping tokens to the generated functions of the candidate alternatives
+        alternative_functions = dict(
+            (id(sub_element), self.function_expression(sub_element)) for sub_element in element.sub_elements
+        )
+        dispatch_table = {}
+        fallback_alternatives = []
+        function_map = {}
+
+        def _fixup():
+            def _resolve(sub_element):
+                return eval(alternative_functions[id(sub_element)], self.namespace)
+
+            for text, alternatives in element.dispatch_table.items():
+                dispatch_table[text] = tuple(_resolve(sub_element) for sub_element in alternatives)
+            fallback_alternatives.extend(_resolve(sub_element) for sub_element in element.fallback_alternatives)
+            function_map.update((sub_element, _resolve(sub_element)) for sub_element in element.sub_elements)
+
+        self._fixups.append(_fixup)
+
+        function.uses.add("lowered")
+        function.line("if not %s:" % self.in_bounds(function, "idx"))
+        function.line("alternatives = %s" % self.constant(fallback_alternatives), 1)
+
+        if element.quoted_dispatch_table:
+            function.uses.add("quoted")
+            function.line("elif quoted[idx]:")
+            function.line(
+                "alternatives = [%s[alternative] for alternative in %s._candidate_alternatives(string_tokens, idx)]" %
+                (self.constant(function_map), self.constant(element)), 1
+            )
+
+        function.line("else:")
+        function.line("alternatives = %s.get(lowered[idx], %s)" % (
+            self.constant(dispatch_table), self.constant(fallback_alternatives)
+        ), 1)
+        function.line("for alternative in alternatives:")
+        function.line("match, new_idx, output = alternative(string_tokens, idx, context)", 1)
+        function.line("if match:", 1)
+        function.line("return True, new_idx, output", 2)
+        function.line(_FAIL)
+
+
+def compile_grammar(root_element, recognize=False):
+    """
+    Compiles the element tree rooted at root_element into a Python function.
+
+    Inputs: root_element - The root of a fully constructed (and finalized) grammar tree.
+            recognize    - A boolean, if True the function never builds outputs; returning None in their place.
+
+    Outputs: A tuple containing: (
+        function: A function accepting (string_tokens, idx, context) and returning the same (match, new_idx, output)
+                  triple as root_element.apply
+        source: The generated Python source code
+    )
+    """
+
+    return _CodeGenerator(recognize).generate(root_element)
@@ -1,6 +1,8 @@
 from ._base_element import BaseElement, BaseScopedElement
-from .singular import AnyString, Newline, StringLiteral, RegexString
-from .scoped import Grammar, NamedElement, IteratorDelimiter, ZeroOrOne, ZeroOrMore, OneOrMore, OneOfSet
+from .singular import AnyString, Newline, StringLiteral, RegexString, LiteralSequence, BaseSingularAlternatives, \
+    LiteralSet, RegexSet
+from .scoped import Grammar, NamedElement, IteratorDelimiter, ZeroOrOne, ZeroOrMore, OneOrMore, OneOfSet, \
+    FactoredAlternatives
 from .sub_grammar import SubGrammarDefinition, SubGrammarUsage
 
 
@@ -11,12 +13,18 @@ __all__ = [
     "Newline",
     "StringLiteral",
     "RegexString",
+    "LiteralSequence",
+    "BaseSingularAlternatives",
+    "LiteralSet",
+    "RegexSet",
     "Grammar",
     "NamedElement",
     "IteratorDelimiter",
     "ZeroOrOne",
     "ZeroOrMore",
     "OneOrMore",
+    "OneOfSet",
+    "FactoredAlternatives",
     "SubGrammarDefinition",
     "SubGrammarUsage"
 ]
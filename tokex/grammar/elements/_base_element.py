@@ -1,8 +1,9 @@
 import re
 
-from ...logger import LOGGER
 from ... import errors
+from ...tokenizers.token_buffer import TokenBuffer
 from .. import flags
+from ..match_context import MatchContext
 
 class BaseElement(object):
     """ Base class which all defined grammar element subclass from """
@@ -13,6 +14,13 @@ class BaseElement(object):
     # A set of flags which are valid to be set for this element
     valid_flags = None
 
+    # Whether the results of applying this element should be memoized when matching with memoization enabled.
+    # Not worthwhile for elements which can only ever match a single token
+    memoizable = False
+
+    # The key under which the results of applying this element are memoized, if not the element itself
+    memo_key = None
+
     def __init__(self, token_str="", _flags=None, default_flags=flags.DEFAULTS, token_dict=None):
         self.token_dict = token_dict
         self.token_str = token_str
@@ -63,13 +71,14 @@ class BaseElement(object):
 
         return "Tokex Element"
 
-    def _apply(self, string_tokens, idx):
+    def _apply(self, string_tokens, idx, context):
         """
         Function which accepts an iterable of tokens and a current index and determines whether or not this token
         matches the list at the current position. Should be overridden in subclasses.
 
-        Inputs: string_tokens - An iterable of string tokens to determine if we match upon.
+        Inputs: string_tokens - A TokenBuffer of the tokens to determine if we match upon.
                 idx          - The start index within the string_tokens to begin processing at.
+                context      - The MatchContext of the match being performed.
 
         Outputs: A triple containing: {
             match: A boolean depicting whether or not this construct matches the iterable at the current position.
@@ -83,13 +92,34 @@ class BaseElement(object):
     def setup(self):
         pass
 
-    def apply(self, string_tokens, idx):
+    def finalize(self):
+        """ Called once the element tree this element is a part of has been fully constructed """
+
+    def first_tokens(self):
+        """
+        Determines which input tokens this element can begin matching upon.  Used to build dispatch tables allowing
+        One of Sets to skip alternatives which cannot possibly match the current token.
+
+        Outputs: A tuple containing: (
+            keys: None if this element could match beginning with any token.  Otherwise a set of keys, such that if
+                  this element matches and consumes at least one token, the first token it consumes will be
+                  represented in keys.  Keys are tuples of (quoted, text); where text is a lower cased token (if
+                  quoted is False) or the lower cased contents of a quoted token (if quoted is True)
+            nullable: A boolean, True if this element can match without consuming any tokens
+        )
+        """
+
+        return None, True
+
+    def apply(self, string_tokens, idx, context=None):
         """
         Used to apply this token to an iterable of tokens at a specified position.  Uses self._apply to do the work
         of matching the inputs.
 
-        Inputs: string_tokens - An iterable of string tokens to determine if we match upon.
+        Inputs: string_tokens - A TokenBuffer (or an iterable of string tokens, if context is not given) to
+                                determine if we match upon.
                 idx           - The start index within the string_tokens to begin processing at.
+                context       - Optional: The MatchContext holding the state of the match being performed.
 
         Outputs: A triple containing: {
             match: A boolean depicting whether or not this construct matches the iterable at the current position.
@@ -98,15 +128,81 @@ class BaseElement(object):
         )
         """
 
-        if idx < len(string_tokens):
-            LOGGER.debug("%s testing match for: %s\n", self, string_tokens[idx])
+        if context is None:
+            # We're being applied directly, rather than by a parent element
+            return self.apply(TokenBuffer.wrap(string_tokens), idx, MatchContext())
+
+        if not context.instrumented:
+            return self._apply(string_tokens, idx, context)
+
+        return self._apply_instrumented(string_tokens, idx, context)
+
+    def _recognize(self, string_tokens, idx, context):
+        """
+        Determines whether this element matches the input tokens at idx in the same way as _apply, without building
+        any outputs.  Elements which produce outputs should override this to avoid constructing them.
+
+        Inputs: As _apply
+
+        Outputs: The index this element ceased matching upon the input tokens if it matches, else None
+        """
+
+        match, new_idx, _ = self._apply(string_tokens, idx, context)
+
+        return new_idx if match else None
+
+    def recognize(self, string_tokens, idx, context=None):
+        """
+        Used to determine whether this element matches an iterable of tokens at a specified position, without
+        building the outputs which apply would.  Uses self._recognize to do the work of matching the inputs.  Results
+        are memoized within the context's memoization table (if any), but the context's tracer is not called.
+
+        Inputs: string_tokens - A TokenBuffer (or an iterable of string tokens, if context is not given) to
+                                determine if we match upon.
+                idx           - The start index within the string_tokens to begin processing at.
+                context       - Optional: The MatchContext holding the state of the match being performed.  Must not
+                                be shared with calls to apply, as both use the same memoization table.
+
+        Outputs: The index this element ceased matching upon the iterable if it matches, else None
+        """
+
+        if context is None:
+            return self.recognize(TokenBuffer.wrap(string_tokens), idx, MatchContext())
+
+        memo = context.memo
+        if memo is None or not self.memoizable:
+            return self._recognize(string_tokens, idx, context)
+
+        key = (self.memo_key or self, idx)
+        if key not in memo:
+            memo[key] = self._recognize(string_tokens, idx, context)
+
+        return memo[key]
 
-        match, idx, output = self._apply(string_tokens, idx)
+    def _apply_instrumented(self, string_tokens, idx, context):
+        """ Applies this element, calling into the tracer and memoization table of the given context """
 
-        if idx is not None and idx < len(string_tokens):
-            LOGGER.debug("%s Matched: %s\n", self, match)
+        tracer = context.tracer
+        if tracer is not None:
+            tracer.enter(self, string_tokens, idx)
 
-        return match, idx, output
+        memo = context.memo
+        if memo is not None and self.memoizable:
+            key = (self.memo_key or self, idx)
+            result = memo.get(key)
+            if result is None:
+                result = memo[key] = self._apply(string_tokens, idx, context)
+
+        else:
+            result = self._apply(string_tokens, idx, context)
+
+        if tracer is not None:
+            match, new_idx, output = result
+            if match:
+                tracer.match(self, string_tokens, idx, new_idx, output)
+            tracer.exit(self, string_tokens, idx, match, new_idx)
+
+        return result
 
     def has_flag(self, flag):
         """
@@ -121,6 +217,7 @@ class BaseScopedElement(BaseElement):
     """ Base class for grammar elements which can have sub elements within them """
 
     name = None
+    memoizable = True
 
     # Regular expression string which matches valid token names (ex: named sub grammars, named tokens, etc)
     name_re_str = "[a-zA-Z0-9_-]+"
@@ -142,3 +239,16 @@ class BaseScopedElement(BaseElement):
         """
 
         self.sub_elements.append(sub_element)
+
+    def child_elements(self):
+        """
+        Returns a list of each element directly within this element; its sub elements followed by any other elements
+        it applies, such as its delimiter grammar.
+        """
+
+        children = list(self.sub_elements)
+
+        if getattr(self, "delimiter_grammar", None) is not None:
+            children.append(self.delimiter_grammar)
+
+        return children
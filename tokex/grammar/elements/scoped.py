@@ -19,7 +19,19 @@ class Grammar(BaseScopedElement):
     def human_readable_name(self):
         return "Named Section (%s: ...)" % self.name
 
-    def _apply_sub_elements(self, string_tokens, idx):
+    def first_tokens(self):
+        keys = set()
+
+        for sub_element in self.sub_elements:
+            sub_keys, sub_nullable = sub_element.first_tokens()
+            keys = None if keys is None or sub_keys is None else keys | sub_keys
+
+            if not sub_nullable:
+                return keys, False
+
+        return keys, True
+
+    def _apply_sub_elements(self, string_tokens, idx, context):
         """
         Function which applies the sub elements of this element to the input tokens to see if they match
 
@@ -35,7 +47,7 @@ class Grammar(BaseScopedElement):
         outputs = {}
 
         for sub_element in self.sub_elements:
-            match, idx, output = sub_element.apply(string_tokens, idx)
+            match, idx, output = sub_element.apply(string_tokens, idx, context)
 
             if not match:
                 return False, None, None
@@ -45,14 +57,33 @@ class Grammar(BaseScopedElement):
 
         return True, idx, outputs or None
 
-    def _apply(self, string_tokens, idx):
-        match, new_idx, output = self._apply_sub_elements(string_tokens, idx)
+    def _recognize_sub_elements(self, string_tokens, idx, context):
+        """
+        Function which determines whether the sub elements of this element match the input tokens, as
+        _apply_sub_elements does, without building their outputs.
+
+        Outputs: The index our sub elements ceased matching upon the input tokens if they match, else None
+        """
+
+        for sub_element in self.sub_elements:
+            idx = sub_element.recognize(string_tokens, idx, context)
+
+            if idx is None:
+                return None
+
+        return idx
+
+    def _apply(self, string_tokens, idx, context):
+        match, new_idx, output = self._apply_sub_elements(string_tokens, idx, context)
 
         if match:
             return True, new_idx, {self.name: output}
 
         return False, None, None
 
+    def _recognize(self, string_tokens, idx, context):
+        return self._recognize_sub_elements(string_tokens, idx, context)
+
 
 class NamedElement(Grammar):
     """ Named element which contains another singular element """
@@ -78,17 +109,23 @@ class NamedElement(Grammar):
     def human_readable_name(self):
         return "Named Element <%s: ...>" % self.name
 
-    def _apply(self, string_tokens, idx):
+    def _apply(self, string_tokens, idx, context):
         if not self.sub_elements:
             return True, idx, None
 
-        match, new_idx, _ = self.sub_elements[0].apply(string_tokens, idx)
+        match, new_idx, _ = self.sub_elements[0].apply(string_tokens, idx, context)
 
         if match:
-            return True, new_idx, {self.name: string_tokens[idx]}
+            return True, new_idx, {self.name: string_tokens.captures[idx]}
 
         return False, None, None
 
+    def _recognize(self, string_tokens, idx, context):
+        if not self.sub_elements:
+            return idx
+
+        return self.sub_elements[0].recognize(string_tokens, idx, context)
+
 
 class IteratorDelimiter(Grammar):
     """
@@ -102,8 +139,8 @@ class IteratorDelimiter(Grammar):
     def human_readable_name(self):
         return "Iterator Delimiter sep {...}"
 
-    def _apply(self, string_tokens, idx):
-        match, idx, output = super(IteratorDelimiter, self)._apply(string_tokens, idx)
+    def _apply(self, string_tokens, idx, context):
+        match, idx, output = super(IteratorDelimiter, self)._apply(string_tokens, idx, context)
 
         if match and output is not None:
             output = output[None]
@@ -120,14 +157,17 @@ class ZeroOrOne(Grammar):
 
         return "Zero or One ?(...)"
 
-    def _apply(self, string_tokens, idx):
+    def first_tokens(self):
+        return super(ZeroOrOne, self).first_tokens()[0], True
+
+    def _apply(self, string_tokens, idx, context):
         # If the index we're considering is beyond the end of our tokens we have nothing to match on.  However, since
         # we can match zero times, return True.  This allows gramars with trailing ZeroOrOne rules to match strings
         # which don't use them.
-        if idx >= len(string_tokens):
+        if idx >= string_tokens.length and not string_tokens.has_token(idx):
             return True, idx, None
 
-        match, new_idx, output = self._apply_sub_elements(string_tokens, idx)
+        match, new_idx, output = self._apply_sub_elements(string_tokens, idx, context)
 
         if match:
             if self.name:
@@ -136,6 +176,14 @@ class ZeroOrOne(Grammar):
 
         return True, idx, None
 
+    def _recognize(self, string_tokens, idx, context):
+        if idx >= string_tokens.length and not string_tokens.has_token(idx):
+            return idx
+
+        new_idx = self._recognize_sub_elements(string_tokens, idx, context)
+
+        return idx if new_idx is None else new_idx
+
 
 class ZeroOrMore(Grammar):
     """ Element which can match a contained grammar zero or more times """
@@ -145,17 +193,20 @@ class ZeroOrMore(Grammar):
     def human_readable_name(self):
         return "Zero or More *(%s: ...)" % self.name
 
-    def _repeatedly_match(self, string_tokens, idx):
+    def first_tokens(self):
+        return super(ZeroOrMore, self).first_tokens()[0], True
+
+    def _repeatedly_match(self, string_tokens, idx, context):
         match_count = 0
         current_idx = idx
         outputs = []
-        while current_idx < len(string_tokens):
+        while current_idx < string_tokens.length or string_tokens.has_token(current_idx):
             new_idx = current_idx
 
             # If we're not processing the first match, check that any delimiter grammar we may have matches before
             # the next occurance of our grammar
             if match_count > 0 and self.delimiter_grammar is not None:
-                match, new_idx, delimiter_output = self.delimiter_grammar.apply(string_tokens, new_idx)
+                match, new_idx, delimiter_output = self.delimiter_grammar.apply(string_tokens, new_idx, context)
 
                 if not match:
                     break
@@ -164,7 +215,7 @@ class ZeroOrMore(Grammar):
                     outputs[-1].update(delimiter_output)
 
             # Try to match our sub elements
-            match, new_idx, output = self._apply_sub_elements(string_tokens, new_idx)
+            match, new_idx, output = self._apply_sub_elements(string_tokens, new_idx, context)
 
             # If we don't match, or we do but we don't consume any tokens (ie we're stuck) exit the loop
             if not match or new_idx == current_idx:
@@ -176,17 +227,46 @@ class ZeroOrMore(Grammar):
 
         return match_count, current_idx, outputs
 
-    def _apply(self, string_tokens, idx):
+    def _repeatedly_recognize(self, string_tokens, idx, context):
+        """ As _repeatedly_match, without building outputs.  Returns the match count and the index we ceased at """
+
+        match_count = 0
+        while idx < string_tokens.length or string_tokens.has_token(idx):
+            new_idx = idx
+
+            if match_count > 0 and self.delimiter_grammar is not None:
+                new_idx = self.delimiter_grammar.recognize(string_tokens, new_idx, context)
+
+                if new_idx is None:
+                    break
+
+            new_idx = self._recognize_sub_elements(string_tokens, new_idx, context)
+
+            if new_idx is None or new_idx == idx:
+                break
+
+            match_count += 1
+            idx = new_idx
+
+        return match_count, idx
+
+    def _apply(self, string_tokens, idx, context):
         # If the index we're considering is beyond the end of our tokens we have nothing to match on.  However, since
         # we can match zero times, return True.  This allows gramars with trailing ZeroOrMore rules to match strings
         # which don't use them.
-        if idx >= len(string_tokens):
+        if idx >= string_tokens.length and not string_tokens.has_token(idx):
             return True, idx, None
 
-        _, new_idx, outputs = self._repeatedly_match(string_tokens, idx)
+        _, new_idx, outputs = self._repeatedly_match(string_tokens, idx, context)
 
         return True, new_idx, ({self.name: outputs} if new_idx > idx else None)
 
+    def _recognize(self, string_tokens, idx, context):
+        if idx >= string_tokens.length and not string_tokens.has_token(idx):
+            return idx
+
+        return self._repeatedly_recognize(string_tokens, idx, context)[1]
+
 
 class OneOrMore(ZeroOrMore):
     """ Element which can match a contained grammar one or more times """
@@ -196,25 +276,222 @@ class OneOrMore(ZeroOrMore):
     def human_readable_name(self):
         return "One or More +(%s: ...)" % self.name
 
-    def _apply(self, string_tokens, idx):
-        match_count, idx, outputs = self._repeatedly_match(string_tokens, idx)
+    def first_tokens(self):
+        # Iterations which don't consume any tokens are not counted, so we can never match without consuming a token
+        return Grammar.first_tokens(self)[0], False
+
+    def _apply(self, string_tokens, idx, context):
+        match_count, idx, outputs = self._repeatedly_match(string_tokens, idx, context)
 
         if match_count > 0:
             return True, idx, {self.name: outputs}
 
         return False, None, None
 
+    def _recognize(self, string_tokens, idx, context):
+        match_count, idx = self._repeatedly_recognize(string_tokens, idx, context)
+
+        return idx if match_count > 0 else None
+
 
 class OneOfSet(Grammar):
     """ Element which can match any one of its contained grammars """
 
+    # Tables mapping tokens to the alternatives which could match beginning with them; see finalize
+    dispatch_table = None
+    quoted_dispatch_table = None
+    fallback_alternatives = None
+
     def human_readable_name(self):
         return "One of Set {...}"
 
-    def _apply(self, string_tokens, idx):
-        for element in self.sub_elements:
-            match, new_idx, output = element.apply(string_tokens, idx)
+    def first_tokens(self):
+        keys = set()
+        nullable = False
+
+        for sub_element in self.sub_elements:
+            sub_keys, sub_nullable = sub_element.first_tokens()
+            keys = None if keys is None or sub_keys is None else keys | sub_keys
+            nullable = nullable or sub_nullable
+
+        return keys, nullable
+
+    def finalize(self):
+        """
+        Builds tables mapping the first token of an input to the alternatives which could possibly match beginning
+        with it, so that alternatives which cannot match are never tried.  Alternatives which could begin with any
+        token, or which can match without consuming any tokens, are included in every entry.
+        """
+
+        keyed_alternatives = {}
+        fallback_alternatives = []
+
+        for alternative_idx, sub_element in enumerate(self.sub_elements):
+            keys, nullable = sub_element.first_tokens()
+
+            if keys is None or nullable:
+                fallback_alternatives.append(alternative_idx)
+                continue
+
+            for key in keys:
+                keyed_alternatives.setdefault(key, set()).add(alternative_idx)
+
+        # Only worthwhile if the table lets us skip at least one alternative
+        if len(self.sub_elements) - len(fallback_alternatives) < 2:
+            self.dispatch_table = self.quoted_dispatch_table = self.fallback_alternatives = None
+            return
+
+        self.dispatch_table = {}
+        self.quoted_dispatch_table = {}
+        self.fallback_alternatives = tuple(self.sub_elements[alt_idx] for alt_idx in fallback_alternatives)
+
+        for (quoted, text), alternative_idxs in keyed_alternatives.items():
+            table = self.quoted_dispatch_table if quoted else self.dispatch_table
+            table[text] = tuple(
+                self.sub_elements[alt_idx] for alt_idx in sorted(alternative_idxs.union(fallback_alternatives))
+            )
+
+    def _candidate_alternatives(self, string_tokens, idx):
+        """ Returns the alternatives of this set which could match the input at idx, in order """
+
+        # At the end of the input, only alternatives which can match without consuming any tokens can match
+        if idx >= string_tokens.length and not string_tokens.has_token(idx):
+            return self.fallback_alternatives
+
+        candidates = self.dispatch_table.get(string_tokens.lowered[idx])
+
+        if self.quoted_dispatch_table and string_tokens.quoted[idx]:
+            quoted_candidates = self.quoted_dispatch_table.get(string_tokens.lowered_bodies[idx])
+
+            if quoted_candidates is not None:
+                if candidates is None:
+                    return quoted_candidates
+
+                candidate_set = set(candidates).union(quoted_candidates)
+                return [element for element in self.sub_elements if element in candidate_set]
+
+        if candidates is None:
+            return self.fallback_alternatives
+
+        return candidates
+
+    def _apply(self, string_tokens, idx, context):
+        if self.dispatch_table is None:
+            alternatives = self.sub_elements
+        else:
+            alternatives = self._candidate_alternatives(string_tokens, idx)
+
+        for element in alternatives:
+            match, new_idx, output = element.apply(string_tokens, idx, context)
             if match:
                 return True, new_idx, output
 
         return False, None, None
+
+    def _recognize(self, string_tokens, idx, context):
+        if self.dispatch_table is None:
+            alternatives = self.sub_elements
+        else:
+            alternatives = self._candidate_alternatives(string_tokens, idx)
+
+        for element in alternatives:
+            new_idx = element.recognize(string_tokens, idx, context)
+            if new_idx is not None:
+                return new_idx
+
+        return None
+
+
+class FactoredAlternatives(OneOfSet):
+    """
+    Element matching a run of consecutive alternatives of a One of Set which all begin with the same elements, so
+    that those elements are only matched once rather than once per alternative.  These cannot be written in grammars;
+    they are created by the optimizer (see grammar.optimizer).
+
+    The shared leading elements are held in prefix.  The rest of each alternative is held in sub_elements as a
+    Grammar named as the alternative was, or with no name if the alternative's outputs were not wrapped in a name.
+    These are tried in order from the index the prefix stopped matching at, as the alternatives of a One of Set.
+    """
+
+    def __init__(self, prefix, tails):
+        """
+        Inputs: prefix - A list of the elements shared by the alternatives.
+                tails  - A list of Grammar elements holding the remainder of each alternative.
+        """
+
+        super(FactoredAlternatives, self).__init__()
+
+        self.prefix = prefix
+        self.sub_elements = tails
+
+    def human_readable_name(self):
+        return "Factored Alternatives {...}"
+
+    def child_elements(self):
+        return self.prefix + self.sub_elements
+
+    def first_tokens(self):
+        keys = set()
+
+        for prefix_element in self.prefix:
+            prefix_keys, prefix_nullable = prefix_element.first_tokens()
+            keys = None if keys is None or prefix_keys is None else keys | prefix_keys
+
+            if not prefix_nullable:
+                return keys, False
+
+        tail_keys, tail_nullable = super(FactoredAlternatives, self).first_tokens()
+
+        return (None if keys is None or tail_keys is None else keys | tail_keys), tail_nullable
+
+    def _apply(self, string_tokens, idx, context):
+        outputs = {}
+
+        for prefix_element in self.prefix:
+            match, idx, output = prefix_element.apply(string_tokens, idx, context)
+
+            if not match:
+                return False, None, None
+
+            if output is not None:
+                outputs.update(output)
+
+        # The dispatch tables of the tails are built from the tokens they begin with, which follow the prefix
+        if self.dispatch_table is None:
+            tails = self.sub_elements
+        else:
+            tails = self._candidate_alternatives(string_tokens, idx)
+
+        for tail in tails:
+            match, new_idx, output = tail._apply_sub_elements(string_tokens, idx, context)
+
+            if match:
+                if output is not None:
+                    outputs.update(output)
+
+                if tail.name is None:
+                    return True, new_idx, outputs or None
+
+                return True, new_idx, {tail.name: outputs or None}
+
+        return False, None, None
+
+    def _recognize(self, string_tokens, idx, context):
+        for prefix_element in self.prefix:
+            idx = prefix_element.recognize(string_tokens, idx, context)
+
+            if idx is None:
+                return None
+
+        if self.dispatch_table is None:
+            tails = self.sub_elements
+        else:
+            tails = self._candidate_alternatives(string_tokens, idx)
+
+        for tail in tails:
+            new_idx = tail._recognize_sub_elements(string_tokens, idx, context)
+
+            if new_idx is not None:
+                return new_idx
+
+        return None
@@ -1,42 +1,48 @@
 import re
 
 from ... import errors
+from ...tokenizers.token_buffer import TokenBuffer
 from .. import flags
 
 from ._base_element import BaseElement
 
 class BaseSingular(BaseElement):
-    """ Base class for singular elements, as most share a similar process flow """
+    """
+    Base class for singular elements, as most share a similar process flow.
 
-    def _apply_first(self, string_tokens, idx):
-        """
-        Function which performs initial checking of the string/tokens idx
-
-        Outputs: If successful, a string containing the token to match.
-                 If unsuccessful, None
-        """
+    As an element's flags cannot change once it has been constructed, singular elements select a specialized _apply
+    method for their combination of flags when they are constructed, rather than checking their flags each time
+    they are applied.
+    """
 
-        # If the index we're considering is beyond the end of our tokens, we have nothing to match on. Return False.
-        if idx >= len(string_tokens):
-            return None
+    # Maps (unquoted, negated) to the name of the method to use as _apply for that combination of flags.
+    # Elements which cannot be negated or restricted to unquoted tokens need only define (False, False)
+    _appliers = None
 
-        to_match = string_tokens[idx]
+    # Index into TokenBuffer.views of the form of the input tokens this element matches against
+    _view = TokenBuffer.TOKENS
 
-        if self.has_flag(flags.CASE_INSENSITIVE):
-            to_match = to_match.lower()
+    def __init__(self, *args, **kwargs):
+        super(BaseSingular, self).__init__(*args, **kwargs)
 
-        is_quoted = to_match[0] in ('"', "'") and to_match[-1] == to_match[0]
+        case_insensitive = self.has_flag(flags.CASE_INSENSITIVE)
 
+        # Quoted elements match against the contents of quoted tokens; the bodies views are None for unquoted tokens
         if self.has_flag(flags.QUOTED):
-            if is_quoted:
-                return to_match[1:-1]
+            self._view = TokenBuffer.LOWERED_BODIES if case_insensitive else TokenBuffer.BODIES
+
+        else:
+            self._view = TokenBuffer.LOWERED if case_insensitive else TokenBuffer.TOKENS
 
-            return None
+        if self._appliers:
+            self._apply = getattr(self, self._appliers[(self.has_flag(flags.UNQUOTED), self.has_flag(flags.NOT))])
 
-        if self.has_flag(flags.UNQUOTED) and is_quoted:
-            return None
+    def recognize(self, string_tokens, idx, context=None):
+        # Singular elements never produce outputs nor are memoized, so their results can be used directly
+        if context is None:
+            return super(BaseSingular, self).recognize(string_tokens, idx)
 
-        return to_match
+        return self._apply(string_tokens, idx, context)[1]
 
 
 class AnyString(BaseSingular):
@@ -45,11 +51,35 @@ class AnyString(BaseSingular):
         flags.UNQUOTED
     }
 
+    def __init__(self, *args, **kwargs):
+        super(AnyString, self).__init__(*args, **kwargs)
+
+        if self.has_flag(flags.QUOTED):
+            self._apply = self._apply_quoted
+
+        elif self.has_flag(flags.UNQUOTED):
+            self._apply = self._apply_unquoted
+
     def human_readable_name(self):
         return "Any String ."
 
-    def _apply(self, string_tokens, idx):
-        if self._apply_first(string_tokens, idx) is not None:
+    def first_tokens(self):
+        return None, False
+
+    def _apply(self, string_tokens, idx, context):
+        if idx < string_tokens.length or string_tokens.has_token(idx):
+            return True, idx + 1, None
+
+        return False, None, None
+
+    def _apply_quoted(self, string_tokens, idx, context):
+        if (idx < string_tokens.length or string_tokens.has_token(idx)) and string_tokens.quoted[idx]:
+            return True, idx + 1, None
+
+        return False, None, None
+
+    def _apply_unquoted(self, string_tokens, idx, context):
+        if (idx < string_tokens.length or string_tokens.has_token(idx)) and not string_tokens.quoted[idx]:
             return True, idx + 1, None
 
         return False, None, None
@@ -59,10 +89,11 @@ class Newline(BaseSingular):
     def human_readable_name(self):
         return "Newline $"
 
-    def _apply(self, string_tokens, idx):
-        to_match = self._apply_first(string_tokens, idx)
+    def first_tokens(self):
+        return {(False, "\n")}, False
 
-        if to_match == "\n":
+    def _apply(self, string_tokens, idx, context):
+        if (idx < string_tokens.length or string_tokens.has_token(idx)) and string_tokens.tokens[idx] == "\n":
             return True, idx + 1, None
 
         return False, None, None
@@ -91,16 +122,49 @@ class StringLiteral(BaseSingular):
     def human_readable_name(self):
         return "String Literal %s" % self.token_str
 
-    def _apply(self, string_tokens, idx):
-        to_match = self._apply_first(string_tokens, idx)
+    def first_tokens(self):
+        if self.has_flag(flags.NOT):
+            return None, False
+
+        return {(self.has_flag(flags.QUOTED), self.token_str.lower())}, False
+
+    _appliers = {
+        (False, False): "_apply_equal",
+        (True, False): "_apply_equal_unquoted",
+        (False, True): "_apply_not_equal",
+        (True, True): "_apply_not_equal_unquoted",
+    }
+
+    def _apply_equal(self, string_tokens, idx, context):
+        if (idx < string_tokens.length or string_tokens.has_token(idx)) and \
+                string_tokens.views[self._view][idx] == self.token_str:
+            return True, idx + 1, None
+
+        return False, None, None
+
+    def _apply_equal_unquoted(self, string_tokens, idx, context):
+        if (idx < string_tokens.length or string_tokens.has_token(idx)) and not string_tokens.quoted[idx] and \
+                string_tokens.views[self._view][idx] == self.token_str:
+            return True, idx + 1, None
+
+        return False, None, None
+
+    def _apply_not_equal(self, string_tokens, idx, context):
+        if idx < string_tokens.length or string_tokens.has_token(idx):
+            to_match = string_tokens.views[self._view][idx]
 
-        if to_match is not None:
-            matches = (to_match == self.token_str)
-            if matches ^ self.has_flag(flags.NOT):
+            if to_match is not None and to_match != self.token_str:
                 return True, idx + 1, None
 
         return False, None, None
 
+    def _apply_not_equal_unquoted(self, string_tokens, idx, context):
+        if (idx < string_tokens.length or string_tokens.has_token(idx)) and not string_tokens.quoted[idx] and \
+                string_tokens.views[self._view][idx] != self.token_str:
+            return True, idx + 1, None
+
+        return False, None, None
+
 class RegexString(BaseSingular):
     valid_flags = {
         flags.CASE_SENSITIVE,
@@ -130,13 +194,234 @@ class RegexString(BaseSingular):
     def human_readable_name(self):
         return "Regular Expression %s" % self.token_str
 
-    def _apply(self, string_tokens, idx):
-        to_match = self._apply_first(string_tokens, idx)
+    def first_tokens(self):
+        return None, False
+
+    _appliers = {
+        (False, False): "_apply_match",
+        (True, False): "_apply_match_unquoted",
+        (False, True): "_apply_not_match",
+        (True, True): "_apply_not_match_unquoted",
+    }
+
+    def _apply_match(self, string_tokens, idx, context):
+        if idx < string_tokens.length or string_tokens.has_token(idx):
+            to_match = string_tokens.views[self._view][idx]
+
+            if to_match is not None and self.regex.match(to_match):
+                return True, idx + 1, None
+
+        return False, None, None
+
+    def _apply_match_unquoted(self, string_tokens, idx, context):
+        if (idx < string_tokens.length or string_tokens.has_token(idx)) and not string_tokens.quoted[idx] and \
+                self.regex.match(string_tokens.views[self._view][idx]):
+            return True, idx + 1, None
+
+        return False, None, None
 
-        if to_match is not None:
-            matches = bool(self.regex.match(to_match))
+    def _apply_not_match(self, string_tokens, idx, context):
+        if idx < string_tokens.length or string_tokens.has_token(idx):
+            to_match = string_tokens.views[self._view][idx]
 
-            if matches ^ self.has_flag(flags.NOT):
+            if to_match is not None and not self.regex.match(to_match):
                 return True, idx + 1, None
 
         return False, None, None
+
+    def _apply_not_match_unquoted(self, string_tokens, idx, context):
+        if (idx < string_tokens.length or string_tokens.has_token(idx)) and not string_tokens.quoted[idx] and \
+                not self.regex.match(string_tokens.views[self._view][idx]):
+            return True, idx + 1, None
+
+        return False, None, None
+
+
+class LiteralSequence(BaseElement):
+    """
+    Element matching a run of consecutive String Literals at once, by comparing a slice of the input tokens against
+    their strings.  These cannot be written in grammars; they are created by the optimizer (see grammar.optimizer)
+    from runs of String Literals which compare against the same form of token.
+    """
+
+    def __init__(self, literals):
+        """
+        Inputs: literals - A list of 2 or more StringLiteral elements without the NOT flag, whose _view and UNQUOTED
+                           flag are the same.
+        """
+
+        super(LiteralSequence, self).__init__(token_dict=literals[0].token_dict)
+
+        self.literals = literals
+        # A list, rather than a tuple, so that it compares equal to slices of the lists within TokenBuffer.views
+        self.token_strs = [literal.token_str for literal in literals]
+        self.first_token_str = self.token_strs[0]
+        self.rest_token_strs = self.token_strs[1:]
+        self.length = len(literals)
+        self._flags = literals[0]._flags
+        self._view = literals[0]._view
+
+        if self.has_flag(flags.UNQUOTED):
+            self._apply = self._apply_equal_unquoted
+
+    def human_readable_name(self):
+        return "Literal Sequence %s" % " ".join(self.token_strs)
+
+    def first_tokens(self):
+        return self.literals[0].first_tokens()[0], False
+
+    # Most attempts to match a sequence fail on its first token, so it is compared before slicing out the rest
+    def _apply(self, string_tokens, idx, context):
+        end_idx = idx + self.length
+        view = string_tokens.views[self._view]
+
+        if (end_idx <= string_tokens.length or string_tokens.has_token(end_idx - 1)) and \
+                view[idx] == self.first_token_str and view[idx + 1:end_idx] == self.rest_token_strs:
+            return True, end_idx, None
+
+        return False, None, None
+
+    def _apply_equal_unquoted(self, string_tokens, idx, context):
+        end_idx = idx + self.length
+        view = string_tokens.views[self._view]
+
+        if (end_idx <= string_tokens.length or string_tokens.has_token(end_idx - 1)) and \
+                view[idx] == self.first_token_str and view[idx + 1:end_idx] == self.rest_token_strs and \
+                not any(string_tokens.quoted[idx:end_idx]):
+            return True, end_idx, None
+
+        return False, None, None
+
+
+class BaseSingularAlternatives(BaseElement):
+    """
+    Base class for elements matching any one of several singular elements which compare against the same form of
+    token, each of which may be named.  These cannot be written in grammars; they are created by the optimizer (see
+    grammar.optimizer) from runs of alternatives of One of Sets, so that a single comparison decides which of the
+    alternatives (if any) matches the current token, rather than trying each in turn.
+    """
+
+    def __init__(self, alternatives):
+        """
+        Inputs: alternatives - A list of 2 or more tuples of (element, name); a singular element without the NOT flag
+                               and the name of the Named Element containing it, or None if it was not named.  Each
+                               element must have the same _view and UNQUOTED flag.
+        """
+
+        super(BaseSingularAlternatives, self).__init__(token_dict=alternatives[0][0].token_dict)
+
+        self.alternatives = alternatives
+        self._flags = alternatives[0][0]._flags
+        self._view = alternatives[0][0]._view
+        self.unquoted = self.has_flag(flags.UNQUOTED)
+        # Whether any of the alternatives are named, and so produce outputs
+        self.named = any(name is not None for _, name in alternatives)
+
+    def human_readable_name(self):
+        return "%s %s" % (self.kind_name, " | ".join(
+            "<%s: %s>" % (name, element.token_str) if name is not None else element.token_str
+            for element, name in self.alternatives
+        ))
+
+    def _matched_name(self, to_match):
+        """
+        Returns a tuple of (match, name); whether any alternative matches the given token, and the name of the first
+        alternative which does
+        """
+
+        raise NotImplementedError
+
+    def _apply(self, string_tokens, idx, context):
+        if (idx < string_tokens.length or string_tokens.has_token(idx)) and \
+                not (self.unquoted and string_tokens.quoted[idx]):
+            match, name = self._matched_name(string_tokens.views[self._view][idx])
+
+            if match:
+                return True, idx + 1, ({name: string_tokens.captures[idx]} if name is not None else None)
+
+        return False, None, None
+
+    def _recognize(self, string_tokens, idx, context):
+        if (idx < string_tokens.length or string_tokens.has_token(idx)) and \
+                not (self.unquoted and string_tokens.quoted[idx]) and \
+                self._matched_name(string_tokens.views[self._view][idx])[0]:
+            return idx + 1
+
+        return None
+
+
+class LiteralSet(BaseSingularAlternatives):
+    """ Element matching any one of several String Literals, by looking the current token up in a frozenset """
+
+    kind_name = "Literal Set"
+
+    def __init__(self, alternatives):
+        super(LiteralSet, self).__init__(alternatives)
+
+        self.token_strs = frozenset(element.token_str for element, _ in alternatives)
+
+        # Maps the strings of named alternatives to their names.  Where several alternatives share a string, the first
+        # of them would have matched
+        self.names = {}
+        for element, name in reversed(alternatives):
+            self.names[element.token_str] = name
+
+    def first_tokens(self):
+        keys = set()
+
+        for element, _ in self.alternatives:
+            keys.update(element.first_tokens()[0])
+
+        return keys, False
+
+    def _matched_name(self, to_match):
+        if to_match in self.token_strs:
+            return True, self.names[to_match]
+
+        return False, None
+
+
+class RegexSet(BaseSingularAlternatives):
+    """
+    Element matching any one of several Regular Expressions, by combining them into a single regular expression with a
+    named group per alternative.  The first alternative which matches is the one whose group matched.
+    """
+
+    kind_name = "Regular Expression Set"
+
+    # Patterns which can't be combined with others: those using backreferences (which refer to groups by number) or
+    # global inline flags (which would apply to every alternative)
+    _uncombinable_re = re.compile(r"\\[1-9]|\(\?P=|\(\?\(|\(\?[aiLmsux]+\)")
+
+    def __init__(self, alternatives):
+        """ Raises re.error if the patterns of the alternatives cannot be combined """
+
+        super(RegexSet, self).__init__(alternatives)
+
+        self.regex = re.compile("|".join(
+            "(?P<_alternative%d>%s)" % (alternative_idx, element.token_str)
+            for alternative_idx, (element, _) in enumerate(alternatives)
+        ))
+
+        # Maps the names of the groups of each alternative to its name
+        self.names = dict(
+            ("_alternative%d" % alternative_idx, name) for alternative_idx, (_, name) in enumerate(alternatives)
+        )
+
+    @classmethod
+    def combinable(cls, regex_string):
+        """ Returns whether the given Regular Expression element can be combined with others into a RegexSet """
+
+        return cls._uncombinable_re.search(regex_string.token_str) is None
+
+    def first_tokens(self):
+        return None, False
+
+    def _matched_name(self, to_match):
+        # Bodies views hold None for unquoted tokens, which never match
+        match = self.regex.match(to_match) if to_match is not None else None
+
+        if match is None:
+            return False, None
+
+        return True, self.names[match.lastgroup]
@@ -1,4 +1,6 @@
+from ... import errors
 from ._base_element import BaseScopedElement
+from .scoped import Grammar
 
 class SubGrammarDefinition(BaseScopedElement):
     """
@@ -11,18 +13,34 @@ class SubGrammarDefinition(BaseScopedElement):
 
     def setup(self):
         self.sub_grammars = {}
+        # Maps whether the definition is used as alternatives to the result of first_tokens for its usages
+        self.first_tokens_cache = {}
 
         if self.token_str:
             # Find the name of the sub grammar; stripping off the def prefix
             self.name = self.name_re.search(self.token_str[3:]).group()
 
 
-class SubGrammarUsage(BaseScopedElement):
+class SubGrammarUsage(Grammar):
     """
-    Element for sub grammar replacements.
-    Only used during grammar creation, these never actually makes it into a Grammar object
+    Element for sub grammar usages, which refers to the elements of a SubGrammarDefinition rather than copying them.
+    Every usage of a sub grammar shares the single list of elements belonging to its definition, so that the size of
+    a constructed grammar grows linearly with the grammar string rather than exponentially with nested usages.
+
+    A usage matches as though the elements of its definition had been written in its place: within a One of Set
+    each of them, and each element of the sub grammars used within the definition, is an alternative; elsewhere they
+    are matched in sequence.  Usages of recursive definitions count
+    how deeply they are nested within each match, which can be limited by the match's max_recursion_depth.
     """
 
+    # Usages never build dispatch tables, alternatives are tried in order
+    dispatch_table = None
+
+    definition = None
+    alternatives = False
+    # Whether the definition can be used from within itself; set when the grammar is finalized
+    recursive = False
+
     def human_readable_name(self):
         return "Sub Grammar Usage %s()" % self.name
 
@@ -31,3 +49,92 @@ class SubGrammarUsage(BaseScopedElement):
 
         if self.token_str:
             self.name = self.name_re.search(self.token_str).group()
+
+    def resolve(self, definition, alternatives=False):
+        """
+        Points this usage at the definition it refers to.
+
+        Inputs: definition - The SubGrammarDefinition this usage refers to.
+                alternatives - A boolean, True if the elements of the definition are alternatives of a One of Set,
+                               rather than a sequence.
+        """
+
+        self.definition = definition
+        self.alternatives = alternatives
+        self.sub_elements = definition.sub_elements
+
+        # Every usage of a definition in the same position matches identically, so they share memoized results
+        self.memo_key = (definition, alternatives)
+
+    def first_tokens(self):
+        cache = self.definition.first_tokens_cache
+
+        if self.alternatives not in cache:
+            # Recursive sub grammars may lead back to this usage while its tokens are being determined; assume they
+            # could begin with anything until they are known
+            cache[self.alternatives] = None, True
+            cache[self.alternatives] = self._definition_first_tokens()
+
+        return cache[self.alternatives]
+
+    def _definition_first_tokens(self):
+        if not self.alternatives:
+            return super(SubGrammarUsage, self).first_tokens()
+
+        keys = set()
+        nullable = False
+
+        for sub_element in self.sub_elements:
+            sub_keys, sub_nullable = sub_element.first_tokens()
+            keys = None if keys is None or sub_keys is None else keys | sub_keys
+            nullable = nullable or sub_nullable
+
+        return keys, nullable
+
+    def _apply(self, string_tokens, idx, context):
+        if not self.recursive:
+            return self._apply_definition(string_tokens, idx, context)
+
+        return self._recursively(self._apply_definition, string_tokens, idx, context)
+
+    def _recognize(self, string_tokens, idx, context):
+        if not self.recursive:
+            return self._recognize_definition(string_tokens, idx, context)
+
+        return self._recursively(self._recognize_definition, string_tokens, idx, context)
+
+    def _recursively(self, method, string_tokens, idx, context):
+        """ Calls method, counting this usage towards the recursion depth of the match while it runs """
+
+        context.recursion_depth += 1
+
+        if context.max_recursion_depth is not None and context.recursion_depth > context.max_recursion_depth:
+            raise errors.RecursionDepthExceededError(self, context.max_recursion_depth)
+
+        result = method(string_tokens, idx, context)
+        context.recursion_depth -= 1
+
+        return result
+
+    def _apply_definition(self, string_tokens, idx, context):
+        if self.alternatives:
+            for element in self.sub_elements:
+                match, new_idx, output = element.apply(string_tokens, idx, context)
+                if match:
+                    return True, new_idx, output
+
+            return False, None, None
+
+        # Our outputs are merged into those of our parent, as though our elements had been written in its place
+        return self._apply_sub_elements(string_tokens, idx, context)
+
+    def _recognize_definition(self, string_tokens, idx, context):
+        if self.alternatives:
+            for element in self.sub_elements:
+                new_idx = element.recognize(string_tokens, idx, context)
+                if new_idx is not None:
+                    return new_idx
+
+            return None
+
+        return self._recognize_sub_elements(string_tokens, idx, context)
@@ -0,0 +1,25 @@
+class MatchContext(object):
+    """
+    Holds the state of a single match of a grammar against an input, which is passed down to each element as it
+    is applied.  Any per-match state belongs here rather than on the (shared) elements themselves, allowing a single
+    compiled grammar to be used by several threads at once.
+    """
+
+    def __init__(self, tracer=None, memoize=False, max_recursion_depth=None):
+        """
+        Inputs: tracer  - Optional: A tracing.Tracer whose callbacks will be called as each element is applied
+                memoize - A boolean, if True the result of applying each scoped element at each index is
+                          remembered for the duration of the match, so that it is only computed once
+                max_recursion_depth - Optional: The maximum number of usages of recursive sub grammars which may be
+                                      nested within each other during the match
+        """
+
+        self.tracer = tracer
+        # Maps (element, idx) to the result of applying element at idx
+        self.memo = {} if memoize else None
+        # Whether elements need to do anything besides apply themselves; checked once per element applied
+        self.instrumented = tracer is not None or memoize
+
+        self.max_recursion_depth = max_recursion_depth
+        # The number of usages of recursive sub grammars currently being applied
+        self.recursion_depth = 0
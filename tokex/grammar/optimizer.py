@@ -0,0 +1,383 @@
+"""
+File containing an optimization pass, which rewrites a constructed grammar tree into an equivalent one which is
+faster to match.
+
+The tree produced by parse.construct_grammar mirrors the grammar string exactly, with each construct becoming an
+element of its own, each of which costs a call to apply when matching.  The rewrites made here remove elements which
+add nothing to a match:
+    * Usages of (non recursive) sub grammars are replaced by the elements of their definitions, as though they had
+      been written in place of the usage.
+    * One of Sets nested directly within One of Sets have their alternatives moved into the outer set.
+    * One of Sets with a single alternative are replaced by that alternative.
+    * Runs of consecutive alternatives of One of Sets which begin with the same elements are replaced by a
+      FactoredAlternatives element, which matches those elements once before trying the rest of each alternative.
+    * Runs of consecutive alternatives of One of Sets which are (or are Named Elements containing) String Literals or
+      Regular Expressions are merged into a single LiteralSet or RegexSet, which determines which of them matches
+      the current token in a single step.
+    * Runs of consecutive String Literals are fused into a single LiteralSequence, comparing them all against a slice
+      of the input tokens at once.
+
+Each rewrite produces exactly the same outputs as the elements it replaces.  Elements are never copied, only referred
+to from more places, and the number of elements any one element is rewritten to contain is bounded, so the size of
+an optimized tree remains linear in the size of the grammar string.
+"""
+
+import collections
+import itertools
+import re
+
+from . import analysis
+from . import elements
+from . import flags
+
+
+# Kinds of rewrite
+INLINE_SUB_GRAMMAR = "inline sub grammar"
+FLATTEN_ONE_OF_SET = "flatten one of set"
+COLLAPSE_ONE_OF_SET = "collapse one of set"
+FACTOR_ALTERNATIVES = "factor alternatives"
+MERGE_ALTERNATIVES = "merge alternatives"
+FUSE_LITERALS = "fuse literals"
+
+# A rewrite applied to a grammar; kind is one of the kinds above and description a human readable explanation
+Rewrite = collections.namedtuple("Rewrite", ("kind", "description"))
+
+# Elements are only inlined into a list of sub elements if it holds no more than this many afterwards (or they don't
+# make it any longer).  Bounds the growth of grammars whose sub grammars are used many times within each other
+_MAX_INLINED_LENGTH = 16
+
+# The contexts in which a list of sub elements can be matched; as a sequence, or as the alternatives of a One of Set
+_SEQUENCE, _ALTERNATIVES = "sequence", "alternatives"
+
+
+def optimize_grammar(root_element):
+    """
+    Rewrites the element tree rooted at root_element in place.  Should be called once the tree has been constructed,
+    before it is finalized (see parse.finalize_grammar).
+
+    Inputs: root_element - The root of the element tree to optimize.
+
+    Outputs: A list of the Rewrite tuples applied to the tree, in the order they were applied.
+    """
+
+    recursive_definitions = analysis.recursive_definitions(root_element)
+    rewrites = []
+
+    _rewrite_lists(root_element, (_SEQUENCE, _ALTERNATIVES, None), lambda parent, sub_elements, context:
+                   _inline_sub_elements(parent, sub_elements, context, recursive_definitions, rewrites))
+
+    # Literals are fused last, so that alternatives are compared literal by literal when looking for shared prefixes
+    _rewrite_lists(root_element, (_ALTERNATIVES, ), lambda parent, sub_elements, context:
+                   _factor_alternatives(parent, sub_elements, recursive_definitions, rewrites))
+    _rewrite_lists(root_element, (_ALTERNATIVES, ), lambda parent, sub_elements, context:
+                   _merge_alternatives(parent, sub_elements, rewrites))
+    _rewrite_lists(root_element, (_SEQUENCE, ), lambda parent, sub_elements, context:
+                   _fuse_literals(parent, sub_elements, rewrites))
+
+    return rewrites
+
+
+def _rewrite_lists(root_element, contexts, rewrite):
+    """
+    Replaces the contents of each list of sub elements within the tree rooted at root_element which is matched in one
+    of the given contexts with the result of rewrite(parent, sub_elements, context).  The context of a list is None if
+    it may be matched in either context.  The lists of the most deeply nested elements are rewritten first, so that
+    the elements moved into their parents have already been rewritten themselves.
+    """
+
+    all_elements = list(analysis.iter_elements(root_element))
+
+    # The contexts each sub grammar definition is used in.  The elements of a definition are shared by all of its
+    # usages, so can only be spliced or fused if they are always matched in the same way
+    definition_contexts = {}
+    for element in all_elements:
+        if isinstance(element, elements.SubGrammarUsage):
+            definition_contexts.setdefault(element.definition, set()).add(
+                _ALTERNATIVES if element.alternatives else _SEQUENCE
+            )
+
+    rewritten_lists = set()
+
+    for element in reversed(all_elements):
+        if not isinstance(element, elements.BaseScopedElement) or isinstance(element, elements.NamedElement):
+            continue
+
+        if isinstance(element, elements.SubGrammarUsage):
+            usage_contexts = definition_contexts[element.definition]
+            context = next(iter(usage_contexts)) if len(usage_contexts) == 1 else None
+            element_lists = [(element.sub_elements, context)]
+
+        elif isinstance(element, elements.FactoredAlternatives):
+            element_lists = [(element.prefix, _SEQUENCE), (element.sub_elements, _ALTERNATIVES)]
+
+        else:
+            context = _ALTERNATIVES if isinstance(element, elements.OneOfSet) else _SEQUENCE
+            element_lists = [(element.sub_elements, context)]
+
+        for sub_elements, context in element_lists:
+            if context in contexts and id(sub_elements) not in rewritten_lists:
+                rewritten_lists.add(id(sub_elements))
+                sub_elements[:] = rewrite(element, sub_elements, context)
+
+
+def _inline_sub_elements(parent, sub_elements, context, recursive_definitions, rewrites):
+    """
+    Returns an optimized list of sub elements equivalent to sub_elements, matched in the given context.  If context is
+    None the list may be matched in either context, and its elements can only be replaced one for one.
+    """
+
+    optimized = []
+
+    for idx, sub_element in enumerate(sub_elements):
+        replacement = _collapse(sub_element, rewrites)
+
+        inlined = _inlined_elements(replacement, context, recursive_definitions)
+        remaining = len(sub_elements) - idx - 1
+
+        if inlined is not None and (
+                len(inlined) <= 1 or len(optimized) + len(inlined) + remaining <= _MAX_INLINED_LENGTH):
+            kind = INLINE_SUB_GRAMMAR if isinstance(replacement, elements.SubGrammarUsage) else FLATTEN_ONE_OF_SET
+            rewrites.append(Rewrite(kind, "Moved the contents of %r into %r" % (replacement, parent)))
+            optimized.extend(inlined)
+
+        else:
+            optimized.append(replacement)
+
+    return optimized
+
+
+def _collapse(element, rewrites):
+    """ Returns the element which element can be replaced with, regardless of the context it is matched in """
+
+    # A usage of a sub grammar as alternatives would become a sequence if it were no longer within a One of Set
+    while type(element) is elements.OneOfSet and len(element.sub_elements) == 1 and not (
+            isinstance(element.sub_elements[0], elements.SubGrammarUsage) and element.sub_elements[0].alternatives):
+        rewrites.append(Rewrite(COLLAPSE_ONE_OF_SET, "Replaced %r with its only alternative %r" % (
+            element, element.sub_elements[0]
+        )))
+        element = element.sub_elements[0]
+
+    return element
+
+
+def _inlined_elements(element, context, recursive_definitions):
+    """
+    Returns the list of elements which element could be replaced with within a list of elements matched in the given
+    context, or None if it cannot be.
+    """
+
+    if isinstance(element, elements.SubGrammarUsage):
+        if element.definition in recursive_definitions:
+            return None
+
+        # A single element matches the same way whether it is matched as a sequence or as alternatives
+        if len(element.sub_elements) == 1 or context == (_ALTERNATIVES if element.alternatives else _SEQUENCE):
+            return element.sub_elements
+
+    elif type(element) is elements.OneOfSet and context == _ALTERNATIVES:
+        return element.sub_elements
+
+    return None
+
+
+def _factor_alternatives(parent, alternatives, recursive_definitions, rewrites):
+    """
+    Returns alternatives, with each run of 2 or more consecutive alternatives beginning with the same elements
+    replaced by a FactoredAlternatives element.  Runs are extended for as long as their alternatives share at least
+    one leading element, and only ever contain consecutive alternatives, so alternatives are still tried in order.
+    """
+
+    factored = []
+    idx = 0
+
+    while idx < len(alternatives):
+        sequence, _ = _alternative_sequence(alternatives[idx], recursive_definitions)
+        prefix_length = len(sequence)
+        end = idx + 1
+
+        while end < len(alternatives):
+            other_sequence, _ = _alternative_sequence(alternatives[end], recursive_definitions)
+            shared_length = _shared_prefix_length(sequence[:prefix_length], other_sequence)
+
+            if not shared_length:
+                break
+
+            prefix_length = shared_length
+            end += 1
+
+        if end - idx < 2:
+            factored.append(alternatives[idx])
+            idx += 1
+            continue
+
+        tails = []
+        for alternative in alternatives[idx:end]:
+            alternative_sequence, name = _alternative_sequence(alternative, recursive_definitions)
+            tail = elements.Grammar()
+            tail.name = name
+            tail.sub_elements = alternative_sequence[prefix_length:]
+            tails.append(tail)
+
+        element = elements.FactoredAlternatives(sequence[:prefix_length], tails)
+        rewrites.append(Rewrite(FACTOR_ALTERNATIVES, "Matched the %d leading elements shared by %s within %r once" % (
+            prefix_length, ", ".join(repr(alternative) for alternative in alternatives[idx:end]), parent
+        )))
+        factored.append(element)
+        idx = end
+
+    return factored
+
+
+def _alternative_sequence(alternative, recursive_definitions):
+    """
+    Returns a tuple of (elements, name); the sequence of elements an alternative matches, and the name its outputs
+    are wrapped in, or None if they are not wrapped.
+    """
+
+    if type(alternative) is elements.Grammar:
+        return alternative.sub_elements, alternative.name
+
+    # Usages of recursive sub grammars must be applied themselves, to count their recursion depth
+    if type(alternative) is elements.SubGrammarUsage and not alternative.alternatives and \
+            alternative.definition not in recursive_definitions:
+        return alternative.sub_elements, None
+
+    return [alternative], None
+
+
+def _shared_prefix_length(sequence, other_sequence):
+    """ Returns the number of leading elements of the given sequences which are structurally equal """
+
+    length = 0
+
+    for element, other_element in zip(sequence, other_sequence):
+        if not _structurally_equal(element, other_element):
+            break
+        length += 1
+
+    return length
+
+
+def _structurally_equal(element, other_element):
+    """ Returns whether the given elements always match identically, being of the same type with the same contents """
+
+    if element is other_element:
+        return True
+
+    if type(element) is not type(other_element):
+        return False
+
+    if isinstance(element, elements.SubGrammarUsage):
+        return element.definition is other_element.definition and element.alternatives == other_element.alternatives
+
+    if isinstance(element, elements.BaseScopedElement):
+        children = element.child_elements()
+        other_children = other_element.child_elements()
+
+        return element.name == other_element.name and \
+            len(element.sub_elements) == len(other_element.sub_elements) and \
+            len(children) == len(other_children) and \
+            all(_structurally_equal(child, other_child) for child, other_child in zip(children, other_children))
+
+    if isinstance(element, elements.LiteralSequence):
+        return element.token_strs == other_element.token_strs and element._flags == other_element._flags
+
+    # Merged alternatives have no token_str of their own, so are compared alternative by alternative
+    if isinstance(element, elements.BaseSingularAlternatives):
+        return len(element.alternatives) == len(other_element.alternatives) and all(
+            name == other_name and _structurally_equal(alternative, other_alternative)
+            for (alternative, name), (other_alternative, other_name) in
+            zip(element.alternatives, other_element.alternatives)
+        )
+
+    if isinstance(element, (elements.AnyString, elements.Newline, elements.StringLiteral, elements.RegexString)):
+        return element.token_str == other_element.token_str and element._flags == other_element._flags
+
+    raise TypeError("Cannot compare elements of type %s" % type(element).__name__)
+
+
+def _mergeable_key(alternative):
+    """
+    Returns a key shared by alternatives which can be merged into one LiteralSet or RegexSet, or None.  Alternatives
+    can be merged if they are (or are Named Elements containing) the same type of singular element, comparing against
+    the same form of token.
+    """
+
+    element = alternative
+    if type(alternative) is elements.NamedElement:
+        element = alternative.sub_elements[0] if alternative.sub_elements else None
+
+    if type(element) not in (elements.StringLiteral, elements.RegexString) or element.has_flag(flags.NOT):
+        return None
+
+    if type(element) is elements.RegexString and not elements.RegexSet.combinable(element):
+        return None
+
+    return type(element), element._view, element.has_flag(flags.UNQUOTED)
+
+
+def _merge_alternatives(parent, alternatives, rewrites):
+    """ Returns alternatives with each run of mergeable alternatives replaced by a LiteralSet or RegexSet """
+
+    merged = []
+
+    for key, run in itertools.groupby(alternatives, _mergeable_key):
+        run = list(run)
+
+        if key is None or len(run) < 2:
+            merged.extend(run)
+            continue
+
+        named_alternatives = [
+            (alternative.sub_elements[0], alternative.name) if type(alternative) is elements.NamedElement
+            else (alternative, None)
+            for alternative in run
+        ]
+
+        try:
+            if key[0] is elements.StringLiteral:
+                element = elements.LiteralSet(named_alternatives)
+            else:
+                element = elements.RegexSet(named_alternatives)
+
+        # Patterns which are valid alone may not be when combined, ie: if they define groups with the same names
+        except re.error:
+            merged.extend(run)
+            continue
+
+        rewrites.append(Rewrite(MERGE_ALTERNATIVES, "Merged %d alternatives of %r into %r" % (
+            len(run), parent, element
+        )))
+        merged.append(element)
+
+    return merged
+
+
+def _fusable_key(element):
+    """ Returns a key shared by String Literals which can be fused into one LiteralSequence, or None """
+
+    if type(element) is not elements.StringLiteral or element.has_flag(flags.NOT):
+        return None
+
+    return element._view, element.has_flag(flags.UNQUOTED)
+
+
+def _fuse_literals(parent, sub_elements, rewrites):
+    """ Returns sub_elements with each run of fusable String Literals replaced by a LiteralSequence """
+
+    fused = []
+
+    for key, run in itertools.groupby(sub_elements, _fusable_key):
+        run = list(run)
+
+        if key is None or len(run) < 2:
+            fused.extend(run)
+            continue
+
+        sequence = elements.LiteralSequence(run)
+        rewrites.append(Rewrite(FUSE_LITERALS, "Fused %d String Literals within %r into %r" % (
+            len(run), parent, sequence
+        )))
+        fused.append(sequence)
+
+    return fused
@@ -6,17 +6,20 @@ import contextlib
 import re
 
 from .. import errors
+from . import analysis
 from . import elements
 from . import flags
 
-def tokenize_grammar(grammar_string):
-    """ Function which accepts a grammar string and returns an iterable of tokens """
-
-    # Function to create regex's for given flags
-    flags_re_string = "[%s]*" % "".join((getattr(flags, flag) for flag in flags.__all__))
+def _build_grammar_token_re():
+    """ Builds the regular expression used to split grammar strings into tokens """
 
     name_re_str = elements.BaseScopedElement.name_re_str
 
+    # The contents of a quoted token (ie: a regex or string literal) are written as an unrolled loop: runs of ordinary
+    # characters separated by escapes.  Unlike nested quantifiers, this can only ever match the contents one way, so an
+    # unterminated token fails in linear time rather than backtracking catastrophically
+    quoted_re_string = lambda quote: r"{0}[^\\{0}]*(?:\\.[^\\{0}]*)*{0}".format(quote)
+
     pattern = "|".join((
         # Defined Sub Grammar open
         r"def\s+%s\s*\{" % name_re_str,
@@ -32,16 +35,13 @@ def tokenize_grammar(grammar_string):
         r"<\s*%s?\s*:" % name_re_str,
         # One of Set open
         r"\{",
-        # All Regex
-        r"%s\." % flags_re_string,
-        # Regex
-        r"%s~(?:[^\\~]*(?:\\.)*)*~" % flags_re_string,
-        # Literal String
-        #r"%s'.*?(?<!\\)'" % flags_re_string(elements.StringLiteral.valid_flags),
-        r"%s'(?:[^\\']*(?:\\.)*)*'" % flags_re_string,
-        # Literal String
-        #r'%s".*?(?<!\\)"' % flags_re_string(elements.StringLiteral.valid_flags),
-        r'%s"(?:[^\\"]*(?:\\.)*)*"' % flags_re_string,
+        # Singular tokens, which may be prefixed with flags: All Regex, Regex, Literal Strings
+        r"(?P<_flags_>[%s]*)(?:\.|%s|%s|%s)" % (
+            "".join((getattr(flags, flag) for flag in flags.__all__)),
+            quoted_re_string("~"),
+            quoted_re_string("'"),
+            quoted_re_string('"'),
+        ),
         # Newline Token
         r"\$",
 
@@ -55,30 +55,43 @@ def tokenize_grammar(grammar_string):
 
         # Special non-token-class tokens to match
         # Comments
-        r"(?P<_comment_>#[^\n]*(\n|$))",
+        r"(?P<_comment_>#[^\n]*)",
         # Final fallback - nontoken
         r"(?P<_nontoken_>\S+)"
     ))
 
-    matched_tokens = []
-    all_flags_re = re.compile("[%s]+" % "".join((getattr(flags, flag) for flag in flags.__all__)))
+    return re.compile(pattern, re.I)
 
-    for match in re.finditer(pattern, grammar_string, re.I):
-        if match.groupdict().get('_nontoken_'):
-            raise errors.UnknownGrammarTokenError(match.groupdict()['_nontoken_'], grammar_string, match.span())
 
-        elif match.groupdict().get('_comment_'):
-            continue
+_GRAMMAR_TOKEN_RE = _build_grammar_token_re()
+
 
-        matched_token = match.group()
+def tokenize_grammar(grammar_string):
+    """ Function which accepts a grammar string and returns an iterable of tokens """
+
+    matched_tokens = []
 
-        # Check for flags on the token
+    for match in _GRAMMAR_TOKEN_RE.finditer(grammar_string):
+        # Only singular tokens, comments & nontokens contain groups, so most tokens need no further inspection
+        kind = match.lastgroup
         token_flags = None
-        if matched_token[:3].lower() not in ("def", "sep") and matched_token[-2:] != "()":
-            token_flags = all_flags_re.match(matched_token)
-            if token_flags:
-                token_flags = set(token_flags.group())
-                matched_token = matched_token[len(token_flags):]
+
+        if kind == "_flags_":
+            matched_token = match.group()
+            flags_str = match.group("_flags_")
+
+            if flags_str:
+                token_flags = set(flags_str)
+                matched_token = matched_token[len(flags_str):]
+
+        elif kind is None:
+            matched_token = match.group()
+
+        elif kind == "_comment_":
+            continue
+
+        else:
+            raise errors.UnknownGrammarTokenError(match.group(), grammar_string, match.span())
 
         matched_tokens.append({
             "match": match,
@@ -89,7 +102,7 @@ def tokenize_grammar(grammar_string):
     return matched_tokens
 
 
-def construct_grammar(grammar_string, allow_sub_grammar_definitions=False, default_flags=flags.DEFAULTS):
+def construct_grammar(grammar_string, allow_sub_grammar_definitions=False, default_flags=flags.DEFAULTS, finalize=True):
     """
     Function which accepts a user-defined grammar string and returns an instance of Grammar representing it.
 
@@ -98,6 +111,8 @@ def construct_grammar(grammar_string, allow_sub_grammar_definitions=False, defau
                                             See the README for more information on what sub grammars are used for
                                             and the dangers of allowing them when parsing untrusted third-party grammars
             default_flags - Can be passed as a set of flags, which will set the defaults for all elements in the grammar
+            finalize - A boolean, if False the constructed grammar is not finalized, allowing it to be rewritten before
+                       it is.  finalize_grammar must be called on it before it can be used for matching.
 
     Outputs: An instance of a Grammar class which can be used to parse input strings.
     """
@@ -114,6 +129,9 @@ def construct_grammar(grammar_string, allow_sub_grammar_definitions=False, defau
 
     token_dict = None
 
+    # Usages of sub grammars which could not be resolved when they were parsed, along with the scopes they were used in
+    unresolved_usages = []
+
     error_params = lambda: grammar_string, token_dict, grammar_stack
     sub_grammar_error_params = lambda: grammar_string, token_dict, sub_grammar_stack
 
@@ -181,8 +199,7 @@ def construct_grammar(grammar_string, allow_sub_grammar_definitions=False, defau
                 if grammar_stack[-1].__class__ in \
                               (elements.SubGrammarDefinition, elements.IteratorDelimiter, elements.OneOfSet):
                     if isinstance(grammar_stack[-1], elements.SubGrammarDefinition):
-                        new_sub_grammar = sub_grammar_stack.pop()
-                        sub_grammar_stack[-1].sub_grammars[new_sub_grammar.name] = new_sub_grammar
+                        sub_grammar_stack.pop()
 
                     grammar_stack.pop()
 
@@ -236,23 +253,32 @@ def construct_grammar(grammar_string, allow_sub_grammar_definitions=False, defau
                         raise errors.SubGrammarScopeError(stack_element, element.name)
 
                 element = elements.SubGrammarDefinition(token, token_flags, default_flags, token_dict)
+
+                # Sub grammars are usable from the moment they are opened, so they can refer to themselves
+                sub_grammar_stack[-1].sub_grammars[element.name] = element
                 grammar_stack.append(element)
                 sub_grammar_stack.append(element)
 
             # Sub Grammar Usage
             elif token[-1] == ")":
-                # Find the referenced sub_grammar
-                sub_grammar_name = elements.SubGrammarUsage(token, token_flags, default_flags, token_dict).name
+                usage = elements.SubGrammarUsage(token, token_flags, default_flags, token_dict)
+
+                # Named elements hold a single singular element, so can only contain the definition's own.  Others
+                # refer to the definition, rather than copying its elements into the grammar
+                if not isinstance(grammar_stack[-1], elements.NamedElement):
+                    grammar_stack[-1].add_sub_element(usage)
 
-                for parent_sub_grammar in reversed(sub_grammar_stack):
-                    if sub_grammar_name in parent_sub_grammar.sub_grammars:
-                        for sub_element in parent_sub_grammar.sub_grammars[sub_grammar_name].sub_elements:
-                            grammar_stack[-1].add_sub_element(sub_element)
+                usage_scopes = list(sub_grammar_stack)
+                definition = _find_sub_grammar(usage.name, usage_scopes)
 
-                        break
+                # Usages of sub grammars which are still being defined, or which are defined later on in the grammar,
+                # are resolved once the whole grammar has been parsed
+                if definition is None or (
+                        isinstance(grammar_stack[-1], elements.NamedElement) and definition in sub_grammar_stack):
+                    unresolved_usages.append((usage, usage_scopes, grammar_stack[-1], token_dict))
 
                 else:
-                    raise errors.UndefinedSubGrammarError(sub_grammar_name)
+                    _resolve_usage(usage, definition, grammar_stack[-1])
 
             else:
                 raise errors.GrammarParsingError("Unknown token: %r" % token)
@@ -260,4 +286,94 @@ def construct_grammar(grammar_string, allow_sub_grammar_definitions=False, defau
         if len(grammar_stack) > 1:
             raise errors.ExtraOpeningBracketsError(grammar_stack[-1])
 
-        return grammar_stack[0]
+        for usage, usage_scopes, parent, token_dict in unresolved_usages:
+            definition = _find_sub_grammar(usage.name, usage_scopes)
+
+            if definition is None:
+                raise errors.UndefinedSubGrammarError(usage.name)
+
+            _resolve_usage(usage, definition, parent)
+
+        _expand_alternative_usages(grammar_stack[0])
+
+        # Matching a left recursive usage can recurse forever without consuming any tokens
+        left_recursive_usage = analysis.left_recursive_usage(grammar_stack[0])
+        if left_recursive_usage is not None:
+            token_dict = left_recursive_usage.token_dict
+            raise errors.LeftRecursiveSubGrammarError(left_recursive_usage.name)
+
+    if finalize:
+        finalize_grammar(grammar_stack[0])
+
+    return grammar_stack[0]
+
+
+def _find_sub_grammar(name, sub_grammar_scopes):
+    """ Returns the sub grammar definition visible as name from the innermost of sub_grammar_scopes, or None """
+
+    for parent_sub_grammar in reversed(sub_grammar_scopes):
+        if name in parent_sub_grammar.sub_grammars:
+            return parent_sub_grammar.sub_grammars[name]
+
+    return None
+
+
+def _resolve_usage(usage, definition, parent):
+    """ Resolves a usage of a sub grammar within parent to its definition """
+
+    if isinstance(parent, elements.NamedElement):
+        for sub_element in definition.sub_elements:
+            parent.add_sub_element(sub_element)
+
+    else:
+        usage.resolve(definition, isinstance(parent, elements.OneOfSet))
+
+
+def _expand_alternative_usages(grammar):
+    """
+    Gives each usage of a sub grammar as the alternatives of a One of Set the elements of its definition with the
+    elements of any sub grammars used within the definition in place of their usages, as though they had been written
+    in the definition.  Each of those elements is then an alternative, rather than each nested usage matching as a
+    single alternative.  Usages of recursive sub grammars are left in place.
+    """
+
+    recursive_definitions = analysis.recursive_definitions(grammar)
+    # Maps each definition used as alternatives to its expanded elements, shared by all of its usages as alternatives
+    expanded = {}
+
+    def _expanded_elements(definition):
+        if definition not in expanded:
+            expanded[definition] = []
+
+            for sub_element in definition.sub_elements:
+                if isinstance(sub_element, elements.SubGrammarUsage) and \
+                        sub_element.definition not in recursive_definitions:
+                    expanded[definition].extend(_expanded_elements(sub_element.definition))
+                else:
+                    expanded[definition].append(sub_element)
+
+        return expanded[definition]
+
+    usages = [
+        element for element in analysis.iter_elements(grammar)
+        if isinstance(element, elements.SubGrammarUsage) and element.alternatives
+    ]
+
+    for usage in usages:
+        usage.sub_elements = _expanded_elements(usage.definition)
+
+
+def finalize_grammar(grammar):
+    """
+    Function which prepares each element of a fully constructed grammar tree for matching.
+
+    Inputs: grammar - The root of the element tree to finalize
+    """
+
+    recursive_definitions = analysis.recursive_definitions(grammar)
+
+    for element in analysis.iter_elements(grammar):
+        if isinstance(element, elements.SubGrammarUsage):
+            element.recursive = element.definition in recursive_definitions
+
+        element.finalize()
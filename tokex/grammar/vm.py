@@ -0,0 +1,508 @@
+"""
+File containing a backend which flattens a constructed grammar tree into an array of instructions, run by a loop
+which keeps an explicit stack of frames rather than recursing through the apply methods of nested elements.
+
+Each scoped element is assembled into a block of instructions, entered by a CALL instruction.  Calling a block pushes
+a frame holding the state of that element's match (its start index, outputs, loop iterations or remaining
+alternatives) along with a failure handler; when any instruction within the block fails to match, or a block it
+calls fails, execution continues at the handler.  Singular elements, and named elements containing them, are
+matched directly by the block containing them.
+
+The instructions reproduce the interpreter's greedy matching exactly, so both produce the same outputs and end index.
+Grammars may also be assembled as recognizers, which leave out the instructions capturing, merging & wrapping
+outputs; only determining whether and where the grammar matches.
+"""
+
+from .. import errors
+from . import elements
+
+
+# Opcodes
+(
+    MATCH,
+    MATCH_SEQUENCE,
+    CAPTURE,
+    CALL,
+    MERGE,
+    APPLY,
+    FAIL,
+    RETURN,
+    RETURN_WRAPPED,
+    RETURN_OPTIONAL,
+    RETURN_START,
+    RETURN_CAPTURED,
+    RETURN_IF_END,
+    LOOP_INIT,
+    LOOP_TEST,
+    SKIP_IF_FIRST,
+    MERGE_LAST,
+    LOOP_NEXT,
+    LOOP_END,
+    CHOICE,
+    PREFIX_CHOICE,
+    TRY_NEXT,
+    RETURN_TAIL,
+    RECURSE,
+) = range(24)
+
+
+class _Frame(object):
+    """ The state of a single block being matched """
+
+    __slots__ = (
+        "handler", "return_pc", "start", "outputs", "items", "current", "candidates", "next_candidate", "recursive"
+    )
+
+    def __init__(self, handler, return_pc, start):
+        self.handler = handler
+        self.return_pc = return_pc
+        self.start = start
+        self.outputs = {}
+        # Whether this frame is a usage of a recursive sub grammar, counted towards the recursion depth
+        self.recursive = False
+
+
+class _Assembler(object):
+    """ Assembles the blocks of instructions for each element of a grammar tree """
+
+    def __init__(self, recognize=False):
+        # Whether outputs are built, or left out as the grammar is assembled as a recognizer
+        self.recognize = recognize
+        self.code = []
+        # Maps id(element) to the (entry pc, handler pc) of its block
+        self.blocks = {}
+        self._pending = []
+
+    def assemble(self, root_element):
+        self.block(root_element)
+
+        while self._pending:
+            self._assemble_block(self._pending.pop())
+
+        # Resolve references to blocks now all of their addresses are known
+        for pc, instruction in enumerate(self.code):
+            if instruction[0] == CALL:
+                self.code[pc] = (CALL,) + self.blocks[self._block_key(instruction[1])]
+
+            elif instruction[0] in (CHOICE, PREFIX_CHOICE):
+                opcode, element, alternatives = instruction
+                block_map = dict(
+                    (alternative, self.blocks[self._block_key(alternative)]) for alternative in alternatives
+                )
+                self.code[pc] = (opcode, element, block_map)
+
+        return self.code, self.blocks[self._block_key(root_element)]
+
+    @staticmethod
+    def _block_key(element):
+        # Usages of the same sub grammar definition share its block
+        if type(element) is elements.SubGrammarUsage:
+            return id(element.definition), element.alternatives
+
+        return id(element)
+
+    def block(self, element):
+        """ Arranges for a block to be assembled for element """
+
+        key = self._block_key(element)
+
+        if key not in self.blocks:
+            self.blocks[key] = None
+            self._pending.append(element)
+
+    def emit(self, *instruction):
+        self.code.append(instruction)
+        return len(self.code) - 1
+
+    def emit_sequence(self, sub_elements):
+        """ Emits instructions matching each of sub_elements in turn, merging their outputs into the frame's """
+
+        for sub_element in sub_elements:
+            if self.matchable(sub_element):
+                self.emit(MATCH, sub_element)
+
+            elif type(sub_element) is elements.LiteralSequence:
+                self.emit(MATCH_SEQUENCE, sub_element)
+
+            elif type(sub_element) is elements.NamedElement:
+                if sub_element.sub_elements and self.recognize:
+                    self.emit(MATCH, sub_element.sub_elements[0])
+                elif sub_element.sub_elements:
+                    self.emit(CAPTURE, sub_element.name, sub_element.sub_elements[0])
+
+            elif type(sub_element) in _SCOPED_TYPES:
+                self.block(sub_element)
+                self.emit(CALL, sub_element)
+
+                if not self.recognize:
+                    self.emit(MERGE)
+
+            else:
+                self.emit(APPLY, sub_element)
+
+                if not self.recognize:
+                    self.emit(MERGE)
+
+    def matchable(self, element):
+        """ Returns whether element consumes a single token without producing outputs, so can be matched directly """
+
+        # Named alternatives of singular alternatives elements produce outputs, unless they're left out
+        if isinstance(element, elements.BaseSingularAlternatives):
+            return self.recognize or not element.named
+
+        return type(element) in _SINGULAR_TYPES
+
+    def emit_return(self, opcode, *args):
+        """ Emits an instruction returning from the current block, which recognizers do without building outputs """
+
+        if self.recognize:
+            return self.emit(RETURN)
+
+        return self.emit(opcode, *args)
+
+    def _assemble_block(self, element):
+        element_type = type(element)
+        entry = len(self.code)
+
+        if element_type is elements.SubGrammarUsage and element.recursive:
+            self.emit(RECURSE, element)
+
+        if element_type in (elements.Grammar, elements.IteratorDelimiter) or \
+                (element_type is elements.SubGrammarUsage and not element.alternatives):
+            self.emit_sequence(element.sub_elements)
+
+            if element_type is elements.Grammar:
+                self.emit_return(RETURN_WRAPPED, element.name)
+            else:
+                self.emit_return(RETURN_OPTIONAL, None)
+
+            handler = self.emit(FAIL)
+
+        elif element_type is elements.ZeroOrOne:
+            self.emit(RETURN_IF_END)
+            self.emit_sequence(element.sub_elements)
+            self.emit_return(RETURN_OPTIONAL, element.name)
+            handler = self.emit(RETURN_START)
+
+        elif element_type in (elements.ZeroOrMore, elements.OneOrMore):
+            zero = element_type is elements.ZeroOrMore
+
+            if zero:
+                self.emit(RETURN_IF_END)
+
+            self.emit(LOOP_INIT)
+            top = self.emit(LOOP_TEST)
+
+            if element.delimiter_grammar is not None:
+                skip = self.emit(SKIP_IF_FIRST, None)
+                self.block(element.delimiter_grammar)
+                self.emit(CALL, element.delimiter_grammar)
+
+                if not self.recognize:
+                    self.emit(MERGE_LAST)
+
+                self.code[skip] = (SKIP_IF_FIRST, len(self.code))
+
+            self.emit_sequence(element.sub_elements)
+            self.emit(LOOP_NEXT, top)
+            handler = self.emit(LOOP_END, zero, None if self.recognize else element.name)
+
+        elif element_type in (elements.OneOfSet, elements.SubGrammarUsage):
+            for sub_element in element.sub_elements:
+                self.block(sub_element)
+
+            self.emit(CHOICE, element, element.sub_elements)
+            handler = self.emit(TRY_NEXT)
+            self.emit(RETURN)
+
+        elif element_type is elements.FactoredAlternatives:
+            self.emit_sequence(element.prefix)
+            self.emit(PREFIX_CHOICE, element, element.sub_elements)
+            self.emit(TRY_NEXT)
+            self.emit(RETURN)
+            handler = self.emit(FAIL)
+
+            # The tails of the alternatives are only ever called from this block, so are assembled along with it
+            for tail in element.sub_elements:
+                tail_entry = len(self.code)
+                self.emit_sequence(tail.sub_elements)
+                self.emit_return(RETURN_TAIL, tail.name)
+                self.blocks[self._block_key(tail)] = (tail_entry, self.emit(FAIL))
+
+        elif element_type is elements.NamedElement:
+            if element.sub_elements:
+                self.emit(MATCH, element.sub_elements[0])
+                self.emit_return(RETURN_CAPTURED, element.name)
+            else:
+                self.emit_return(RETURN_OPTIONAL, None)
+
+            handler = self.emit(FAIL)
+
+        elif element_type is elements.LiteralSequence:
+            self.emit(MATCH_SEQUENCE, element)
+            self.emit_return(RETURN_OPTIONAL, None)
+            handler = self.emit(FAIL)
+
+        elif self.matchable(element):
+            self.emit(MATCH, element)
+            self.emit_return(RETURN_OPTIONAL, None)
+            handler = self.emit(FAIL)
+
+        else:
+            self.emit(APPLY, element)
+            self.emit(RETURN)
+            handler = self.emit(FAIL)
+
+        self.blocks[self._block_key(element)] = (entry, handler)
+
+
+_SINGULAR_TYPES = (elements.AnyString, elements.Newline, elements.StringLiteral, elements.RegexString)
+
+_SCOPED_TYPES = (
+    elements.Grammar,
+    elements.NamedElement,
+    elements.IteratorDelimiter,
+    elements.ZeroOrOne,
+    elements.ZeroOrMore,
+    elements.OneOrMore,
+    elements.OneOfSet,
+    elements.FactoredAlternatives,
+    elements.SubGrammarUsage,
+)
+
+
+def _make_runner(code, root_block):
+    """ Returns a function running the given instructions, starting with the block at root_block """
+
+    root_entry, root_handler = root_block
+
+    def run(string_tokens, idx, context):
+        # The number of tokens held when the match began; LazyTokenBuffers are asked to tokenize further beyond it
+        length = string_tokens.length
+        has_token = string_tokens.has_token
+        captures = string_tokens.captures
+
+        frame = _Frame(root_handler, None, idx)
+        stack = [frame]
+        pc = root_entry
+        output = None
+        recursion_depth = 0
+
+        while True:
+            instruction = code[pc]
+            op = instruction[0]
+            failed = False
+            returned = False
+
+            if op == MATCH:
+                if instruction[1]._apply(string_tokens, idx, context)[0]:
+                    idx += 1
+                    pc += 1
+                else:
+                    pc = frame.handler
+
+            elif op == MATCH_SEQUENCE:
+                if instruction[1]._apply(string_tokens, idx, context)[0]:
+                    idx += instruction[1].length
+                    pc += 1
+                else:
+                    pc = frame.handler
+
+            elif op == CAPTURE:
+                if instruction[2]._apply(string_tokens, idx, context)[0]:
+                    frame.outputs[instruction[1]] = captures[idx]
+                    idx += 1
+                    pc += 1
+                else:
+                    pc = frame.handler
+
+            elif op == CALL:
+                frame = _Frame(instruction[2], pc + 1, idx)
+                stack.append(frame)
+                pc = instruction[1]
+
+            elif op == MERGE:
+                if output is not None:
+                    frame.outputs.update(output)
+                pc += 1
+
+            elif op == LOOP_TEST:
+                if frame.current >= length and not has_token(frame.current):
+                    pc = frame.handler
+                else:
+                    idx = frame.current
+                    frame.outputs = {}
+                    pc += 1
+
+            elif op == LOOP_NEXT:
+                if idx == frame.current:
+                    pc = frame.handler
+                else:
+                    frame.items.append(frame.outputs or None)
+                    frame.current = idx
+                    pc = instruction[1]
+
+            elif op == TRY_NEXT:
+                if frame.next_candidate >= len(frame.candidates):
+                    failed = True
+                else:
+                    entry, handler = frame.candidates[frame.next_candidate]
+                    frame.next_candidate += 1
+                    idx = frame.start
+                    frame = _Frame(handler, pc + 1, idx)
+                    stack.append(frame)
+                    pc = entry
+
+            elif op == CHOICE:
+                element, block_map = instruction[1], instruction[2]
+
+                if element.dispatch_table is None:
+                    alternatives = element.sub_elements
+                else:
+                    alternatives = element._candidate_alternatives(string_tokens, idx)
+
+                frame.candidates = [block_map[alternative] for alternative in alternatives]
+                frame.next_candidate = 0
+                pc += 1
+
+            elif op == PREFIX_CHOICE:
+                # Alternatives are tried from the end of the prefix, which fails the block until they are tried
+                element, block_map = instruction[1], instruction[2]
+
+                if element.dispatch_table is None:
+                    alternatives = element.sub_elements
+                else:
+                    alternatives = element._candidate_alternatives(string_tokens, idx)
+
+                frame.candidates = [block_map[alternative] for alternative in alternatives]
+                frame.next_candidate = 0
+                frame.start = idx
+                frame.handler = pc + 1
+                pc += 1
+
+            elif op == RETURN_TAIL:
+                # Merge in the outputs of the prefix, held by the frame which called this tail
+                outputs = stack[-2].outputs
+                outputs.update(frame.outputs)
+                output = {instruction[1]: outputs or None} if instruction[1] is not None else outputs or None
+                returned = True
+
+            elif op == RETURN:
+                returned = True
+
+            elif op == RETURN_WRAPPED:
+                output = {instruction[1]: frame.outputs or None}
+                returned = True
+
+            elif op == RETURN_OPTIONAL:
+                if instruction[1]:
+                    output = {instruction[1]: frame.outputs or None} if idx > frame.start else None
+                else:
+                    output = frame.outputs or None
+                returned = True
+
+            elif op == RETURN_START:
+                idx = frame.start
+                output = None
+                returned = True
+
+            elif op == RETURN_CAPTURED:
+                output = {instruction[1]: captures[frame.start]}
+                returned = True
+
+            elif op == RETURN_IF_END:
+                if idx >= length and not has_token(idx):
+                    output = None
+                    returned = True
+                else:
+                    pc += 1
+
+            elif op == LOOP_INIT:
+                frame.items = []
+                frame.current = idx
+                pc += 1
+
+            elif op == SKIP_IF_FIRST:
+                pc = pc + 1 if frame.items else instruction[1]
+
+            elif op == MERGE_LAST:
+                if output:
+                    frame.items[-1].update(output)
+                pc += 1
+
+            elif op == LOOP_END:
+                # Loops assembled as recognizers have no name, and produce no output
+                idx = frame.current
+                name = instruction[2]
+
+                if instruction[1]:
+                    output = {name: frame.items} if idx > frame.start and name is not None else None
+                    returned = True
+                elif frame.items:
+                    output = {name: frame.items} if name is not None else None
+                    returned = True
+                else:
+                    failed = True
+
+            elif op == APPLY:
+                match, new_idx, output = instruction[1].apply(string_tokens, idx, context)
+
+                if match:
+                    idx = new_idx
+                    pc += 1
+                else:
+                    pc = frame.handler
+
+            elif op == RECURSE:
+                recursion_depth += 1
+                frame.recursive = True
+
+                if context.max_recursion_depth is not None and recursion_depth > context.max_recursion_depth:
+                    raise errors.RecursionDepthExceededError(instruction[1], context.max_recursion_depth)
+
+                pc += 1
+
+            elif op == FAIL:
+                failed = True
+
+            if (returned or failed) and frame.recursive:
+                recursion_depth -= 1
+
+            if returned:
+                pc = frame.return_pc
+                stack.pop()
+
+                if not stack:
+                    return True, idx, output
+
+                frame = stack[-1]
+
+            elif failed:
+                stack.pop()
+
+                if not stack:
+                    return False, None, None
+
+                frame = stack[-1]
+                pc = frame.handler
+
+    return run
+
+
+def compile_grammar(root_element, recognize=False):
+    """
+    Assembles the element tree rooted at root_element into instructions.
+
+    Inputs: root_element - The root of a fully constructed (and finalized) grammar tree.
+            recognize    - A boolean, if True the instructions only determine whether & where the grammar matches, and
+                           the function's output is meaningless.
+
+    Outputs: A tuple containing: (
+        function: A function accepting (string_tokens, idx, context) and returning the same (match, new_idx, output)
+                  triple as root_element.apply
+        code: The list of assembled instructions
+    )
+    """
+
+    code, root_block = _Assembler(recognize).assemble(root_element)
+    return _make_runner(code, root_block), code
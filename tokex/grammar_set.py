@@ -0,0 +1,150 @@
+"""
+File containing GrammarSet, which routes input strings to whichever of several named grammars matches them
+"""
+
+from .grammar import flags
+from .tokenizers import TokenBuffer, TokexTokenizer
+from .tokex_class import Tokex
+
+
+class GrammarSet(object):
+    """
+    A collection of named grammars, which are tried against an input string in order until one of them matches it.
+
+    Input strings are tokenized once for all of the grammars, and a table mapping the first token of an input to the
+    grammars which could match beginning with it is built when the set is constructed, so that only those grammars
+    are tried; in the same way that One of Sets only try the alternatives which could match.
+    """
+
+    def __init__(self, grammars, allow_sub_grammar_definitions=True, tokenizer=TokexTokenizer,
+                 default_flags=flags.DEFAULTS, memoize=None, engine="interpreter", max_recursion_depth=None,
+                 optimize=True, prefilter=True):
+        """
+        Inputs: grammars - An iterable of (name, grammar string) tuples, or a dictionary mapping names to grammar
+                           strings, in the order the grammars should be tried.  Names must be unique.
+                All other inputs are as passed to tokex.compile, and apply to every grammar.  Each grammar uses the
+                same tokenizer instance.
+        """
+
+        if hasattr(grammars, "items"):
+            grammars = grammars.items()
+
+        # A list of (name, Tokex) tuples, in the order they're tried
+        self.grammars = []
+        names = set()
+
+        for name, grammar in grammars:
+            if name in names:
+                raise ValueError("Duplicate grammar name: %r" % name)
+
+            names.add(name)
+            compiled = Tokex(grammar, allow_sub_grammar_definitions, tokenizer, default_flags=default_flags,
+                             memoize=memoize, engine=engine, max_recursion_depth=max_recursion_depth,
+                             optimize=optimize, prefilter=prefilter)
+            self.grammars.append((name, compiled))
+
+            # Every grammar shares the tokenizer of the first, so that inputs need only be tokenized once
+            tokenizer = compiled._tokenizer
+
+        self._tokenizer = self.grammars[0][1]._tokenizer if self.grammars else None
+        self._build_index()
+
+    def _build_index(self):
+        """
+        Builds tables mapping the first token of an input to the grammars which could possibly match beginning with
+        it.  Grammars which could begin with any token, or which can match without consuming any tokens, are
+        included in every entry.
+        """
+
+        keyed_grammars = {}
+        fallback_grammars = []
+
+        for grammar_idx, (_, compiled) in enumerate(self.grammars):
+            keys, nullable = compiled._grammar.first_tokens()
+
+            if keys is None or nullable:
+                fallback_grammars.append(grammar_idx)
+                continue
+
+            for key in keys:
+                keyed_grammars.setdefault(key, set()).add(grammar_idx)
+
+        self._index = {}
+        self._quoted_index = {}
+        self._fallback_grammars = tuple(self.grammars[grammar_idx] for grammar_idx in fallback_grammars)
+
+        for (quoted, text), grammar_idxs in keyed_grammars.items():
+            table = self._quoted_index if quoted else self._index
+            table[text] = tuple(
+                self.grammars[grammar_idx] for grammar_idx in sorted(grammar_idxs.union(fallback_grammars))
+            )
+
+    def _candidate_grammars(self, tokens):
+        """ Returns the (name, Tokex) tuples of the grammars which could match the given TokenBuffer, in order """
+
+        if not tokens.has_token(0):
+            return self._fallback_grammars
+
+        candidates = self._index.get(tokens.lowered[0])
+
+        if self._quoted_index and tokens.quoted[0]:
+            quoted_candidates = self._quoted_index.get(tokens.lowered_bodies[0])
+
+            if quoted_candidates is not None:
+                if candidates is None:
+                    return quoted_candidates
+
+                candidate_set = set(candidates).union(quoted_candidates)
+                return [grammar for grammar in self.grammars if grammar in candidate_set]
+
+        if candidates is None:
+            return self._fallback_grammars
+
+        return candidates
+
+    def match(self, input_string, match_entirety=True):
+        """
+        Runs the grammars against a string in order, until one of them matches it.
+
+        Inputs: input_string   - The string to parse, or a bytes-like object (bytes, bytearray, memoryview or mmap)
+                                 to parse without decoding it as a whole; see TokexTokenizer.token_buffer.
+                match_entirety - A boolean, if True requires the entire string to be matched by a grammar.
+                                 if False, trailing tokens not matched by a grammar will not cause a match failure.
+
+        Outputs: A tuple of (name, output); the name of the first grammar to match the input string and the dictionary
+                 it output, as returned by Tokex.match.  None if no grammar matches the input string.
+        """
+
+        if not self.grammars:
+            return None
+
+        return self.match_tokens(self.tokenize(input_string), match_entirety)
+
+    def tokenize(self, input_string, capture_offsets=False):
+        """
+        Tokenizes a string using the tokenizer shared by the grammars of this set, as Tokex.tokenize does.
+
+        Outputs: A tokenizers.TokenBuffer of the string's tokens, as returned by Tokex.tokenize.
+        """
+
+        return self._tokenizer.token_buffer(input_string, capture_offsets)
+
+    def match_tokens(self, tokens, match_entirety=True):
+        """
+        Runs the grammars against an already tokenized input in order, until one of them matches it.
+
+        Inputs: tokens - A tokenizers.TokenBuffer, or a list or tuple of string tokens, as for Tokex.match_tokens.
+                match_entirety - A boolean, as for match.
+
+        Outputs: A tuple of (name, output) as returned by match, or None if no grammar matches the tokens.
+        """
+
+        tokens = TokenBuffer.wrap(tokens)
+
+        for name, compiled in self._candidate_grammars(tokens):
+            output = compiled.match_tokens(tokens, match_entirety)
+
+            if output is not None:
+                return name, output
+
+        return None
@@ -1,11 +1,31 @@
 import logging
+import warnings
 
 LOGGER = logging.getLogger('tokex')
 
+
+def log_debug(msg, *args):
+    """
+    Emits a debug message on the tokex logger, regardless of the level the logger is set to.
+    Used when debugging has been requested for a single match, without changing the logger's level for every thread.
+    """
+
+    if not LOGGER.disabled:
+        LOGGER.handle(LOGGER.makeRecord(LOGGER.name, logging.DEBUG, "(unknown file)", 0, msg, args, None))
+
+
 class TemporaryLogLevel(object):
+    """
+    Deprecated: Sets the level of the tokex logger for the duration of a with block.  Tokex no longer uses this, as
+    changing the shared logger's level affects every thread; pass debug=True to match, or set the level directly.
+    """
+
     old_level = None
 
     def __init__(self, target_level):
+        warnings.warn(
+            "TemporaryLogLevel is deprecated; pass debug=True to match instead", DeprecationWarning, stacklevel=2
+        )
         self.target_level = target_level
 
     def __enter__(self):
@@ -1,6 +1,10 @@
 from .tokenizer import TokexTokenizer, NumericTokenizer
+from .token_buffer import TokenBuffer, LazyTokenBuffer, SpanTokenBuffer
 
 __all__ = [
     "TokexTokenizer",
-    "NumericTokenizer"
+    "NumericTokenizer",
+    "TokenBuffer",
+    "LazyTokenBuffer",
+    "SpanTokenBuffer",
 ]
@@ -0,0 +1,344 @@
+import array
+import itertools
+import threading
+
+
+class TokenBuffer(object):
+    """
+    A sequence of tokens produced by a tokenizer, along with a table of attributes of each token which is computed
+    once when the buffer is created.  Grammar elements read these attributes rather than recomputing them each time
+    they are tested against a token.
+
+    Attributes: tokens         - The list of tokens.
+                length         - The number of tokens.
+                lowered        - A list of each token, lower cased.
+                quoted         - A list of booleans, indicating whether each token is wrapped in ' or ".
+                bodies         - A list of the contents of each quoted token, with the quotes stripped off.
+                                 None for tokens which aren't quoted.
+                lowered_bodies - As bodies, but lower cased.
+                views          - A tuple of the tokens, lowered, bodies & lowered_bodies lists, indexed by the
+                                 TOKENS, LOWERED, BODIES & LOWERED_BODIES constants respectively.  Allows elements to
+                                 select the form of token they compare against once, when they are constructed.
+                captures       - The values Named Elements output for each token; the tokens list itself, except for
+                                 SpanTokenBuffers capturing offsets.
+                complete       - Whether every token of the input is held; always True, except for LazyTokenBuffers
+                                 which are yet to reach the end of their input.
+                materialized   - Whether the views hold each token, rather than slicing them out of the input as they
+                                 are indexed; always True, except for SpanTokenBuffers.
+    """
+
+    TOKENS, LOWERED, BODIES, LOWERED_BODIES = range(4)
+
+    complete = True
+    materialized = True
+
+    def __init__(self, tokens):
+        """
+        Inputs: tokens - An iterable of string tokens.
+        """
+
+        self.tokens = tokens if isinstance(tokens, list) else list(tokens)
+        self.length = len(self.tokens)
+        self.lowered, self.quoted, self.bodies, self.lowered_bodies = self._token_attributes(self.tokens)
+        self.views = (self.tokens, self.lowered, self.bodies, self.lowered_bodies)
+        self.captures = self.tokens
+
+    @staticmethod
+    def _token_attributes(tokens):
+        """ Returns a tuple of the lowered, quoted, bodies & lowered_bodies lists for the given list of tokens """
+
+        lowered = [token.lower() for token in tokens]
+        quoted = [token[:1] in ('"', "'") and token[-1] == token[0] for token in tokens]
+
+        # Most inputs have few if any quoted tokens
+        if True not in quoted:
+            return lowered, quoted, [None] * len(tokens), [None] * len(tokens)
+
+        bodies = [
+            token[1:-1] if is_quoted else None
+            for token, is_quoted in zip(tokens, quoted)
+        ]
+        lowered_bodies = [
+            lowered_token[1:-1] if is_quoted else None
+            for lowered_token, is_quoted in zip(lowered, quoted)
+        ]
+
+        return lowered, quoted, bodies, lowered_bodies
+
+    def has_token(self, idx):
+        """
+        Returns whether there is a token at idx.  Grammar elements first compare idx against length, and only call
+        this when it is beyond the tokens held, which for a lazily filled buffer may mean they are yet to be tokenized.
+        """
+
+        return idx < self.length
+
+    @classmethod
+    def wrap(cls, tokens):
+        """ Returns the given tokens as a TokenBuffer, creating one only if they aren't already in a TokenBuffer """
+
+        if isinstance(tokens, cls):
+            return tokens
+
+        return cls(tokens)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, idx):
+        return self.tokens[idx]
+
+    def __iter__(self):
+        return iter(self.tokens)
+
+    def __repr__(self):
+        return repr(self.tokens)
+
+
+def is_binary(text):
+    """ Returns whether text is a bytes-like object (bytes, bytearray, memoryview or mmap) rather than a string """
+
+    return not isinstance(text, (str, type(u"")))
+
+
+def decode_error(token, encoding):
+    """ Returns a ValueError describing a token of a bytes-like input which isn't a whole number of characters """
+
+    return ValueError(
+        "Token %r of a bytes-like input is not valid %s; the tokenizer regexes must match whole characters, as "
+        "bytes-like inputs are tokenized byte by byte" % (bytes(token), encoding)
+    )
+
+
+def _offsets(text, start, end):
+    return start, end
+
+
+# Functions computing each form of a token, as held by the lists of a TokenBuffer
+def _lowered(token):
+    return token.lower()
+
+
+def _is_quoted(token):
+    return token[:1] in ('"', "'") and token[-1] == token[0]
+
+
+def _body(token):
+    return token[1:-1] if _is_quoted(token) else None
+
+
+def _lowered_body(token):
+    return token[1:-1].lower() if _is_quoted(token) else None
+
+
+def _token_getter(text, encoding, form=None):
+    """
+    Returns a function accepting (text, start, end) and returning the token spanning text[start:end], decoded if text
+    is a bytes-like object, in the form computed by the given function; ie: _lowered.  Views call it for each token
+    they're indexed by, so tokens & lowered tokens (which most elements compare against) are computed in a single call.
+    """
+
+    if not is_binary(text):
+        if form is None:
+            return lambda text, start, end: text[start:end]
+
+        if form is _lowered:
+            return lambda text, start, end: text[start:end].lower()
+
+        return lambda text, start, end: form(text[start:end])
+
+    # memoryviews have no decode method, so their tokens are copied into bytes first
+    if isinstance(text, memoryview):
+        decode = lambda text, start, end: bytes(text[start:end]).decode(encoding)
+    else:
+        decode = lambda text, start, end: text[start:end].decode(encoding)
+
+    if form is None:
+        return decode
+
+    if form is _lowered:
+        return lambda text, start, end: decode(text, start, end).lower()
+
+    return lambda text, start, end: form(decode(text, start, end))
+
+
+class _SpanView(object):
+    """
+    A sequence of one form of each token of a SpanTokenBuffer, such as the tokens lower cased, which are sliced out of
+    the input (and transformed) each time they are indexed.
+    """
+
+    def __init__(self, token_buffer, token, encoding=None):
+        """
+        Inputs: token_buffer - The SpanTokenBuffer whose tokens this is a view of.
+                token        - A function accepting (text, start, end) and returning the form of the token spanning
+                               text[start:end] held by this view; see _token_getter.
+                encoding     - The encoding tokens are decoded from, if the input is a bytes-like object.
+        """
+
+        self.text = token_buffer.text
+        self.starts = token_buffer.starts
+        self.ends = token_buffer.ends
+        self.token = token
+        self.encoding = encoding
+
+    def __getitem__(self, idx):
+        if type(idx) is slice:
+            return [self[token_idx] for token_idx in range(*idx.indices(len(self.starts)))]
+
+        try:
+            return self.token(self.text, self.starts[idx], self.ends[idx])
+        except UnicodeDecodeError:
+            raise decode_error(self.text[self.starts[idx]:self.ends[idx]], self.encoding)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        for idx in range(len(self.starts)):
+            yield self[idx]
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class SpanTokenBuffer(TokenBuffer):
+    """
+    A TokenBuffer holding the (start, end) offsets of each token within the input, in compact arrays of integers,
+    rather than copies of each token and its attributes.  Tokens are sliced out of the input only when a grammar
+    element compares against one or a Named Element outputs one.  Matching is slower than against a TokenBuffer, but a
+    multi-megabyte input takes a fraction of the memory once tokenized.
+
+    The input may be a bytes-like object, such as an mmap of a file, in which case the offsets are of bytes and each
+    token is decoded as it is sliced out; so the input is never decoded or copied as a whole.
+
+    Attributes: As for TokenBuffer, where each of the lists is instead a read only sequence with the same items.
+                text            - The input string or bytes-like object.
+                starts          - An array of the offset of the first character (or byte) of each token within text.
+                ends            - An array of the offset following the last character (or byte) of each token.
+                capture_offsets - Whether Named Elements output the (start, end) offsets of the token they match
+                                  rather than the token itself, which can be sliced out of the input by callers.
+    """
+
+    materialized = False
+
+    @staticmethod
+    def offset_typecode(text):
+        """ Returns the typecode of the smallest array which can hold offsets into text """
+
+        return "i" if len(text) < 2 ** 31 else "q"
+
+    def __init__(self, text, starts, ends, capture_offsets=False, encoding="utf-8"):
+        """
+        Inputs: text            - The input string, or a bytes-like object (bytes, bytearray, memoryview or mmap).
+                starts          - An array (or iterable) of the offset of each token's first character within text.
+                ends            - An array (or iterable) of the offset following each token's last character.
+                capture_offsets - A boolean, if True Named Elements output (start, end) tuples in place of tokens.
+                encoding        - The encoding tokens are decoded from, if text is a bytes-like object.
+        """
+
+        self.text = text
+        typecode = self.offset_typecode(text)
+        self.starts = starts if isinstance(starts, array.array) else array.array(typecode, starts)
+        self.ends = ends if isinstance(ends, array.array) else array.array(typecode, ends)
+        self.length = len(self.starts)
+        self.capture_offsets = capture_offsets
+
+        self.tokens, self.lowered, self.quoted, self.bodies, self.lowered_bodies = [
+            _SpanView(self, _token_getter(text, encoding, form), encoding)
+            for form in (None, _lowered, _is_quoted, _body, _lowered_body)
+        ]
+        self.views = (self.tokens, self.lowered, self.bodies, self.lowered_bodies)
+        self.captures = _SpanView(self, _offsets) if capture_offsets else self.tokens
+
+
+class LazyTokenBuffer(TokenBuffer):
+    """
+    A TokenBuffer which is filled from an iterator of tokens as grammar elements reach the end of the tokens it
+    holds, so that inputs are only tokenized as far as the grammar examines them.  Matches failing near the start of a
+    long input then only cost tokenizing its first few tokens.
+
+    Tokens are pulled in chunks, each at least as large as all of those pulled before it, so that tokenizing an
+    entire input takes time linear in its length.  The lists within views are extended in place, so may be held
+    onto while the buffer is filled.
+    """
+
+    # The number of tokens pulled when the buffer is created; enough to hold most inputs in their entirety, so that
+    # they can be checked against the literals a grammar requires
+    FIRST_CHUNK_SIZE = 64
+    # Strings shorter than this are tokenized in full by TokexTokenizer.token_buffer; few of their tokens would go
+    # unexamined, and tokenizing a string lazily costs more per token than tokenizing it all at once
+    MIN_LAZY_LENGTH = 1024
+
+    def __init__(self, tokens):
+        """
+        Inputs: tokens - An iterator of string tokens, such as one returned by TokexTokenizer.iter_tokens.
+        """
+
+        token_iter = iter(tokens)
+        super(LazyTokenBuffer, self).__init__(list(itertools.islice(token_iter, self.FIRST_CHUNK_SIZE)))
+
+        if self.length == self.FIRST_CHUNK_SIZE:
+            self.complete = False
+            self._token_iter = token_iter
+            # Buffers may be shared between threads, which must not pull from the iterator at the same time
+            self._fill_lock = threading.Lock()
+
+    def _fill(self, count):
+        """ Pulls up to count more tokens from the iterator into the buffer, marking it complete if it runs out """
+
+        chunk = list(itertools.islice(self._token_iter, count))
+
+        lowered, quoted, bodies, lowered_bodies = self._token_attributes(chunk)
+        self.tokens.extend(chunk)
+        self.lowered.extend(lowered)
+        self.quoted.extend(quoted)
+        self.bodies.extend(bodies)
+        self.lowered_bodies.extend(lowered_bodies)
+
+        # Updated after the views, so that elements in other threads never see a length covering incomplete views
+        self.length += len(chunk)
+
+        if len(chunk) < count:
+            self.complete = True
+            self._token_iter = None
+
+    def has_token(self, idx):
+        if idx < self.length or self.complete:
+            return idx < self.length
+
+        with self._fill_lock:
+            while idx >= self.length and not self.complete:
+                self._fill(max(idx + 1 - self.length, self.length))
+
+        return idx < self.length
+
+    def fill_all(self):
+        """ Tokenizes the remainder of the input, so that the buffer holds every token """
+
+        if self.complete:
+            return
+
+        with self._fill_lock:
+            while not self.complete:
+                self._fill(max(self.length, self.FIRST_CHUNK_SIZE))
+
+    def __len__(self):
+        self.fill_all()
+        return self.length
+
+    def __getitem__(self, idx):
+        if not (isinstance(idx, int) and idx >= 0 and self.has_token(idx)):
+            self.fill_all()
+
+        return self.tokens[idx]
+
+    def __iter__(self):
+        idx = 0
+        while self.has_token(idx):
+            yield self.tokens[idx]
+            idx += 1
+
+    def __repr__(self):
+        self.fill_all()
+        return repr(self.tokens)
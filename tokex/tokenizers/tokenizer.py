@@ -1,5 +1,66 @@
+import array
+import itertools
 import re
 
+from .token_buffer import LazyTokenBuffer, SpanTokenBuffer, TokenBuffer, decode_error, is_binary
+
+
+# Within patterns tokenizing bytes-like inputs, bytes outside of ASCII are word bytes; nearly all of the non ASCII
+# characters they encode are word characters when strings are tokenized, and \w would otherwise split them from the
+# rest of the words they appear in
+_WORD_BYTE = r"[\w\x80-\xff]"
+_BINARY_ESCAPES = {
+    "w": _WORD_BYTE,
+    "W": r"[^\w\x80-\xff]",
+    "b": r"(?:(?<=%s)(?!%s)|(?<!%s)(?=%s))" % ((_WORD_BYTE, ) * 4),
+    "B": r"(?:(?<=%s)(?=%s)|(?<!%s)(?!%s))" % ((_WORD_BYTE, ) * 4),
+}
+# Within character sets only \w can be extended to include them
+_BINARY_SET_ESCAPES = {
+    "w": r"\w\x80-\xff",
+}
+# Inputs without any non ASCII bytes are tokenized identically by the pattern as written, which is faster to match
+_NON_ASCII_RE = re.compile(b"[\x80-\xff]")
+# Every ASCII character, as encoded by the encodings bytes-like inputs can be tokenized in
+_ASCII = bytes(bytearray(range(128)))
+
+_MATCH_TYPE = type(re.match("", ""))
+
+
+def _binary_pattern(pattern):
+    r""" Returns the tokenizer pattern with its word escapes (\w, \W, \b & \B) rewritten for bytes-like inputs """
+
+    rewritten = []
+    in_set = False
+    idx = 0
+
+    while idx < len(pattern):
+        char = pattern[idx]
+
+        if char == "\\" and idx + 1 < len(pattern):
+            escape = pattern[idx + 1]
+            escapes = _BINARY_SET_ESCAPES if in_set else _BINARY_ESCAPES
+            rewritten.append(escapes.get(escape, pattern[idx: idx + 2]))
+            idx += 2
+            continue
+
+        if in_set:
+            in_set = char != "]"
+
+        elif char == "[":
+            # A ] directly following the opening [ (or [^) of a set is part of the set, rather than closing it
+            set_start = re.match(r"\[\^?\]?", pattern[idx:]).group()
+            rewritten.append(set_start)
+            idx += len(set_start)
+            in_set = True
+            continue
+
+        rewritten.append(char)
+        idx += 1
+
+    return "".join(rewritten)
+
+
 class TokexTokenizer(object):
     """
     Base class for Tokex tokenizers.  Uses re.findall & a collection of regular expressions to break up an
@@ -20,17 +81,33 @@ class TokexTokenizer(object):
         r"[^a-zA-Z0-9_ \t\n\r\f\v]+"
     )
 
-    def __init__(self, tokenizer_regexes=None, tokenize_newlines=False, ignore_empty_lines=False):
+    spans = False
+    encoding = "utf-8"
+    _ascii_compatible = True
+    # The patterns tokenizing bytes-like inputs, as written & with word escapes rewritten; compiled when first used
+    _ascii_tokenizer_re = None
+    _binary_tokenizer_re = None
+
+    def __init__(self, tokenizer_regexes=None, tokenize_newlines=False, ignore_empty_lines=False, spans=False,
+                 encoding="utf-8"):
         """
         Inputs: tokenizer_regexes  - Can be passed to provide a custom list of tokenizer regexes to parse
                                      an input string with.
                 tokenize_newlines  - A boolean indicating whether newlines should be treated as tokens
                 ignore_empty_lines - A boolean indicating whether we should skip over empty lines or not.
                                      Only has an effect if tokenize_newlines is passed and True
+                spans              - A boolean, if True input strings are tokenized into the offsets of their tokens
+                                     rather than copies of them by token_buffer; see tokenizers.SpanTokenBuffer.
+                encoding           - The encoding of bytes-like inputs (bytes, bytearray, memoryview or mmap objects),
+                                     which the tokenizer regexes are encoded to & tokens are decoded from.  Bytes-like
+                                     inputs are tokenized byte by byte, with non ASCII bytes matched by \\w; so regexes
+                                     must match whole characters, such as runs of \\w rather than a single \\w.
         """
 
         self.tokenize_newlines = tokenize_newlines
         self.ignore_empty_lines = ignore_empty_lines
+        self.spans = spans
+        self.encoding = encoding
 
         if tokenizer_regexes:
             self.tokenizer_regexes = tokenizer_regexes
@@ -38,28 +115,237 @@ class TokexTokenizer(object):
         if self.tokenize_newlines:
             self.tokenizer_regexes = list(self.tokenizer_regexes) + [r"\n"]
 
+        # Compiled once here rather than on every call to tokenize, which would otherwise join the regexes & look the
+        # pattern up in the re module's cache for each input string
+        self._tokenizer_re = re.compile("(%s)" % "|".join(self.tokenizer_regexes), re.MULTILINE)
+        self._ascii_compatible = _ASCII.decode("ascii").encode(encoding) == _ASCII
+
+    def _pattern(self, input_string, binary):
+        """ Returns the compiled pattern tokenizing input_string; a bytes pattern if binary is True """
+
+        if not binary:
+            return self._tokenizer_re
+
+        self._check_binary_encoding()
+
+        if _NON_ASCII_RE.search(input_string) is None:
+            if self._ascii_tokenizer_re is None:
+                self._ascii_tokenizer_re = re.compile(self._tokenizer_re.pattern.encode(self.encoding), re.MULTILINE)
+
+            return self._ascii_tokenizer_re
+
+        if self._binary_tokenizer_re is None:
+            self._binary_tokenizer_re = re.compile(
+                _binary_pattern(self._tokenizer_re.pattern).encode(self.encoding), re.MULTILINE
+            )
+
+        return self._binary_tokenizer_re
+
+    def _check_binary_encoding(self):
+        """
+        Raises ValueError if bytes-like inputs can't be tokenized in the encoding of this tokenizer.  They are
+        tokenized by encoding the tokenizer regexes, and the tokens of custom tokenize functions, into bytes; which
+        only finds the same tokens if every ASCII character is encoded as the same single byte, unlike in utf-16.
+        """
+
+        if not self._ascii_compatible:
+            raise ValueError(
+                "Bytes-like inputs can't be tokenized in the %s encoding, as it doesn't encode ASCII characters as "
+                "single bytes; decode them into strings first" % self.encoding
+            )
+
     def tokenize(self, input_string):
         """
         Function which is called by tokex to break an input string into tokens, processed by tokex.
 
-        Inputs: input_string - A string, to break into tokens.
+        Inputs: input_string - A string, or bytes-like object, to break into tokens.
 
-        Outputs: A list of tokens from input_string.
+        Outputs: A list of tokens from input_string.  The tokens of bytes-like objects are decoded into strings.
         """
 
-        tokens = re.findall(
-            "(%s)" % "|".join(self.tokenizer_regexes),
-            input_string,
-            flags=re.MULTILINE
-        )
+        binary = is_binary(input_string)
+        tokens = self._pattern(input_string, binary).findall(input_string)
 
+        if binary:
+            try:
+                tokens = [token.decode(self.encoding) for token in tokens]
+            except UnicodeDecodeError as e:
+                raise decode_error(e.object, self.encoding)
+
+        # Newlines beginning the input or following another newline end empty lines, and are dropped
         if self.tokenize_newlines and self.ignore_empty_lines:
-            for idx in reversed(range(len(tokens))):
-                if tokens[idx] == "\n" and ((idx > 0 and tokens[idx - 1] == "\n") or idx == 0):
-                    tokens.pop(idx)
+            tokens = [
+                token for previous, token in zip(itertools.chain(("\n",), tokens), tokens)
+                if token != "\n" or previous != "\n"
+            ]
 
         return tokens
 
+    def iter_tokens(self, input_string):
+        """
+        Returns an iterator of the tokens tokenize would return for input_string, which only tokenizes as far into
+        input_string as the iterator is advanced.  Used to fill tokenizers.LazyTokenBuffers.
+
+        Subclasses implementing their own tokenize function tokenize the entire string up front, unless they also
+        implement this function.
+
+        Inputs: input_string - A string, or bytes-like object, to break into tokens.
+
+        Outputs: An iterator of tokens from input_string.
+        """
+
+        if type(self).tokenize != TokexTokenizer.tokenize:
+            return iter(self.tokenize(input_string))
+
+        binary = is_binary(input_string)
+        matches = self._pattern(input_string, binary).finditer(input_string)
+
+        if binary:
+            tokens = _decoded_tokens((match.group() for match in matches), self.encoding)
+        else:
+            tokens = (match.group() for match in matches)
+
+        if self.tokenize_newlines and self.ignore_empty_lines:
+            return _without_empty_lines(tokens)
+
+        return tokens
+
+    def tokenize_spans(self, input_string):
+        """
+        Breaks an input string into the same tokens as tokenize, without copying them out of the string.
+
+        Subclasses implementing their own tokenize function have each of their tokens found within the string in turn,
+        so their tokens must be substrings of it, in the order they appear within it.
+
+        Inputs: input_string - A string, or bytes-like object, to break into tokens.
+
+        Outputs: A tuple of two arrays of integers, which are offsets of bytes for bytes-like objects: (
+            starts: The offset of the first character of each token within input_string
+            ends: The offset following the last character of each token within input_string
+        )
+        """
+
+        typecode = SpanTokenBuffer.offset_typecode(input_string)
+        starts = array.array(typecode)
+        ends = array.array(typecode)
+        binary = is_binary(input_string)
+
+        if type(self).tokenize != TokexTokenizer.tokenize:
+            if binary:
+                self._check_binary_encoding()
+
+            # memoryviews are the only bytes-like objects without a find method
+            find = _memoryview_finder(input_string) if isinstance(input_string, memoryview) else input_string.find
+            end = 0
+
+            for token in self.tokenize(input_string):
+                encoded = token.encode(self.encoding) if binary else token
+                start = find(encoded, end)
+
+                if start == -1:
+                    raise ValueError("Token %r does not appear in the input string after offset %d" % (token, end))
+
+                end = start + len(encoded)
+                starts.append(start)
+                ends.append(end)
+
+            return starts, ends
+
+        matches = self._pattern(input_string, binary).finditer(input_string)
+
+        if not (self.tokenize_newlines and self.ignore_empty_lines):
+            # Offsets are copied out of chunks of matches by map, rather than one match at a time
+            for chunk in iter(lambda: list(itertools.islice(matches, 4096)), []):
+                starts.extend(map(_MATCH_TYPE.start, chunk))
+                ends.extend(map(_MATCH_TYPE.end, chunk))
+
+            return starts, ends
+
+        newline_token = b"\n" if binary else "\n"
+        previous_newline = True
+
+        for match in matches:
+            start, end = match.span()
+
+            # As when tokenizing, newlines beginning the input or following another newline are dropped
+            newline = end - start == 1 and input_string[start:end] == newline_token
+            empty_line = newline and previous_newline
+            previous_newline = newline
+
+            if empty_line:
+                continue
+
+            starts.append(start)
+            ends.append(end)
+
+        return starts, ends
+
+    def token_buffer(self, input_string, capture_offsets=False, lazy=True):
+        """
+        Tokenizes an input string into the form of tokenizers.TokenBuffer best suited to it; used by Tokex.tokenize.
+
+        Inputs: input_string    - A string, or bytes-like object, to break into tokens.
+                capture_offsets - A boolean, if True Named Elements matching the returned buffer output the
+                                  (start, end) offsets of the token they match within input_string rather than the
+                                  token itself.
+                lazy            - A boolean, if False long strings are tokenized in full rather than lazily; which is
+                                  quicker when the grammar is certain to examine every token of a matching input.
+
+        Outputs: A tokenizers.SpanTokenBuffer if this tokenizer records spans, capture_offsets is True or input_string
+                 is a bytes-like object, whose tokens are then decoded only as they are examined.  Otherwise, a
+                 tokenizers.LazyTokenBuffer for strings at least LazyTokenBuffer.MIN_LAZY_LENGTH characters long if lazy
+                 is True, which is only tokenized as far as it is examined, else a tokenizers.TokenBuffer.
+        """
+
+        if self.spans or capture_offsets or is_binary(input_string):
+            return SpanTokenBuffer(
+                input_string, *self.tokenize_spans(input_string), capture_offsets=capture_offsets,
+                encoding=self.encoding
+            )
+
+        if not lazy or len(input_string) < LazyTokenBuffer.MIN_LAZY_LENGTH:
+            return TokenBuffer(self.tokenize(input_string))
+
+        return LazyTokenBuffer(self.iter_tokens(input_string))
+
+
+def _memoryview_finder(view):
+    """ Returns a function finding bytes within a memoryview from an offset onwards, as bytes.find does """
+
+    # Tokens tend to recur, so their patterns are compiled once each
+    patterns = {}
+
+    def _find(sub, start):
+        pattern = patterns.get(sub)
+        if pattern is None:
+            pattern = patterns[sub] = re.compile(re.escape(sub))
+
+        match = pattern.search(view, start)
+        return match.start() if match is not None else -1
+
+    return _find
+
+
+def _decoded_tokens(tokens, encoding):
+    """ Generator decoding each of the given tokens of a bytes-like input """
+
+    try:
+        for token in tokens:
+            yield token.decode(encoding)
+    except UnicodeDecodeError as e:
+        raise decode_error(e.object, encoding)
+
+
+def _without_empty_lines(tokens):
+    """ Generator yielding the given tokens, less any newlines beginning them or following another newline """
+
+    previous = "\n"
+    for token in tokens:
+        if token != "\n" or previous != "\n":
+            yield token
+
+        previous = token
+
 
 class NumericTokenizer(TokexTokenizer):
     """
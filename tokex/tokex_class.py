@@ -1,16 +1,105 @@
+import collections
 import inspect
+import itertools
 import logging
+import multiprocessing
+import threading
+
+from .grammar import analysis, codegen, flags, optimizer, parse, vm
+from .grammar.match_context import MatchContext
+from . import tokenizers, tracing
+from .logger import LOGGER
+
+
+# The Tokex each worker process of a pool started by Tokex.match_many matches against
+_worker_tokex = None
+# The exception raised compiling the grammar in a worker process, if it could not be compiled
+_worker_error = None
+
+
+def _init_worker(constructor_args, constructor_kwargs):
+    """ Compiles the grammar of the Tokex a pool started by Tokex.match_many matches against, in a worker process """
+
+    global _worker_tokex, _worker_error
+
+    # Pools replace workers whose initializer raises without reporting it, forever, so the exception is instead
+    # raised from each chunk sent to the worker; which the pool returns to match_many
+    try:
+        _worker_tokex = Tokex(*constructor_args, **constructor_kwargs)
+    except Exception as e:
+        _worker_error = e
+
+
+def _match_chunk(input_strings, match_entirety):
+    """ Matches a chunk of strings sent to a worker process by Tokex.match_many, returning a list of the outputs """
+
+    if _worker_error is not None:
+        raise _worker_error
+
+    return list(_worker_tokex.match_iter(input_strings, match_entirety))
 
-from .grammar import flags, parse
-from . import tokenizers
-from .logger import LOGGER, TemporaryLogLevel
 
 class Tokex(object):
+    # The available implementations for applying a grammar to input
+    ENGINES = ("interpreter", "codegen", "vm")
+
     _grammar = None
     _tokenizer = None
+    # Function determining where the grammar matches a TokenBuffer without building outputs; compiled when first used
+    _recognize_fn = None
+
+    def __init__(self, input_grammar, allow_sub_grammar_definitions, tokenizer, default_flags=flags.DEFAULTS,
+                 memoize=None, engine="interpreter", max_recursion_depth=None, optimize=True, prefilter=True):
+        if engine not in self.ENGINES:
+            raise ValueError("Unknown engine %r, expected one of: %s" % (engine, ", ".join(self.ENGINES)))
+
+        # Compiled grammars can't be pickled, so worker processes started by match_many compile their own from these
+        self._constructor_args = (input_grammar, allow_sub_grammar_definitions, tokenizer)
+        self._constructor_kwargs = dict(
+            default_flags=default_flags, memoize=memoize, engine=engine, max_recursion_depth=max_recursion_depth,
+            optimize=optimize, prefilter=prefilter
+        )
 
-    def __init__(self, input_grammar, allow_sub_grammar_definitions, tokenizer, default_flags=flags.DEFAULTS):
-        self._grammar = parse.construct_grammar(input_grammar, allow_sub_grammar_definitions, default_flags)
+        self._grammar = parse.construct_grammar(
+            input_grammar, allow_sub_grammar_definitions, default_flags, finalize=False
+        )
+
+        # The optimizer.Rewrite tuples describing how the grammar was rewritten to be faster to match
+        self.rewrites = optimizer.optimize_grammar(self._grammar) if optimize else []
+        parse.finalize_grammar(self._grammar)
+
+        self.engine = engine
+        self.max_recursion_depth = max_recursion_depth
+
+        # Function applying the grammar to a TokenBuffer when neither tracing nor memoization are required
+        if engine == "codegen":
+            self._match_fn, self._generated_source = codegen.compile_grammar(self._grammar)
+        elif engine == "vm":
+            self._match_fn, self._instructions = vm.compile_grammar(self._grammar)
+        else:
+            self._match_fn = self._grammar.apply
+
+        if memoize is None:
+            memoize = analysis.should_memoize(self._grammar)
+        self.memoize = memoize
+
+        # Inputs with too few or too many tokens, or missing any of the literals every match requires, are rejected
+        # before the grammar is applied to them
+        self.prefilter = prefilter
+        self.min_tokens, self.max_tokens = analysis.token_count_bounds(self._grammar)
+        # Held as (view, literal) pairs; grammars require few literals, for which scanning each view is quickest
+        self._required_literals = tuple(
+            (view, literal)
+            for view, literals in sorted(analysis.required_literals(self._grammar).items())
+            for literal in sorted(literals)
+        )
+
+        # Each thread counts the inputs it rejects in a counter of its own, held by _thread_state and registered in
+        # _rejection_counters the first time it rejects one, so that rejecting an input takes no lock; see
+        # prefilter_rejections
+        self._thread_state = threading.local()
+        self._rejection_counters = []
+        self._rejection_counters_lock = threading.Lock()
 
         if inspect.isclass(tokenizer) and issubclass(tokenizer, tokenizers.TokexTokenizer):
             self._tokenizer = tokenizer()
@@ -22,27 +111,298 @@ class Tokex(object):
             raise Exception("Given tokenizer is not an instance of subclass of tokenizers.TokexTokenizer")
 
 
+    @property
+    def prefilter_rejections(self):
+        """ The number of inputs which have been rejected without applying the grammar, by any thread """
+
+        with self._rejection_counters_lock:
+            return sum(counter[0] for counter in self._rejection_counters)
+
     # User-Level functions
-    def match(self, input_string, match_entirety=True, debug=False):
+    def tokenize(self, input_string, capture_offsets=False):
+        """
+        Tokenizes a string using the tokenizer of this grammar.
+
+        Inputs: input_string    - The string, or bytes-like object, to tokenize.
+                capture_offsets - A boolean, if True the outputs of matching the returned buffer hold the
+                                  (start, end) offsets of each token captured by a Named Element within input_string,
+                                  rather than the token itself.
+
+        Outputs: A tokenizers.TokenBuffer of the string's tokens, which can be passed to match_tokens or
+                 is_match_tokens of this or any other grammar using the same tokenizer, any number of times.  Long
+                 strings are only tokenized as far as the grammars matched against them examine them, using a
+                 tokenizers.LazyTokenBuffer, unless the tokenizer records spans or capture_offsets is True; in which
+                 case a tokenizers.SpanTokenBuffer is returned.
+        """
+
+        return self._tokenizer.token_buffer(input_string, capture_offsets)
+
+    def match(self, input_string, match_entirety=True, debug=False, tracer=None):
         """
         Runs the loaded grammar against a string and returns the output if it matches the input string.
 
-        Inputs: input_string   - The string to parse.
+        Inputs: input_string   - The string to parse, or a bytes-like object (bytes, bytearray, memoryview or mmap)
+                                 to parse without decoding it as a whole; see TokexTokenizer.token_buffer.
                 match_entirety - A boolean, if True requires the entire string to be matched by the grammar.
                                 if False, trailing tokens not matched by the grammar will not cause a match failure.
-                debug          - A boolean, if True will set the debugging level to DEBUG for the duration of the match
+                debug          - A boolean, if True will log debugging information for this match to the tokex logger,
+                                 regardless of the logger's level.  Debugging information is also logged if the tokex
+                                 logger has been set to the DEBUG level.
+                tracer         - Optional: A tracing.Tracer whose callbacks will be called as each grammar element
+                                 is applied to the input.  Takes precedence over debug.
 
         Outputs: A dictionary representing the output of parsing if the string matches the grammar, else None.
         """
 
-        with TemporaryLogLevel(logging.DEBUG if debug else LOGGER.getEffectiveLevel()):
-            tokens = self._tokenizer.tokenize(input_string)
+        return self.match_tokens(
+            self._tokenizer.token_buffer(input_string, lazy=self._lazy(match_entirety)), match_entirety, debug, tracer
+        )
+
+    def match_tokens(self, tokens, match_entirety=True, debug=False, tracer=None):
+        """
+        Runs the loaded grammar against an already tokenized input and returns the output if it matches the tokens.
+
+        Inputs: tokens - A tokenizers.TokenBuffer, such as one returned by tokenize, or a list or tuple of string
+                         tokens.  TokenBuffers can be matched against any number of grammars without being tokenized
+                         or copied again.
+                All other inputs are as for match.
+
+        Outputs: A dictionary representing the output of parsing if the tokens match the grammar, else None.
+        """
+
+        tokens = tokenizers.TokenBuffer.wrap(tokens)
+
+        if tracer is None and (debug or LOGGER.isEnabledFor(logging.DEBUG)):
+            tracer = tracing.LoggingTracer()
+
+        # All state for this match is held by its context, so that concurrent matches do not interfere with each other
+        context = MatchContext(tracer=tracer, memoize=self.memoize, max_recursion_depth=self.max_recursion_depth)
+
+        return self._match_in_context(tokens, match_entirety, context)
+
+    def match_iter(self, input_strings, match_entirety=True, indexed=False):
+        """
+        Generator running the loaded grammar against each of an iterable of strings in turn, such as the lines of a
+        file, and yielding the output of each as match would.  Strings are only pulled from the iterable as outputs
+        are consumed, and the setup match performs for each string, such as deciding whether to log debugging
+        information, is performed once for the whole iterable.  Most of the time taken per string is still spent
+        tokenizing & matching it, so this is at most around 20% faster than calling match for each string.
+
+        Inputs: input_strings  - An iterable of strings, or bytes-like objects, to parse.
+                match_entirety - A boolean, as for match.
+                indexed        - A boolean, if True (index, output) tuples are yielded; where index is the position of
+                                 the string within input_strings.
+
+        Outputs: Yields the output of matching each string: a dictionary if the string matches the grammar, else None.
+        """
+
+        tracer = tracing.LoggingTracer() if LOGGER.isEnabledFor(logging.DEBUG) else None
+        # Elements leave contexts as they found them once they have been applied, so a single context can be used for
+        # each of the matches; aside from clearing any memoized results
+        context = MatchContext(tracer=tracer, memoize=self.memoize, max_recursion_depth=self.max_recursion_depth)
+        token_buffer = self._tokenizer.token_buffer
+        lazy = self._lazy(match_entirety)
+        match_in_context = self._match_in_context
+
+        memo = context.memo
+
+        for idx, input_string in enumerate(input_strings):
+            if memo:
+                memo.clear()
+
+            output = match_in_context(token_buffer(input_string, lazy=lazy), match_entirety, context)
+
+            yield (idx, output) if indexed else output
+
+    def match_many(self, input_strings, match_entirety=True, workers=None, chunksize=256):
+        """
+        Generator matching an iterable of strings across a pool of worker processes, each of which compiles its own
+        copy of the grammar, yielding the output of each in the order of input_strings as match_iter would.  Strings
+        are sent to the workers in chunks, of which no more than two per worker are pulled from the iterable and
+        awaiting their outputs at a time; so generators of any length can be matched in bounded memory.
+
+        Starting the pool takes a noticeable fraction of a second, so this is only faster than match_iter for large
+        batches.  Inputs rejected by the prefilter within workers are not counted by prefilter_rejections.  If a
+        worker fails to compile the grammar, such as when the tokenizer's class can't be imported by a spawned
+        process, the exception it raised is raised from this generator.
+
+        Inputs: input_strings  - An iterable of strings, or bytes objects, to parse.  Each must be picklable, so
+                                 memory mapped files should be matched using match or match_iter.
+                match_entirety - A boolean, as for match.
+                workers        - Optional: The number of worker processes; by default, the number of CPUs.  A single
+                                 worker matches the strings in this process, using match_iter.
+                chunksize      - The number of strings sent to a worker at a time.
+
+        Outputs: Yields the output of matching each string: a dictionary if the string matches the grammar, else None.
+        """
+
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+
+        if workers < 1 or chunksize < 1:
+            raise ValueError("workers and chunksize must be at least 1, got %r and %r" % (workers, chunksize))
+
+        if workers == 1:
+            for output in self.match_iter(input_strings, match_entirety):
+                yield output
+            return
+
+        input_iter = iter(input_strings)
+        chunks = iter(lambda: list(itertools.islice(input_iter, chunksize)), [])
+        # The results of the chunks sent to the pool, in the order they were sent
+        pending = collections.deque()
+
+        pool = multiprocessing.Pool(workers, _init_worker, (self._constructor_args, self._constructor_kwargs))
+
+        try:
+            for chunk in chunks:
+                pending.append(pool.apply_async(_match_chunk, (chunk, match_entirety)))
+
+                if len(pending) >= 2 * workers:
+                    for output in pending.popleft().get():
+                        yield output
+
+            while pending:
+                for output in pending.popleft().get():
+                    yield output
+
+            pool.close()
+
+        finally:
+            # Also reached when the generator is closed before it is exhausted, discarding any chunks still pending
+            pool.terminate()
+            pool.join()
+
+    def is_match(self, input_string, match_entirety=True):
+        """
+        Determines whether the loaded grammar matches a string, without building the output that match would.
+        Faster than checking whether the result of match is None when the output isn't needed.
+
+        Inputs: input_string   - The string, or bytes-like object, to check.
+                match_entirety - A boolean, if True requires the entire string to be matched by the grammar.
+                                 if False, trailing tokens not matched by the grammar will not cause a match failure.
+
+        Outputs: True if the string matches the grammar, else False.
+        """
+
+        return self.is_match_tokens(
+            self._tokenizer.token_buffer(input_string, lazy=self._lazy(match_entirety)), match_entirety
+        )
+
+    def is_match_tokens(self, tokens, match_entirety=True):
+        """
+        Determines whether the loaded grammar matches an already tokenized input, as is_match does for a string.
+
+        Inputs: tokens - A tokenizers.TokenBuffer, or a list or tuple of string tokens, as for match_tokens.
+                match_entirety - A boolean, as for is_match.
+
+        Outputs: True if the tokens match the grammar, else False.
+        """
+
+        tokens = tokenizers.TokenBuffer.wrap(tokens)
 
-            LOGGER.debug("Input Tokens:\n%s", tokens)
+        if self.prefilter and not self._passes_prefilter(tokens, match_entirety):
+            return False
+
+        end_idx = self._recognize(tokens)
+
+        return end_idx is not None and (not match_entirety or self._at_end(tokens, end_idx))
+
+    def count(self, input_strings, match_entirety=True):
+        """
+        Counts how many of an iterable of strings the loaded grammar matches, without building any outputs.
+
+        Inputs: input_strings  - An iterable of strings to check.
+                match_entirety - A boolean, as for is_match.
+
+        Outputs: The number of input_strings which match the grammar.
+        """
 
-            match, end_idx, output = self._grammar.apply(tokens, 0)
+        return sum(1 for input_string in input_strings if self.is_match(input_string, match_entirety))
 
-            if match and (not match_entirety or end_idx == len(tokens)):
-                return output[None] or {}
+    def _match_in_context(self, tokens, match_entirety, context):
+        """
+        Applies the grammar to a TokenBuffer using the given MatchContext, returning the output as match_tokens does
+        """
 
+        # Traced matches are always run, so that the tracer sees why they fail
+        if context.tracer is None and self.prefilter and not self._passes_prefilter(tokens, match_entirety):
             return None
+
+        if context.tracer is not None:
+            context.tracer.start(tokens)
+
+        # Tracing and memoization are provided by the interpreter
+        if context.instrumented:
+            match, end_idx, output = self._grammar.apply(tokens, 0, context)
+        else:
+            match, end_idx, output = self._match_fn(tokens, 0, context)
+
+        if match and (not match_entirety or self._at_end(tokens, end_idx)):
+            return output[None] or {}
+
+        return None
+
+    def _lazy(self, match_entirety):
+        """
+        Returns whether long input strings should be tokenized lazily.  Only a failed match can stop short of the end
+        of the input when the entire input must be matched by a grammar which consumes any number of tokens, and
+        tokenizing an entire string lazily is slower than tokenizing it all at once.
+        """
+
+        return not match_entirety or self.max_tokens is not None
+
+    @staticmethod
+    def _at_end(tokens, end_idx):
+        """ Returns whether end_idx is the end of the given TokenBuffer, tokenizing at most one token past it """
+
+        return end_idx == tokens.length and not tokens.has_token(end_idx)
+
+    def _passes_prefilter(self, tokens, match_entirety):
+        """
+        Returns whether the grammar could possibly match the given TokenBuffer, going by the number of tokens it can
+        consume and the literals it requires.  Counts the inputs which it couldn't.
+
+        LazyTokenBuffers are tokenized no further than needed to count the tokens the grammar can consume, and are
+        only checked for the literals if that completes them.  SpanTokenBuffers are never checked for the literals,
+        which would slice every one of their tokens out of the input.
+        """
+
+        if (tokens.length >= self.min_tokens or tokens.has_token(self.min_tokens - 1)) and (
+                not match_entirety or self.max_tokens is None or
+                (tokens.length <= self.max_tokens and not tokens.has_token(self.max_tokens))):
+            if not tokens.complete or not tokens.materialized:
+                return True
+
+            views = tokens.views
+
+            for view, literal in self._required_literals:
+                if literal not in views[view]:
+                    break
+            else:
+                return True
+
+        try:
+            self._thread_state.rejections[0] += 1
+
+        except AttributeError:
+            counter = self._thread_state.rejections = [1]
+            with self._rejection_counters_lock:
+                self._rejection_counters.append(counter)
+
+        return False
+
+    def _recognize(self, tokens):
+        """ Returns the index the grammar ceased matching the given TokenBuffer at if it matches, else None """
+
+        context = MatchContext(memoize=self.memoize, max_recursion_depth=self.max_recursion_depth)
+
+        # Memoization is provided by the interpreter
+        if context.instrumented or self.engine == "interpreter":
+            return self._grammar.recognize(tokens, 0, context)
+
+        if self._recognize_fn is None:
+            engine = codegen if self.engine == "codegen" else vm
+            self._recognize_fn = engine.compile_grammar(self._grammar, recognize=True)[0]
+
+        return self._recognize_fn(tokens, 0, context)[1]
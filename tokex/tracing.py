@@ -0,0 +1,41 @@
+"""
+Tracers can be passed to Tokex.match to observe each grammar element as it is applied to the input tokens.
+When no tracer is given, elements are applied without making any tracing calls at all.
+"""
+
+from .logger import log_debug
+
+
+class Tracer(object):
+    """
+    Base class for tracers.  Subclasses should override whichever of the callbacks below they are interested in.
+
+    Callbacks are given the element being applied, along with the input tokens and the index it is being applied at.
+    """
+
+    def start(self, string_tokens):
+        """ Called once at the start of a match, before any elements are applied """
+
+    def enter(self, element, string_tokens, idx):
+        """ Called before an element is applied at idx """
+
+    def match(self, element, string_tokens, idx, new_idx, output):
+        """ Called after an element applied at idx has matched, ceasing to match at new_idx """
+
+    def exit(self, element, string_tokens, idx, match, new_idx):
+        """ Called after an element has been applied at idx, whether or not it matched """
+
+
+class LoggingTracer(Tracer):
+    """ Tracer which logs debugging information for each element to the tokex logger.  Used by Tokex.match(debug=True) """
+
+    def start(self, string_tokens):
+        log_debug("Input Tokens:\n%s", string_tokens)
+
+    def enter(self, element, string_tokens, idx):
+        if string_tokens.has_token(idx):
+            log_debug("%s testing match for: %s\n", element, string_tokens[idx])
+
+    def exit(self, element, string_tokens, idx, match, new_idx):
+        if new_idx is not None and string_tokens.has_token(new_idx):
+            log_debug("%s Matched: %s\n", element, match)
@@ -14,12 +14,10 @@ def format_element_tree(root_element):
     def _process_element(element, indentation):
         output_lines.append("%s%s" % (' ' * (4 * indentation), repr(element)))
 
-        if isinstance(element, elements.BaseScopedElement):
-            for sub_element in element.sub_elements:
-                _process_element(sub_element, indentation + 1)
-
-            if element.delimiter_grammar:
-                _process_element(element.delimiter_grammar, indentation + 1)
+        # Sub grammar usages refer to the elements of their definitions, which are not repeated
+        if isinstance(element, elements.BaseScopedElement) and not isinstance(element, elements.SubGrammarUsage):
+            for child_element in element.child_elements():
+                _process_element(child_element, indentation + 1)
 
     if getattr(root_element, "sub_elements", None):
         for sub_element in root_element.sub_elements: